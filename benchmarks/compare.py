@@ -0,0 +1,56 @@
+"""
+Compares two benchmark result files written by `benchmarks.run`.
+
+Usage: python -m benchmarks.compare baseline.json current.json [--threshold 10]
+
+Exits non-zero if any scenario's p50 or p99 regressed by more than the threshold percentage.
+"""
+
+import argparse
+import json
+import sys
+
+
+def _key(result: dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    baseline_results = {_key(r): r for r in baseline["results"]}
+    regressed = False
+    print(f"{'scenario':<85} {'p50 %':>8} {'p99 %':>8}")
+    for result in current["results"]:
+        key = _key(result)
+        previous = baseline_results.get(key)
+        if previous is None:
+            print(f"{key:<85} {'new':>8}")
+            continue
+        changes = []
+        for metric in ("p50_ms", "p99_ms"):
+            before, after = previous[metric], result[metric]
+            change = (after - before) / before * 100 if before else 0.0
+            changes.append(change)
+            regressed = regressed or change > threshold
+        flag = " REGRESSED" if max(changes) > threshold else ""
+        print(f"{key:<85} {changes[0]:>+7.1f}% {changes[1]:>+7.1f}%{flag}")
+    return not regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"Baseline {baseline.get('commit')} vs current {current.get('commit')}")
+    sys.exit(0 if compare(baseline, current, args.threshold) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares the dict and columnar trade reconstruction paths on synthetic order histories.
+
+Usage: python -m benchmarks.reconstruction_bench [sizes...]
+"""
+
+import os
+import sys
+import time
+
+from mt5.backend import install_backend
+
+# Reconstruction makes no terminal calls, but mt5_utils imports MetaTrader5
+install_backend(os.getenv("MT5_BACKEND_MODULE", "mt5.fake_mt5"))
+
+from mt5.columnar import (  # noqa: E402
+    deals_to_array,
+    orders_to_array,
+    reconstruct_trades_columnar,
+)
+from mt5.fake_history import synthetic_history  # noqa: E402
+from mt5.history_store import AccountHistory  # noqa: E402
+from mt5.mt5_utils import DealIndex, _build_trade  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def run_dict_path(orders, deals):
+    history = AccountHistory(0)
+    history.merge_orders(orders)
+    deal_index = DealIndex(deals)
+    for position_id in history.positions_to_rebuild():
+        history.store_trade(
+            _build_trade(
+                0, position_id, history.orders_for_position(position_id), deal_index
+            )
+        )
+    return history.list_trades()
+
+
+def run_columnar_path(orders, deals):
+    return reconstruct_trades_columnar(
+        orders_to_array(orders), deals_to_array(deals), lambda trade, ticket: None
+    )
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(sizes):
+    print(f"{'orders':>10} {'dict (s)':>10} {'columnar (s)':>13} {'speedup':>8}")
+    for size in sizes:
+        orders, deals = synthetic_history(size)
+        dict_time, dict_trades = _time(run_dict_path, orders, deals)
+        columnar_time, columnar_trades = _time(run_columnar_path, orders, deals)
+        assert dict_trades == columnar_trades, "Reconstruction paths disagree"
+        print(
+            f"{size:>10} {dict_time:>10.3f} {columnar_time:>13.3f} {dict_time / columnar_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
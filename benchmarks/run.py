@@ -0,0 +1,423 @@
+"""
+Benchmark and load-test suite for the adapter, run in-process against the app in `main.py` with the fake MT5 backend.
+
+Usage:
+    python -m benchmarks.run [--suite micro,http,stream] [--history 1000,10000] [--latency none] [--out results.json]
+
+Results are written as JSON (see `write_results`) so runs can be compared between commits with `benchmarks.compare`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+os.environ["MT5_BACKEND_MODULE"] = "mt5.fake_mt5"
+os.environ.setdefault("AUTH_API_KEY", "benchmark")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from main import app  # noqa: E402
+from mt5 import fake_mt5  # noqa: E402
+from mt5.history_store import reset_account_history  # noqa: E402
+from mt5.mt5_instance import init_mt5_instance  # noqa: E402
+from mt5.mt5_utils import (  # noqa: E402
+    build_open_trade_from_position_id,
+    get_trades_for_account,
+)
+
+ACCOUNT_ID = 1000000
+HEADERS = {"x-api-key": os.environ["AUTH_API_KEY"]}
+
+OPEN_TRADE_REQUEST = {
+    "instrument": "US100.cash",
+    "quantity": 0.1,
+    "entryPrice": 20000.0,
+    "stopLoss": 19970.0,
+    "takeProfit": 20060.0,
+    "riskPercentage": 0.003,
+    "riskRatio": 2.0,
+    "balanceToRisk": 10000.0,
+    "isLong": True,
+    "openTime": None,
+}
+
+
+def summarise(
+    name: str,
+    durations: List[float],
+    wall_time: float,
+    extra: Optional[dict] = None,
+    **params,
+) -> dict:
+    """
+    :param durations: Per-operation latencies in seconds
+    :param wall_time: Total elapsed time of the scenario in seconds, for throughput
+    :param extra: Additional measurements of the scenario, e.g. error counts
+    :param params: Scenario parameters, which identify it when comparing runs
+    """
+    ordered = sorted(durations)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    result = {
+        "name": name,
+        "params": params,
+        "n": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": percentile(50) * 1000,
+        "p90_ms": percentile(90) * 1000,
+        "p99_ms": percentile(99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "throughput_per_s": len(ordered) / wall_time if wall_time else None,
+        "extra": extra or {},
+    }
+    print(
+        f"{name:<40} {json.dumps(params):<45} n={result['n']:<6} p50={result['p50_ms']:9.3f}ms "
+        f"p99={result['p99_ms']:9.3f}ms thr={result['throughput_per_s'] or 0:9.1f}/s {result['extra'] or ''}"
+    )
+    return result
+
+
+def _time_calls(fn: Callable, iterations: int) -> List[float]:
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def setup_terminal(history_positions: int, open_positions: int, latency: str):
+    terminal = fake_mt5.configure(
+        history_positions=history_positions,
+        open_positions=open_positions,
+        latency=latency,
+        login=ACCOUNT_ID,
+    )
+    success, error = init_mt5_instance(ACCOUNT_ID, "benchmark", "Fake-Server", "fake")
+    assert success, error
+    return terminal
+
+
+# Microbenchmarks
+
+
+def micro_suite(history_sizes: List[int], latency: str, iterations: int) -> List[dict]:
+    results = []
+    for size in history_sizes:
+        setup_terminal(size, 5, latency)
+
+        start = time.perf_counter()
+        durations = []
+        for _ in range(max(1, iterations // 10)):
+            reset_account_history(ACCOUNT_ID)
+            durations += _time_calls(lambda: get_trades_for_account(ACCOUNT_ID), 1)
+        results.append(
+            summarise(
+                "get_trades_for_account.cold",
+                durations,
+                time.perf_counter() - start,
+                history=size,
+                latency=latency,
+            )
+        )
+
+        start = time.perf_counter()
+        durations = _time_calls(lambda: get_trades_for_account(ACCOUNT_ID), iterations)
+        results.append(
+            summarise(
+                "get_trades_for_account.warm",
+                durations,
+                time.perf_counter() - start,
+                history=size,
+                latency=latency,
+            )
+        )
+
+    terminal = setup_terminal(10, 5, latency)
+    position_id = next(iter(terminal.positions))
+    start = time.perf_counter()
+    durations = _time_calls(
+        lambda: build_open_trade_from_position_id(position_id), iterations
+    )
+    results.append(
+        summarise(
+            "build_open_trade_from_position_id",
+            durations,
+            time.perf_counter() - start,
+            latency=latency,
+        )
+    )
+    return results
+
+
+# HTTP load
+
+
+async def _run_clients(clients: int, requests_per_client: int, send) -> tuple:
+    durations: List[float] = []
+    errors = 0
+
+    async def client(client_id: int):
+        nonlocal errors
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            response = await send(client_id, i)
+            durations.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return durations, time.perf_counter() - start, errors
+
+
+async def _http_suite(
+    history_sizes: List[int], client_counts: List[int], latency: str, requests: int
+) -> List[dict]:
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://adapter", headers=HEADERS
+    ) as http:
+        for size in history_sizes:
+            setup_terminal(size, 5, latency)
+            await http.get(f"/api/v1/trades/{ACCOUNT_ID}")  # warm the history store
+            for clients in client_counts:
+                durations, wall, errors = await _run_clients(
+                    clients,
+                    requests,
+                    lambda c, i: http.get(f"/api/v1/trades/{ACCOUNT_ID}"),
+                )
+                results.append(
+                    summarise(
+                        "http.get_trades",
+                        durations,
+                        wall,
+                        history=size,
+                        clients=clients,
+                        extra={"errors": errors},
+                    )
+                )
+
+        for clients in client_counts:
+            terminal = setup_terminal(100, 0, latency)
+            durations, wall, errors = await _run_clients(
+                clients,
+                requests,
+                lambda c, i: http.post(
+                    f"/api/v1/trades/{ACCOUNT_ID}/open", json=OPEN_TRADE_REQUEST
+                ),
+            )
+            results.append(
+                summarise(
+                    "http.open_trade",
+                    durations,
+                    wall,
+                    clients=clients,
+                    extra={"errors": errors},
+                )
+            )
+
+            tickets = list(terminal.positions)
+            per_client = len(tickets) // clients
+            durations, wall, errors = await _run_clients(
+                clients,
+                per_client,
+                lambda c, i: http.post(
+                    f"/api/v1/trades/{ACCOUNT_ID}/close/{tickets[c * per_client + i]}"
+                ),
+            )
+            results.append(
+                summarise(
+                    "http.close_trade",
+                    durations,
+                    wall,
+                    clients=clients,
+                    extra={"errors": errors},
+                )
+            )
+    return results
+
+
+def http_suite(history_sizes, client_counts, latency, requests) -> List[dict]:
+    return asyncio.run(_http_suite(history_sizes, client_counts, latency, requests))
+
+
+# Stream fan-out
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _stream_scenario(
+    port: int, terminal, subscribers: int, closes: int
+) -> Dict[str, object]:
+    received: Dict[int, Dict[int, float]] = {i: {} for i in range(subscribers)}
+    connected = 0
+
+    async def subscriber(client_id: int, client: httpx.AsyncClient):
+        nonlocal connected
+        async with client.stream(
+            "GET", f"/api/v1/transactions/{ACCOUNT_ID}/stream"
+        ) as response:
+            connected += 1
+            async for line in response.aiter_lines():
+                line = line.strip()
+                if line.startswith("data:"):
+                    line = line[len("data:") :].strip()
+                if not line.startswith("{"):
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "CLOSE":
+                    received[client_id][event["position_id"]] = time.perf_counter()
+                    if len(received[client_id]) >= closes:
+                        return
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", headers=HEADERS, timeout=60
+    ) as client:
+        tasks = [
+            asyncio.ensure_future(subscriber(i, client)) for i in range(subscribers)
+        ]
+        while connected < subscribers:
+            await asyncio.sleep(0.05)
+        # Let the poller record the initial open positions
+        await asyncio.sleep(2)
+
+        calls_before = sum(terminal.calls.values())
+        started = time.perf_counter()
+        closed_at: Dict[int, float] = {}
+        for ticket in list(terminal.positions)[:closes]:
+            position = terminal.positions[ticket]
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": position.symbol,
+                    "volume": position.volume,
+                    "type": 1 - position.type,
+                    "position": ticket,
+                }
+            )
+            closed_at[ticket] = time.perf_counter()
+            await asyncio.sleep(0.2)
+
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=60)
+        wall = time.perf_counter() - started
+        calls = sum(terminal.calls.values()) - calls_before
+
+    latencies = [
+        at - closed_at[position_id]
+        for events in received.values()
+        for position_id, at in events.items()
+    ]
+    return {"latencies": latencies, "wall": wall, "terminal_calls": calls}
+
+
+def stream_suite(subscriber_counts: List[int], latency: str, closes: int) -> List[dict]:
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    results = []
+    try:
+        for subscribers in subscriber_counts:
+            terminal = setup_terminal(1000, closes, latency)
+            outcome = asyncio.run(_stream_scenario(port, terminal, subscribers, closes))
+            results.append(
+                summarise(
+                    "stream.close_event_latency",
+                    outcome["latencies"],
+                    outcome["wall"],
+                    subscribers=subscribers,
+                    extra={
+                        "terminal_calls_per_s": round(
+                            outcome["terminal_calls"] / outcome["wall"], 1
+                        )
+                    },
+                )
+            )
+    finally:
+        server.should_exit = True
+        thread.join(5)
+    return results
+
+
+def write_results(path: str, results: List[dict]):
+    try:
+        commit = (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "timestamp": datetime.now().isoformat(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Wrote {len(results)} results to {path}")
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--suite", default="micro,http,stream")
+    parser.add_argument("--history", type=_ints, default=[1000, 10000])
+    parser.add_argument("--clients", type=_ints, default=[1, 10, 50])
+    parser.add_argument("--subscribers", type=_ints, default=[1, 10, 50])
+    parser.add_argument("--latency", default="none", choices=fake_mt5.LATENCY_PROFILES)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--closes", type=int, default=3)
+    parser.add_argument("--out", default="bench_output.json")
+    args = parser.parse_args()
+
+    suites = args.suite.split(",")
+    results = []
+    if "micro" in suites:
+        results += micro_suite(args.history, args.latency, args.iterations)
+    if "http" in suites:
+        results += http_suite(args.history, args.clients, args.latency, args.requests)
+    if "stream" in suites:
+        results += stream_suite(args.subscribers, args.latency, args.closes)
+
+    write_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import importlib.util
+
+from mt5 import fake_mt5
+
+# Only stand in for the real package where it cannot be imported. Otherwise tests use `patched` and restore it after.
+if importlib.util.find_spec("MetaTrader5") is None:
+    fake_mt5.install()
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Literal, Optional, List
 from pydantic import BaseModel
 
 
@@ -15,6 +15,13 @@ class TradeRequest(BaseModel):
     openTime: Optional[float]
 
 
+class BatchCloseRequest(BaseModel):
+    tradeIds: Optional[List[int]] = None
+    # Close every open trade of the account, or of `symbol` when given
+    closeAll: bool = False
+    symbol: Optional[str] = None
+
+
 class Trade(BaseModel):
     position_id: int
     symbol: str
@@ -33,3 +40,19 @@ class Trade(BaseModel):
 
 
 TradesList = List[Trade]
+
+
+class TradesPage(BaseModel):
+    trades: TradesList
+    # Pass as `cursor` to get the next page, None on the last page
+    next_cursor: Optional[str] = None
+
+
+class TradeFilter(BaseModel):
+    # Unix seconds, compared to the trade's open time
+    from_time: Optional[int] = None
+    to_time: Optional[int] = None
+    symbol: Optional[str] = None
+    status: Optional[Literal["open", "closed"]] = None
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
@@ -1,12 +1,24 @@
 from dotenv import load_dotenv
 
 load_dotenv()
+import os
+from typing import Optional
+from mt5.backend import install_backend
+
+# Must run before any module imports MetaTrader5
+install_backend(os.getenv("MT5_BACKEND_MODULE"))
+import MetaTrader5
 from fastapi import FastAPI, Depends, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from routes.account import router as account_router
-from utils import logging
-import os
+from mt5.executor import WORKER_MODE, all_terminals
+from mt5.symbol_cache import symbol_cache
+from mt5.transaction_poller import subscriber_counts
+from mt5.worker_pool import stop_all_workers
+from utils import logging, metrics
 
+from routes.stats import router as stats_router
 from routes.trades import router as trades_router
 from routes.transactions import router as transactions_router
 
@@ -30,6 +42,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Time every MetaTrader5 call made in this process (in process mode, workers time their own and forward them)
+metrics.instrument_mt5(MetaTrader5)
+
+
+def _executor_metric(key: str):
+    def collect():
+        return [
+            ((name,), executor.metrics()[key])
+            for name, executor in all_terminals().items()
+        ]
+
+    return collect
+
+
+metrics.register(
+    metrics.CallbackMetric(
+        "executor_queue_depth",
+        "MT5 calls submitted but not yet finished, by terminal",
+        ("terminal",),
+        _executor_metric("queue_depth"),
+    )
+)
+metrics.register(
+    metrics.CallbackMetric(
+        "executor_max_queue_depth",
+        "Highest queue depth seen, by terminal",
+        ("terminal",),
+        _executor_metric("max_queue_depth"),
+    )
+)
+metrics.register(
+    metrics.CallbackMetric(
+        "executor_timeouts_total",
+        "MT5 calls that timed out waiting for the terminal",
+        ("terminal",),
+        _executor_metric("timeouts"),
+        type="counter",
+    )
+)
+metrics.register(
+    metrics.CallbackMetric(
+        "stream_subscribers",
+        "Transaction stream subscribers, by account",
+        ("account",),
+        lambda: [((str(a),), n) for a, n in subscriber_counts().items()],
+    )
+)
+# In process mode the symbol caches live in the worker processes
+if WORKER_MODE != "process":
+    metrics.register(
+        metrics.CallbackMetric(
+            "symbol_cache_hit_ratio",
+            "Symbol cache hit ratio, by cache (info or tick)",
+            ("cache",),
+            lambda: [((c,), s["hit_ratio"]) for c, s in symbol_cache.stats().items()],
+        )
+    )
+
 
 async def api_key_dependency(x_api_key: str = Header(...)):
     if x_api_key != API_KEY:
@@ -45,6 +117,9 @@ app.include_router(
 app.include_router(
     transactions_router, prefix="/api/v1", dependencies=[Depends(api_key_dependency)]
 )
+app.include_router(
+    stats_router, prefix="/api/v1", dependencies=[Depends(api_key_dependency)]
+)
 
 
 @app.on_event("startup")
@@ -52,9 +127,37 @@ async def startup_event():
     logging.configure_logging()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    stop_all_workers()
+
+
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    status = {
+        "status": "healthy",
+        "terminals": {
+            name: executor.metrics() for name, executor in all_terminals().items()
+        },
+    }
+    # In process mode the symbol caches live in the worker processes
+    if WORKER_MODE != "process":
+        status["symbol_cache"] = symbol_cache.stats()
+    return status
+
+
+@app.get("/metrics")
+async def get_metrics(x_api_key: Optional[str] = Header(None)):
+    """
+    Serves metrics in the Prometheus text format. Unauthenticated unless METRICS_REQUIRE_API_KEY is set.
+    """
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if metrics.METRICS_REQUIRE_API_KEY and x_api_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Could not validate API KEY")
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 if __name__ == "__main__":
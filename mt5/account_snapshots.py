@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+import MetaTrader5 as mt5
+from fastapi import HTTPException
+
+from mt5.executor import get_terminal
+from mt5.risk_gate import record_account
+from utils.logging import get_logger, log_error
+
+log = get_logger(__name__)
+
+# Seconds between background refreshes of an account's snapshot
+ACCOUNT_REFRESH_INTERVAL = float(os.getenv("ACCOUNT_REFRESH_INTERVAL", "1"))
+# Seconds without a read after which an account's snapshot stops being refreshed
+ACCOUNT_IDLE_TIMEOUT = float(os.getenv("ACCOUNT_IDLE_TIMEOUT", "60"))
+# Refresh intervals a snapshot can be behind (e.g. when refreshes are failing) before reads go to the terminal
+STALE_INTERVALS = 3
+
+
+def read_account_info() -> Tuple[Optional[dict], Tuple[int, str]]:
+    """
+    Runs on the terminal thread, so the account info and its error cannot interleave with other calls
+    """
+    account = mt5.account_info()
+    error = mt5.last_error()
+    if not account:
+        return None, error
+    account = account._asdict()
+    record_account(account)
+    return account, error
+
+
+class AccountSnapshot:
+    """
+    An account_info read, pre-serialised, with validators for conditional requests
+    """
+
+    def __init__(self, account: dict):
+        self.account = account
+        self.body = json.dumps(account).encode()
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        # HTTP dates have second precision
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.refreshed_at = time.monotonic()
+
+
+class AccountSnapshotCache:
+    """
+    Keeps the latest account_info of one account, refreshed in the background while it is being read.
+
+    Concurrent reads that need the terminal share a single account_info call.
+    """
+
+    def __init__(
+        self,
+        account_id: int,
+        fetch: Callable = read_account_info,
+        interval: float = ACCOUNT_REFRESH_INTERVAL,
+        idle_timeout: float = ACCOUNT_IDLE_TIMEOUT,
+    ):
+        self.account_id = account_id
+        self.fetch = fetch
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.snapshot: Optional[AccountSnapshot] = None
+        self._invalidated = False
+        self._last_read = 0.0
+        self._refreshing: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def stale(self) -> bool:
+        if self.snapshot is None or self._invalidated:
+            return True
+        age = time.monotonic() - self.snapshot.refreshed_at
+        return age > self.interval * STALE_INTERVALS
+
+    async def get(self, fresh: bool = False) -> AccountSnapshot:
+        """
+        :param fresh: Read from the terminal rather than returning the cached snapshot
+        """
+        self._last_read = time.monotonic()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        if fresh or self.stale:
+            return await self.refresh()
+        return self.snapshot
+
+    async def refresh(self) -> AccountSnapshot:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._read())
+        return await asyncio.shield(self._refreshing)
+
+    def invalidate(self):
+        """
+        Forces the next read to go to the terminal, e.g. after a trade changed the balance or margin
+        """
+        self._invalidated = True
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _read(self) -> AccountSnapshot:
+        self._invalidated = False
+        account, error = await get_terminal(self.account_id).run(self.fetch)
+        if not account:
+            err_str = log_error(
+                error, f"/accounts/<accountId> [GET] with accountId: {self.account_id}"
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to fetch account information: {err_str}",
+            )
+
+        if self.snapshot is not None and self.snapshot.account == account:
+            # Unchanged, so keep the validators clients already hold
+            self.snapshot.refreshed_at = time.monotonic()
+        else:
+            self.snapshot = AccountSnapshot(account)
+        return self.snapshot
+
+    async def _run(self):
+        try:
+            while time.monotonic() - self._last_read < self.idle_timeout:
+                await asyncio.sleep(self.interval)
+                if (
+                    self.snapshot is not None
+                    and time.monotonic() - self.snapshot.refreshed_at < self.interval
+                ):
+                    # A fresh read happened since the last refresh
+                    continue
+                try:
+                    await self.refresh()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.error(
+                        f"Failed to refresh account snapshot for {self.account_id}: {e}"
+                    )
+            log.debug(f"Stopped refreshing idle account snapshot for {self.account_id}")
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+
+_snapshots: Dict[int, AccountSnapshotCache] = {}
+
+
+def get_account_snapshots(account_id: int) -> AccountSnapshotCache:
+    if account_id not in _snapshots:
+        _snapshots[account_id] = AccountSnapshotCache(account_id)
+    return _snapshots[account_id]
+
+
+def reset_account_snapshots(account_id: int):
+    cache = _snapshots.pop(account_id, None)
+    if cache is not None:
+        cache.stop()
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from fastapi import HTTPException
+
+from mt5.account_snapshots import AccountSnapshotCache
+
+
+class FakeAccount:
+    def __init__(self):
+        self.balance = 10000.0
+        self.calls = 0
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def read(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.01)
+        if self.fail:
+            return None, (-1, "Terminal: Call failed")
+        return {"login": 1, "balance": self.balance}, (1, "Success")
+
+
+class AccountSnapshotCacheTestCase(unittest.TestCase):
+    def test_reads_are_served_from_the_snapshot(self):
+        account = FakeAccount()
+        cache = AccountSnapshotCache(1, fetch=account.read, interval=10)
+
+        async def scenario():
+            first = await cache.get()
+            second = await cache.get()
+            cache.stop()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+
+        self.assertIs(first, second)
+        self.assertEqual(1, account.calls)
+        self.assertEqual(b'{"login": 1, "balance": 10000.0}', first.body)
+
+    def test_concurrent_fresh_reads_share_one_call(self):
+        account = FakeAccount()
+        cache = AccountSnapshotCache(1, fetch=account.read, interval=10)
+
+        async def scenario():
+            await asyncio.gather(*(cache.get(fresh=True) for _ in range(10)))
+            cache.stop()
+
+        asyncio.run(scenario())
+
+        self.assertEqual(1, account.calls)
+
+    def test_etag_only_changes_with_the_account(self):
+        account = FakeAccount()
+        cache = AccountSnapshotCache(1, fetch=account.read, interval=10)
+
+        async def scenario():
+            first = (await cache.get()).etag
+            unchanged = (await cache.get(fresh=True)).etag
+            account.balance = 9000.0
+            cache.invalidate()
+            changed = (await cache.get()).etag
+            cache.stop()
+            return first, unchanged, changed
+
+        first, unchanged, changed = asyncio.run(scenario())
+
+        self.assertEqual(first, unchanged)
+        self.assertNotEqual(first, changed)
+        self.assertEqual(3, account.calls)
+
+    def test_background_refresh(self):
+        account = FakeAccount()
+        cache = AccountSnapshotCache(1, fetch=account.read, interval=0.05)
+
+        async def scenario():
+            await cache.get()
+            account.balance = 9000.0
+            await asyncio.sleep(0.2)
+            snapshot = await cache.get()
+            cache.stop()
+            return snapshot
+
+        snapshot = asyncio.run(scenario())
+
+        self.assertEqual(9000.0, snapshot.account["balance"])
+        self.assertGreater(account.calls, 2)
+
+    def test_stops_refreshing_when_idle(self):
+        account = FakeAccount()
+        cache = AccountSnapshotCache(
+            1, fetch=account.read, interval=0.02, idle_timeout=0.05
+        )
+
+        async def scenario():
+            await cache.get()
+            await asyncio.sleep(0.2)
+            calls = account.calls
+            await asyncio.sleep(0.1)
+            return calls
+
+        calls = asyncio.run(scenario())
+
+        self.assertEqual(calls, account.calls)
+        self.assertIsNone(cache._task)
+
+    def test_failed_read(self):
+        account = FakeAccount()
+        account.fail = True
+        cache = AccountSnapshotCache(1, fetch=account.read, interval=10)
+
+        async def scenario():
+            try:
+                await cache.get()
+            finally:
+                cache.stop()
+
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(scenario())
+        self.assertEqual(500, ctx.exception.status_code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,19 @@
+import importlib
+import sys
+from typing import Optional
+
+
+def install_backend(module_name: Optional[str]):
+    """
+    Makes `import MetaTrader5` resolve to the given module (e.g. `mt5.fake_mt5`). Must be called before any adapter
+    module imports MetaTrader5, unless the backend provides its own `install()` that can rebind them.
+
+    :param module_name: Module to use in place of MetaTrader5. Does nothing when empty.
+    """
+    if not module_name:
+        return
+    module = importlib.import_module(module_name)
+    if hasattr(module, "install"):
+        module.install()
+    else:
+        sys.modules["MetaTrader5"] = module
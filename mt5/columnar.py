@@ -0,0 +1,252 @@
+"""
+Columnar (NumPy) trade reconstruction.
+
+Produces the same TradesList as the per-position dict path in `mt5_utils`, but pairs orders and joins deal profit
+with array operations. Syncs do not use it: they keep per-position orders for incremental rebuilds, and building those
+as well as the arrays costs more than the columnar pass saves (see `benchmarks.reconstruction_bench`).
+"""
+
+from operator import attrgetter
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+from fastapi import HTTPException
+
+from internal_types import Trade, TradesList
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+
+ORDER_FIELDS = [
+    ("ticket", np.int64),
+    ("position_id", np.int64),
+    ("type", np.int64),
+    ("time_done", np.int64),
+    ("volume_initial", np.float64),
+    ("price_current", np.float64),
+    ("sl", np.float64),
+    ("tp", np.float64),
+    ("symbol", object),
+]
+ORDER_DTYPE = np.dtype(ORDER_FIELDS)
+
+DEAL_FIELDS = [
+    ("ticket", np.int64),
+    ("order", np.int64),
+    ("position_id", np.int64),
+    ("profit", np.float64),
+    ("swap", np.float64),
+    ("commission", np.float64),
+]
+DEAL_DTYPE = np.dtype(DEAL_FIELDS)
+
+_KEY_DTYPE = np.dtype([("position_id", np.int64), ("order", np.int64)])
+
+
+def orders_to_array(orders: Iterable) -> np.ndarray:
+    """
+    Converts MT5 TradeOrder namedtuples to a structured array, without going through `_asdict()`
+    """
+    get_fields = attrgetter(*[name for name, _ in ORDER_FIELDS])
+    return np.array([get_fields(order) for order in orders], dtype=ORDER_DTYPE)
+
+
+def deals_to_array(deals: Iterable) -> np.ndarray:
+    """
+    Converts MT5 TradeDeal namedtuples to a structured array, without going through `_asdict()`
+    """
+    get_fields = attrgetter(*[name for name, _ in DEAL_FIELDS])
+    return np.array([get_fields(deal) for deal in deals], dtype=DEAL_DTYPE)
+
+
+def _last_row_per_group(
+    rows: np.ndarray, group_of_row: np.ndarray, n_groups: int
+) -> np.ndarray:
+    """
+    For rows sorted by group, returns the last row index of each group (or -1 if the group has no rows)
+    """
+    result = np.full(n_groups, -1, dtype=np.int64)
+    if len(rows) == 0:
+        return result
+    groups = group_of_row[rows]
+    is_last = np.append(groups[1:] != groups[:-1], True)
+    result[groups[is_last]] = rows[is_last]
+    return result
+
+
+def _close_profit(
+    deals: np.ndarray, position_ids: np.ndarray, close_tickets: np.ndarray
+):
+    """
+    Joins net deal profit (profit + swap + commission) on (position_id, order).
+
+    :return: Tuple of (profit array, has_deal mask) aligned with the query arrays
+    """
+    if len(deals):
+        _, unique_idx = np.unique(deals["ticket"], return_index=True)
+        deals = deals[unique_idx]
+
+    keys = np.empty(len(deals) + len(position_ids), dtype=_KEY_DTYPE)
+    keys["position_id"][: len(deals)] = deals["position_id"]
+    keys["order"][: len(deals)] = deals["order"]
+    keys["position_id"][len(deals) :] = position_ids
+    keys["order"][len(deals) :] = close_tickets
+
+    unique_keys, key_ids = np.unique(keys, return_inverse=True)
+    deal_key_ids = key_ids[: len(deals)]
+    query_key_ids = key_ids[len(deals) :]
+
+    net = deals["profit"] + deals["swap"] + deals["commission"]
+    sums = np.bincount(deal_key_ids, weights=net, minlength=len(unique_keys))
+    counts = np.bincount(deal_key_ids, minlength=len(unique_keys))
+
+    return sums[query_key_ids], counts[query_key_ids] > 0
+
+
+def reconstruct_trades_columnar(
+    orders: np.ndarray,
+    deals: np.ndarray,
+    build_open_trade: Callable[[Trade, int], Optional[Trade]],
+) -> TradesList:
+    """
+    Reconstructs trades from order and deal arrays.
+
+    :param orders: Structured array of ORDER_DTYPE
+    :param deals: Structured array of DEAL_DTYPE
+    :param build_open_trade: Called with the generic trade data and the order ticket for every position that only has
+        an opening order. It should populate the live position data, as the history alone cannot.
+    :return: Trades in order of first appearance of each position, matching the dict path
+    """
+    if len(orders) == 0:
+        return []
+
+    # Stable sort so orders within a position keep their original order
+    sort_idx = np.argsort(orders["position_id"], kind="stable")
+    sorted_orders = orders[sort_idx]
+    position_ids, first_rows, group_of_row = np.unique(
+        sorted_orders["position_id"], return_index=True, return_inverse=True
+    )
+    n_positions = len(position_ids)
+
+    buy_rows = _last_row_per_group(
+        np.nonzero(sorted_orders["type"] == ORDER_TYPE_BUY)[0],
+        group_of_row,
+        n_positions,
+    )
+    sell_rows = _last_row_per_group(
+        np.nonzero(sorted_orders["type"] == ORDER_TYPE_SELL)[0],
+        group_of_row,
+        n_positions,
+    )
+
+    unsupported = ~np.isin(sorted_orders["type"], [ORDER_TYPE_BUY, ORDER_TYPE_SELL])
+    if unsupported.any():
+        log.warning(
+            f"Unsupport order type for {int(unsupported.sum())} orders across positions {np.unique(sorted_orders['position_id'][unsupported]).tolist()}"
+        )
+
+    has_buy = buy_rows >= 0
+    has_sell = sell_rows >= 0
+    is_closed = has_buy & has_sell
+    is_open = has_buy ^ has_sell
+
+    # Closed legs: the earlier of the buy/sell orders opened the position
+    buy_time = sorted_orders["time_done"][np.where(has_buy, buy_rows, 0)]
+    sell_time = sorted_orders["time_done"][np.where(has_sell, sell_rows, 0)]
+    is_long = buy_time < sell_time
+    open_rows = np.where(is_long, buy_rows, sell_rows)
+    close_rows = np.where(is_long, sell_rows, buy_rows)
+
+    closed_groups = np.nonzero(is_closed)[0]
+    open_legs = sorted_orders[open_rows[closed_groups]]
+    close_legs = sorted_orders[close_rows[closed_groups]]
+    profit, has_profit = _close_profit(
+        deals, position_ids[closed_groups], close_legs["ticket"]
+    )
+
+    if not has_profit.all():
+        missing = position_ids[closed_groups][~has_profit][0]
+        log.error(f"Profit should not be None for position {missing}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unable to calculate profit for position {missing}. Check adapter logs.",
+        )
+
+    # Generic data comes from the first order of each position
+    first_orders = sorted_orders[first_rows]
+    symbols = first_orders["symbol"].tolist()
+    volumes = first_orders["volume_initial"].tolist()
+
+    closed_trades = {}
+    for (
+        group,
+        long,
+        open_ticket,
+        open_price,
+        open_time,
+        sl,
+        tp,
+        close_ticket,
+        close_price,
+        close_time,
+        net,
+    ) in zip(
+        closed_groups.tolist(),
+        is_long[closed_groups].tolist(),
+        open_legs["ticket"].tolist(),
+        open_legs["price_current"].tolist(),
+        open_legs["time_done"].tolist(),
+        open_legs["sl"].tolist(),
+        open_legs["tp"].tolist(),
+        close_legs["ticket"].tolist(),
+        close_legs["price_current"].tolist(),
+        close_legs["time_done"].tolist(),
+        profit.tolist(),
+    ):
+        closed_trades[group] = {
+            "position_id": int(position_ids[group]),
+            "symbol": symbols[group],
+            "total_volume": volumes[group],
+            "is_long": long,
+            "open_order_ticket": open_ticket,
+            "open_order_price": open_price,
+            "open_order_time": open_time,
+            "stop_loss": sl,
+            "take_profit": tp,
+            "close_order_ticket": close_ticket,
+            "close_order_price": close_price,
+            "close_order_time": close_time,
+            "profit": round(net, 2),
+            "is_open": False,
+        }
+
+    list_of_trades: TradesList = []
+    # Emit positions in order of their first order in the input, as the dict path does
+    for group in np.argsort(sort_idx[first_rows], kind="stable").tolist():
+        if is_closed[group]:
+            list_of_trades.append(closed_trades[group])
+        elif is_open[group]:
+            ticket = int(
+                sorted_orders["ticket"][
+                    buy_rows[group] if has_buy[group] else sell_rows[group]
+                ]
+            )
+            trade = build_open_trade(
+                {
+                    "position_id": int(position_ids[group]),
+                    "symbol": symbols[group],
+                    "total_volume": volumes[group],
+                },
+                ticket,
+            )
+            if trade is not None:
+                list_of_trades.append(trade)
+        else:
+            log.warning(
+                f"For position {int(position_ids[group])}, found no order_buy or order_sell"
+            )
+
+    return list_of_trades
@@ -0,0 +1,51 @@
+import unittest
+
+from mt5.columnar import deals_to_array, orders_to_array, reconstruct_trades_columnar
+from mt5.fake_history import Order, synthetic_history
+from mt5.history_store import AccountHistory
+from mt5.mt5_utils import DealIndex, _build_trade
+
+
+def reconstruct(orders, deals, build_open_trade=lambda trade, ticket: None):
+    return reconstruct_trades_columnar(
+        orders_to_array(orders), deals_to_array(deals), build_open_trade
+    )
+
+
+class ColumnarReconstructionTestCase(unittest.TestCase):
+    def test_matches_dict_path(self):
+        orders, deals = synthetic_history(2000, seed=7)
+
+        history = AccountHistory(0)
+        history.merge_orders(orders)
+        deal_index = DealIndex(deals)
+        for position_id in history.positions_to_rebuild():
+            history.store_trade(
+                _build_trade(
+                    0, position_id, history.orders_for_position(position_id), deal_index
+                )
+            )
+
+        self.assertEqual(history.list_trades(), reconstruct(orders, deals))
+
+    def test_open_positions_use_builder(self):
+        orders, deals = synthetic_history(4, seed=1)
+        # A position with only an opening order is still open
+        orders.append(Order(999, 999, 0, 1800000000, 0.1, 1.1, 1.0, 1.2, "EURUSD"))
+
+        seen = []
+
+        def build_open_trade(trade, ticket):
+            seen.append(ticket)
+            return {**trade, "is_open": True}
+
+        trades = reconstruct(orders, deals, build_open_trade)
+
+        self.assertEqual([999], seen)
+        self.assertEqual(3, len(trades))
+        self.assertEqual(999, trades[-1]["position_id"])
+        self.assertTrue(trades[-1]["is_open"])
+
+
+if __name__ == "__main__":
+    unittest.main()
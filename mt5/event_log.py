@@ -0,0 +1,181 @@
+import asyncio
+import bisect
+import json
+import math
+import os
+import queue
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Events kept in memory per account for clients resuming the transaction stream
+EVENT_BUFFER_SIZE = int(os.getenv("STREAM_EVENT_BUFFER_SIZE", "1000"))
+# Directory to also append every account's events to, so they can be replayed beyond the buffer and after restarts
+EVENT_LOG_DIR = os.getenv("STREAM_EVENT_LOG_DIR")
+# Every this many events, the file offset of an event is kept in memory to start resumes from
+INDEX_STEP = 100
+
+
+class AccountEventLog:
+    """
+    An account's transaction stream events, numbered with monotonically increasing sequence ids.
+
+    The latest events are kept in a ring buffer. When given a path, every event is also appended to it as a JSON line,
+    and the sequence and buffer are restored from it on start up. Lines are written and flushed by a background thread,
+    in batches of whatever has queued up, so publishing never waits on the disk. Every INDEX_STEP-th event's file
+    offset is indexed, so resuming from beyond the buffer only reads the file from just before the client's seq.
+    """
+
+    def __init__(
+        self,
+        account_id: int,
+        capacity: int = EVENT_BUFFER_SIZE,
+        path: Optional[str] = None,
+    ):
+        self.account_id = account_id
+        self.path = path
+        self.buffer: Deque[dict] = deque(maxlen=capacity)
+        self.last_seq = 0
+        # (seq, file offset of its line), for every INDEX_STEP-th event
+        self._index: List[Tuple[int, int]] = []
+        self._file = None
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if path is not None:
+            self._load()
+            self._file = open(path, "ab")
+            self._writer = threading.Thread(
+                target=self._write_events,
+                name=f"event-log-{account_id}",
+                daemon=True,
+            )
+            self._writer.start()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # A partially written last line, e.g. after a crash
+                    log.warning(f"Skipping corrupt event in {self.path}")
+                    offset += len(line)
+                    continue
+                self.buffer.append(event)
+                self.last_seq = event["seq"]
+                self._index_event(event["seq"], offset)
+                offset += len(line)
+        log.info(
+            f"Restored transaction events up to seq {self.last_seq} for account {self.account_id}"
+        )
+
+    def _index_event(self, seq: int, offset: int):
+        if seq % INDEX_STEP == 0:
+            self._index.append((seq, offset))
+
+    def _write_events(self):
+        while True:
+            # Everything queued so far is written with a single flush
+            events = [self._queue.get()]
+            while not self._queue.empty():
+                events.append(self._queue.get_nowait())
+            try:
+                for event in events:
+                    if event is not None:
+                        self._index_event(event["seq"], self._file.tell())
+                        self._file.write(json.dumps(event).encode() + b"\n")
+                self._file.flush()
+            except Exception as e:
+                log.error(f"Failed to write transaction events to {self.path}: {e}")
+            for _ in events:
+                self._queue.task_done()
+            if events[-1] is None:
+                return
+
+    @property
+    def first_seq(self) -> int:
+        """
+        The sequence id of the oldest buffered event, or the next one if nothing is buffered
+        """
+        return self.buffer[0]["seq"] if self.buffer else self.last_seq + 1
+
+    def append(self, event: dict) -> dict:
+        """
+        :return: The event with its sequence id
+        """
+        self.last_seq += 1
+        event = {"seq": self.last_seq, **event}
+        self.buffer.append(event)
+        if self._writer is not None:
+            self._queue.put(event)
+        return event
+
+    async def since(self, seq: int) -> Tuple[List[dict], bool]:
+        """
+        :param seq: The sequence id of the last event the client received
+        :return: The events after it, and whether they are complete. They are not when the client is ahead of this log
+                 (e.g. it was restarted without a file), or behind everything that was kept.
+        """
+        if seq > self.last_seq:
+            return [], False
+        if seq + 1 >= self.first_seq:
+            return [e for e in self.buffer if e["seq"] > seq], True
+        if self.path is None:
+            return list(self.buffer), False
+
+        # Waiting for the writer and reading the file would stall the event loop
+        loop = asyncio.get_running_loop()
+        events, complete = await loop.run_in_executor(None, self._read_file, seq)
+        # Events appended meanwhile may not have been written when the file was read
+        last = events[-1]["seq"] if events else seq
+        if last + 1 < self.first_seq:
+            complete = False
+        events += [e for e in self.buffer if e["seq"] > last]
+        return events, complete
+
+    def _read_file(self, seq: int) -> Tuple[List[dict], bool]:
+        # Events older than the buffer were queued long ago, so this rarely waits
+        self._queue.join()
+        # The last indexed event at or before the first one wanted
+        i = bisect.bisect_right(self._index, (seq + 1, math.inf)) - 1
+        offset = self._index[i][1] if i >= 0 else 0
+        events = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event["seq"] > seq:
+                    events.append(event)
+        return events, bool(events) and events[0]["seq"] == seq + 1
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_event_logs: Dict[int, AccountEventLog] = {}
+
+
+def get_event_log(account_id: int) -> AccountEventLog:
+    if account_id not in _event_logs:
+        path = None
+        if EVENT_LOG_DIR:
+            os.makedirs(EVENT_LOG_DIR, exist_ok=True)
+            path = os.path.join(EVENT_LOG_DIR, f"{account_id}.jsonl")
+        _event_logs[account_id] = AccountEventLog(account_id, path=path)
+    return _event_logs[account_id]
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from mt5.event_log import AccountEventLog
+
+
+class AccountEventLogTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_sequence_ids(self):
+        events = AccountEventLog(1)
+
+        first = events.append({"type": "OPEN", "position_id": 1})
+        second = events.append({"type": "CLOSE", "position_id": 1})
+
+        self.assertEqual(1, first["seq"])
+        self.assertEqual(2, second["seq"])
+        self.assertEqual(([second], True), await events.since(1))
+        self.assertEqual(([], True), await events.since(2))
+
+    async def test_replay_beyond_the_buffer_is_incomplete(self):
+        events = AccountEventLog(1, capacity=2)
+        for i in range(5):
+            events.append({"type": "OPEN", "position_id": i})
+
+        replay, complete = await events.since(1)
+
+        self.assertFalse(complete)
+        self.assertEqual([4, 5], [e["seq"] for e in replay])
+        self.assertEqual(([], False), await events.since(10))
+
+    async def test_file_replay_and_restore(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "1.jsonl")
+            events = AccountEventLog(1, capacity=2, path=path)
+            for i in range(5):
+                events.append({"type": "OPEN", "position_id": i})
+
+            replay, complete = await events.since(1)
+            self.assertTrue(complete)
+            self.assertEqual([2, 3, 4, 5], [e["seq"] for e in replay])
+            events.close()
+
+            restored = AccountEventLog(1, capacity=2, path=path)
+            self.assertEqual(5, restored.last_seq)
+            self.assertEqual(6, restored.append({"type": "OPEN"})["seq"])
+            restored.close()
+
+    async def test_file_replay_runs_off_the_event_loop(self):
+        with tempfile.TemporaryDirectory() as directory:
+            events = AccountEventLog(
+                1, capacity=2, path=os.path.join(directory, "1.jsonl")
+            )
+            for i in range(5):
+                events.append({"type": "OPEN", "position_id": i})
+            read_file = events._read_file
+            readers = []
+            appended = threading.Event()
+
+            def _read_file(seq):
+                result = read_file(seq)
+                readers.append(threading.current_thread())
+                # An event is appended after the file was read, before the replay is returned
+                appended.wait(1)
+                return result
+
+            events._read_file = _read_file
+            replay = asyncio.ensure_future(events.since(1))
+            await asyncio.sleep(0.05)
+            events.append({"type": "OPEN", "position_id": 5})
+            appended.set()
+            replay, complete = await replay
+            events.close()
+
+        self.assertIsNot(threading.main_thread(), readers[0])
+        self.assertTrue(complete)
+        self.assertEqual([2, 3, 4, 5, 6], [e["seq"] for e in replay])
+
+    async def test_file_replay_starts_from_the_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "1.jsonl")
+            events = AccountEventLog(1, capacity=10, path=path)
+            for i in range(250):
+                events.append({"type": "OPEN", "position_id": i})
+            events.close()
+
+            restored = AccountEventLog(1, capacity=10, path=path)
+            for seq in (0, 99, 100, 199, 230):
+                replay, complete = await restored.since(seq)
+                self.assertTrue(complete)
+                self.assertEqual(list(range(seq + 1, 251)), [e["seq"] for e in replay])
+            self.assertEqual([100, 200], [seq for seq, _ in restored._index])
+            restored.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from mt5.worker_pool import TerminalWorker
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Seconds to wait for a terminal call before giving up on it
+DEFAULT_TIMEOUT = float(os.getenv("MT5_CALL_TIMEOUT", "30"))
+
+# "thread": every account shares this process' MT5 connection, through a single terminal thread
+# "process": every account gets a dedicated worker process with its own MT5 connection
+WORKER_MODE = os.getenv("MT5_WORKER_MODE", "thread")
+
+
+class TerminalTimeout(HTTPException):
+    """
+    A 504 for a terminal call that did not finish in time
+
+    :param pending: Resolves with the call's outcome when it was already running (and so will still finish, e.g. an
+        order that may fill), or None when it was cancelled before it ran
+    """
+
+    def __init__(self, detail: str, pending: Optional[asyncio.Future] = None):
+        super().__init__(status_code=504, detail=detail)
+        self.pending = pending
+
+
+class TerminalExecutor:
+    """
+    Runs blocking MetaTrader5 calls off the asyncio event loop.
+
+    The MT5 IPC is not thread safe, so every call goes through one dedicated thread. Callers should submit whole units
+    of work (e.g. a call and its `mt5.last_error()`), rather than individual calls, so nothing can interleave them.
+
+    When given a worker, each unit of work is forwarded to the worker process instead of running in this process.
+
+    State kept beside an account's MT5 connection (e.g. symbol_cache, lot_sizer, the risk gate's exposure indexes)
+    lives in the process owning that connection, and calls the terminal on a miss. It must only be used from units of
+    work run through the account's executor (`get_terminal(account_id).run`), never from the event loop.
+    """
+
+    def __init__(
+        self, name: str = "mt5-terminal", worker: Optional[TerminalWorker] = None
+    ):
+        self.worker = worker
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.finished = 0
+        self.timeouts = 0
+        self.max_queue_depth = 0
+        self.last_call_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Calls submitted but not yet finished, including the one currently running
+        """
+        with self._lock:
+            return self.submitted - self.finished
+
+    def _call(self, fn: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            if self.worker is not None:
+                return self.worker.call(fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.finished += 1
+                self.last_call_seconds = time.perf_counter() - start
+
+    def _count_submitted(self):
+        with self._lock:
+            self.submitted += 1
+            self.max_queue_depth = max(
+                self.max_queue_depth, self.submitted - self.finished
+            )
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on the terminal thread, blocking until it finishes. For code that is already off the
+        event loop, e.g. running on another executor's thread.
+        """
+        self._count_submitted()
+        return self._executor.submit(self._call, fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on the terminal thread, raising a 504 if it does not finish within the timeout.
+
+        A call that times out while still queued is cancelled. One that is already running cannot be interrupted,
+        and will finish in the background, which the TerminalTimeout's `pending` future follows.
+        """
+        self._count_submitted()
+
+        loop = asyncio.get_event_loop()
+        future = self._executor.submit(self._call, fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future, loop=loop),
+                timeout if timeout is not None else DEFAULT_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            pending = None
+            if future.cancel():
+                # Never ran, so _call will not count it as finished
+                with self._lock:
+                    self.finished += 1
+            else:
+                pending = asyncio.wrap_future(future, loop=loop)
+                # Marks its error as retrieved, as most callers never look at it
+                pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+            with self._lock:
+                self.timeouts += 1
+            name = getattr(fn, "__name__", repr(fn))
+            log.error(
+                f"Terminal call {name} timed out after {timeout or DEFAULT_TIMEOUT}s"
+            )
+            raise TerminalTimeout(
+                f"Timed out waiting for MT5 terminal ({name})", pending
+            )
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self.submitted - self.finished,
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "finished": self.finished,
+                "timeouts": self.timeouts,
+                "last_call_seconds": self.last_call_seconds,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+terminal = TerminalExecutor()
+
+_account_terminals: Dict[int, TerminalExecutor] = {}
+
+
+def register_worker(account_id: int, worker: TerminalWorker):
+    """
+    Routes all of the account's terminal calls to its worker process
+    """
+    previous = _account_terminals.get(account_id)
+    if previous is not None and previous.worker is worker:
+        return
+    _account_terminals[account_id] = TerminalExecutor(
+        name=f"mt5-worker-{account_id}", worker=worker
+    )
+    if previous is not None:
+        previous.shutdown()
+
+
+def unregister_worker(account_id: int):
+    previous = _account_terminals.pop(account_id, None)
+    if previous is not None:
+        previous.shutdown()
+
+
+def get_terminal(account_id: int) -> TerminalExecutor:
+    """
+    Returns the executor owning the account's MT5 connection
+    """
+    if WORKER_MODE != "process":
+        return terminal
+    if account_id not in _account_terminals:
+        raise HTTPException(
+            status_code=409,
+            detail=f"MT5 instance not initialized for account {account_id}",
+        )
+    return _account_terminals[account_id]
+
+
+def all_terminals() -> Dict[str, TerminalExecutor]:
+    if WORKER_MODE != "process":
+        return {"default": terminal}
+    return {str(account_id): t for account_id, t in _account_terminals.items()}
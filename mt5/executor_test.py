@@ -0,0 +1,40 @@
+import threading
+import time
+import unittest
+
+from fastapi import HTTPException
+
+from mt5.executor import TerminalExecutor
+
+
+class TerminalExecutorTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_runs_calls_on_a_single_thread(self):
+        executor = TerminalExecutor()
+
+        threads = {await executor.run(threading.get_ident) for _ in range(5)}
+
+        self.assertEqual(1, len(threads))
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertEqual(0, executor.queue_depth)
+        self.assertEqual(5, executor.metrics()["finished"])
+
+    async def test_blocking_calls_share_the_terminal_thread(self):
+        executor = TerminalExecutor()
+
+        thread = await executor.run(threading.get_ident)
+
+        self.assertEqual(thread, executor.call(threading.get_ident))
+        self.assertEqual(2, executor.metrics()["finished"])
+
+    async def test_times_out(self):
+        executor = TerminalExecutor()
+
+        with self.assertRaises(HTTPException) as ctx:
+            await executor.run(time.sleep, 0.2, timeout=0.01)
+
+        self.assertEqual(504, ctx.exception.status_code)
+        self.assertEqual(1, executor.metrics()["timeouts"])
+
+
+if __name__ == "__main__":
+    unittest.main()
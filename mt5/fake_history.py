@@ -0,0 +1,75 @@
+"""
+Synthetic order and deal histories for exercising trade reconstruction without a terminal, shaped like the
+TradeOrder and TradeDeal namedtuples MetaTrader5 returns (with only the fields reconstruction reads).
+"""
+
+import random
+from collections import namedtuple
+
+Order = namedtuple(
+    "TradeOrder",
+    "ticket position_id type time_done volume_initial price_current sl tp symbol",
+)
+Deal = namedtuple("TradeDeal", "ticket order position_id profit swap commission symbol")
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "XAUUSD", "US100.cash"]
+
+
+def synthetic_history(n_orders: int, seed: int = 42):
+    """
+    Builds n_orders orders (two per closed position) and an opening and a closing deal per position
+    """
+    rng = random.Random(seed)
+    orders, deals = [], []
+    t = 1704067200  # 2024-01-01
+    for i in range(n_orders // 2):
+        position_id = 100_000_000 + i
+        symbol = rng.choice(SYMBOLS)
+        is_long = rng.random() < 0.5
+        volume = round(rng.uniform(0.01, 2.0), 2)
+        open_price = rng.uniform(1.0, 2.0)
+        close_price = open_price * rng.uniform(0.99, 1.01)
+        t += rng.randint(1, 600)
+        close_time = t + rng.randint(60, 3600)
+        open_type, close_type = (0, 1) if is_long else (1, 0)
+        orders.append(
+            Order(
+                position_id,
+                position_id,
+                open_type,
+                t,
+                volume,
+                open_price,
+                open_price * 0.99,
+                open_price * 1.02,
+                symbol,
+            )
+        )
+        orders.append(
+            Order(
+                position_id + 50_000_000,
+                position_id,
+                close_type,
+                close_time,
+                volume,
+                close_price,
+                0.0,
+                0.0,
+                symbol,
+            )
+        )
+        deals.append(
+            Deal(position_id, position_id, position_id, 0.0, 0.0, -0.5, symbol)
+        )
+        deals.append(
+            Deal(
+                position_id + 50_000_000,
+                position_id + 50_000_000,
+                position_id,
+                round(rng.uniform(-100, 100), 2),
+                round(rng.uniform(-1, 0), 2),
+                -0.5,
+                symbol,
+            )
+        )
+    return orders, deals
@@ -0,0 +1,825 @@
+"""
+In-process stand-in for the MetaTrader5 package, for tests, load tests and benchmarks on machines without a terminal.
+
+It implements the subset of the MetaTrader5 API this adapter uses, backed by a seeded, deterministic synthetic market
+and trade history. Call latency can be simulated with one of LATENCY_PROFILES.
+
+Use it by either:
+- setting `MT5_BACKEND_MODULE=mt5.fake_mt5` before starting the app (also applies to worker processes),
+- calling `install()` before (or after) importing the adapter modules, or
+- wrapping a test in `with patched(...)`.
+
+The generated history is configured with `configure(...)`, or the FAKE_MT5_* env vars for worker processes.
+"""
+
+import fnmatch
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Constants, matching the MetaTrader5 package
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+ORDER_STATE_FILLED = 4
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_TIME_GTC = 0
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_TYPE_BALANCE = 2
+DEAL_TYPE_CREDIT = 3
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_ENTRY_INOUT = 2
+DEAL_ENTRY_OUT_BY = 3
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_SLTP = 6
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_POSITION_CLOSED = 10036
+RES_S_OK = 1
+RES_E_FAIL = -1
+RES_E_INVALID_PARAMS = -2
+RES_E_NOT_FOUND = -4
+RES_E_INTERNAL_FAIL_INIT = -10003
+
+TradeOrder = namedtuple(
+    "TradeOrder",
+    [
+        "ticket",
+        "time_setup",
+        "time_setup_msc",
+        "time_done",
+        "time_done_msc",
+        "time_expiration",
+        "type",
+        "type_time",
+        "type_filling",
+        "state",
+        "magic",
+        "position_id",
+        "position_by_id",
+        "reason",
+        "volume_initial",
+        "volume_current",
+        "price_open",
+        "sl",
+        "tp",
+        "price_current",
+        "price_stoplimit",
+        "symbol",
+        "comment",
+        "external_id",
+    ],
+)
+TradeDeal = namedtuple(
+    "TradeDeal",
+    [
+        "ticket",
+        "order",
+        "time",
+        "time_msc",
+        "type",
+        "entry",
+        "magic",
+        "position_id",
+        "reason",
+        "volume",
+        "price",
+        "commission",
+        "swap",
+        "profit",
+        "fee",
+        "symbol",
+        "comment",
+        "external_id",
+    ],
+)
+TradePosition = namedtuple(
+    "TradePosition",
+    [
+        "ticket",
+        "time",
+        "time_msc",
+        "time_update",
+        "time_update_msc",
+        "type",
+        "magic",
+        "identifier",
+        "reason",
+        "volume",
+        "price_open",
+        "sl",
+        "tp",
+        "price_current",
+        "swap",
+        "profit",
+        "symbol",
+        "comment",
+        "external_id",
+    ],
+)
+SymbolInfo = namedtuple(
+    "SymbolInfo",
+    [
+        "name",
+        "visible",
+        "select",
+        "digits",
+        "point",
+        "bid",
+        "ask",
+        "trade_tick_value",
+        "trade_tick_size",
+        "trade_contract_size",
+        "volume_min",
+        "volume_max",
+        "volume_step",
+        "currency_base",
+        "currency_profit",
+        "currency_margin",
+        "margin_initial",
+        "path",
+    ],
+)
+Tick = namedtuple(
+    "Tick", ["time", "bid", "ask", "last", "volume", "time_msc", "flags", "volume_real"]
+)
+AccountInfo = namedtuple(
+    "AccountInfo",
+    [
+        "login",
+        "trade_mode",
+        "leverage",
+        "limit_orders",
+        "margin_so_mode",
+        "trade_allowed",
+        "trade_expert",
+        "margin_mode",
+        "currency_digits",
+        "fifo_close",
+        "balance",
+        "credit",
+        "profit",
+        "equity",
+        "margin",
+        "margin_free",
+        "margin_level",
+        "margin_so_call",
+        "margin_so_so",
+        "margin_initial",
+        "margin_maintenance",
+        "assets",
+        "liabilities",
+        "commission_blocked",
+        "name",
+        "server",
+        "currency",
+        "company",
+    ],
+)
+OrderSendResult = namedtuple(
+    "OrderSendResult",
+    [
+        "retcode",
+        "deal",
+        "order",
+        "volume",
+        "price",
+        "bid",
+        "ask",
+        "comment",
+        "request_id",
+        "retcode_external",
+        "request",
+    ],
+)
+
+# (seconds per call, seconds per returned item) simulating terminal IPC cost
+LATENCY_PROFILES = {
+    "none": (0.0, 0.0),
+    "local": (0.0002, 0.000001),
+    "remote": (0.002, 0.000005),
+    "slow": (0.02, 0.00002),
+}
+
+# name: (mid price, digits, contract size, profit currency)
+SYMBOLS = {
+    "EURUSD": (1.08, 5, 100000, "USD"),
+    "GBPUSD": (1.27, 5, 100000, "USD"),
+    "USDJPY": (150.0, 3, 100000, "JPY"),
+    "XAUUSD": (2400.0, 2, 100, "USD"),
+    "US100.cash": (20000.0, 2, 1, "USD"),
+}
+
+HISTORY_START = datetime(2024, 1, 2)
+# Generated history is spread over at most this many seconds after HISTORY_START, so it ends before now however long
+HISTORY_SPAN = 365 * 86400
+COMMISSION_PER_LOT = 3.5
+LEVERAGE = 100
+
+
+class FakeTerminal:
+    """
+    Deterministic synthetic terminal state. All public methods mirror the MetaTrader5 function of the same name.
+    """
+
+    def __init__(
+        self,
+        history_positions: int = 100,
+        open_positions: int = 2,
+        seed: int = 42,
+        latency: str = "none",
+        login: int = 1000000,
+        balance: float = 10000.0,
+        currency: str = "USD",
+    ):
+        self._lock = threading.RLock()
+        self._rng = random.Random(seed)
+        self.latency = LATENCY_PROFILES[latency]
+        self.login = login
+        self.initial_balance = balance
+        self.currency = currency
+        self.initialized = False
+        self.error: Tuple[int, str] = (RES_S_OK, "Success")
+        self.prices = {name: spec[0] for name, spec in SYMBOLS.items()}
+        self.visible = {name: name == "EURUSD" for name in SYMBOLS}
+        self.orders: List[TradeOrder] = []
+        self.deals: List[TradeDeal] = []
+        # Net profit of every deal, kept as they are added so account_info does not walk the history
+        self._deals_profit = 0.0
+        self.positions: Dict[int, TradePosition] = {}
+        self._next_ticket = 100000000
+        # Number of calls per MetaTrader5 function, for measuring terminal load
+        self.calls: Counter = Counter()
+        self._generate_history(history_positions, open_positions)
+
+    # Internal helpers
+
+    def _sleep(self, items: int = 1):
+        per_call, per_item = self.latency
+        if per_call or per_item:
+            time.sleep(per_call + per_item * items)
+
+    def _ok(self):
+        self.error = (RES_S_OK, "Success")
+
+    def _fail(self, code: int, message: str):
+        self.error = (code, message)
+        return None
+
+    def _ticket(self) -> int:
+        self._next_ticket += 1
+        return self._next_ticket
+
+    def _spread(self, symbol: str) -> float:
+        return 2 * 10 ** -SYMBOLS[symbol][1]
+
+    def _quote(self, symbol: str) -> Tuple[float, float]:
+        bid = round(self.prices[symbol], SYMBOLS[symbol][1])
+        return bid, round(bid + self._spread(symbol), SYMBOLS[symbol][1])
+
+    def _move(self, symbol: str):
+        self.prices[symbol] *= 1 + self._rng.gauss(0, 0.0002)
+
+    def _profit(self, symbol: str, is_long: bool, open_price, close_price, volume):
+        contract_size, currency = SYMBOLS[symbol][2], SYMBOLS[symbol][3]
+        profit = (close_price - open_price) * volume * contract_size
+        if currency == "JPY":
+            profit /= self.prices["USDJPY"]
+        return round(profit if is_long else -profit, 2)
+
+    def _add_order(
+        self, ticket, position_id, order_type, t, volume, price, sl, tp, symbol
+    ):
+        order = TradeOrder(
+            ticket=ticket,
+            time_setup=t,
+            time_setup_msc=t * 1000,
+            time_done=t,
+            time_done_msc=t * 1000,
+            time_expiration=0,
+            type=order_type,
+            type_time=ORDER_TIME_GTC,
+            type_filling=ORDER_FILLING_FOK,
+            state=ORDER_STATE_FILLED,
+            magic=0,
+            position_id=position_id,
+            position_by_id=0,
+            reason=0,
+            volume_initial=volume,
+            volume_current=0.0,
+            price_open=price,
+            sl=sl,
+            tp=tp,
+            price_current=price,
+            price_stoplimit=0.0,
+            symbol=symbol,
+            comment="",
+            external_id="",
+        )
+        self.orders.append(order)
+        return order
+
+    def _add_deal(self, order: TradeOrder, entry: int, profit: float):
+        deal = TradeDeal(
+            ticket=self._ticket(),
+            order=order.ticket,
+            time=order.time_done,
+            time_msc=order.time_done_msc,
+            type=order.type,
+            entry=entry,
+            magic=0,
+            position_id=order.position_id,
+            reason=0,
+            volume=order.volume_initial,
+            price=order.price_current,
+            commission=round(-COMMISSION_PER_LOT * order.volume_initial, 2),
+            swap=0.0,
+            profit=profit,
+            fee=0.0,
+            symbol=order.symbol,
+            comment="",
+            external_id="",
+        )
+        self.deals.append(deal)
+        self._deals_profit += deal.profit + deal.commission + deal.swap
+        return deal
+
+    def _open(self, symbol, is_long, volume, price, sl, tp, t):
+        # As in MT5, the position id is the ticket of the order that opened it
+        position_id = self._ticket()
+        order_type = ORDER_TYPE_BUY if is_long else ORDER_TYPE_SELL
+        order = self._add_order(
+            position_id, position_id, order_type, t, volume, price, sl, tp, symbol
+        )
+        deal = self._add_deal(order, DEAL_ENTRY_IN, 0.0)
+        self.positions[position_id] = TradePosition(
+            ticket=position_id,
+            time=t,
+            time_msc=t * 1000,
+            time_update=t,
+            time_update_msc=t * 1000,
+            type=POSITION_TYPE_BUY if is_long else POSITION_TYPE_SELL,
+            magic=0,
+            identifier=position_id,
+            reason=0,
+            volume=volume,
+            price_open=price,
+            sl=sl,
+            tp=tp,
+            price_current=price,
+            swap=0.0,
+            profit=0.0,
+            symbol=symbol,
+            comment="",
+            external_id="",
+        )
+        return order, deal
+
+    def _close(self, position: TradePosition, volume, price, t):
+        is_long = position.type == POSITION_TYPE_BUY
+        order_type = ORDER_TYPE_SELL if is_long else ORDER_TYPE_BUY
+        order = self._add_order(
+            self._ticket(),
+            position.identifier,
+            order_type,
+            t,
+            volume,
+            price,
+            0.0,
+            0.0,
+            position.symbol,
+        )
+        profit = self._profit(
+            position.symbol, is_long, position.price_open, price, volume
+        )
+        deal = self._add_deal(order, DEAL_ENTRY_OUT, profit)
+        remaining = round(position.volume - volume, 2)
+        if remaining > 0:
+            self.positions[position.ticket] = position._replace(
+                volume=remaining, time_update=t, time_update_msc=t * 1000
+            )
+        else:
+            del self.positions[position.ticket]
+        return order, deal
+
+    def _generate_history(self, history_positions: int, open_positions: int):
+        t = int(HISTORY_START.timestamp())
+        symbols = list(SYMBOLS)
+        # Up to an hour between orders, less for histories too large to fit HISTORY_SPAN that way
+        max_step = min(
+            3600,
+            max(2, HISTORY_SPAN // (2 * max(1, history_positions + open_positions))),
+        )
+        min_step = max(1, max_step // 60)
+        for i in range(history_positions + open_positions):
+            symbol = self._rng.choice(symbols)
+            digits = SYMBOLS[symbol][1]
+            is_long = self._rng.random() < 0.5
+            volume = self._rng.choice([0.01, 0.1, 0.25, 0.5, 1.0])
+            bid, ask = self._quote(symbol)
+            price = ask if is_long else bid
+            stop = price * 0.005
+            direction = 1 if is_long else -1
+            sl = round(price - direction * stop, digits)
+            tp = round(price + direction * 2 * stop, digits)
+            t += self._rng.randint(min_step, max_step)
+            order, _ = self._open(symbol, is_long, volume, price, sl, tp, t)
+            if i >= history_positions:
+                continue
+
+            for _ in range(self._rng.randint(1, 20)):
+                self._move(symbol)
+            bid, ask = self._quote(symbol)
+            t += self._rng.randint(min_step, max_step)
+            self._close(
+                self.positions[order.position_id], volume, bid if is_long else ask, t
+            )
+
+    def _sync_positions(self):
+        for ticket, position in self.positions.items():
+            bid, ask = self._quote(position.symbol)
+            is_long = position.type == POSITION_TYPE_BUY
+            current = bid if is_long else ask
+            self.positions[ticket] = position._replace(
+                price_current=current,
+                profit=self._profit(
+                    position.symbol,
+                    is_long,
+                    position.price_open,
+                    current,
+                    position.volume,
+                ),
+            )
+
+    @staticmethod
+    def _matches_group(symbol: str, group: Optional[str]) -> bool:
+        if not group:
+            return True
+        matched = False
+        for pattern in group.split(","):
+            if pattern.startswith("!"):
+                if fnmatch.fnmatchcase(symbol, pattern[1:]):
+                    return False
+            elif fnmatch.fnmatchcase(symbol, pattern):
+                matched = True
+        return matched
+
+    def _history(self, items, time_of, args, kwargs):
+        if "ticket" in kwargs:
+            result = [i for i in items if i.ticket == kwargs["ticket"]]
+        elif "position" in kwargs:
+            result = [i for i in items if i.position_id == kwargs["position"]]
+        elif len(args) >= 2 or ("date_from" in kwargs and "date_to" in kwargs):
+            date_from = args[0] if args else kwargs["date_from"]
+            date_to = args[1] if len(args) > 1 else kwargs["date_to"]
+            start, end = _timestamp(date_from), _timestamp(date_to)
+            group = kwargs.get("group")
+            result = [
+                i
+                for i in items
+                if start <= time_of(i) <= end and self._matches_group(i.symbol, group)
+            ]
+        else:
+            return self._fail(RES_E_INVALID_PARAMS, "Invalid arguments")
+        self._sleep(len(result))
+        self._ok()
+        return tuple(result)
+
+    # MetaTrader5 API
+
+    def initialize(self, path=None, login=None, password=None, server=None, **kwargs):
+        with self._lock:
+            self._sleep()
+            if path is not None and "failed" in str(path):
+                self._fail(
+                    RES_E_INTERNAL_FAIL_INIT,
+                    f"IPC initialize failed, Process create failed '{path}'",
+                )
+                return False
+            if login is not None:
+                self.login = login
+            self.initialized = True
+            self._ok()
+            return True
+
+    def shutdown(self):
+        with self._lock:
+            self.initialized = False
+            return True
+
+    def last_error(self) -> Tuple[int, str]:
+        return self.error
+
+    def history_orders_get(self, *args, **kwargs):
+        with self._lock:
+            return self._history(self.orders, lambda o: o.time_done, args, kwargs)
+
+    def history_orders_total(self, date_from, date_to):
+        with self._lock:
+            orders = self._history(
+                self.orders, lambda o: o.time_done, (date_from, date_to), {}
+            )
+            return len(orders)
+
+    def history_deals_get(self, *args, **kwargs):
+        with self._lock:
+            return self._history(self.deals, lambda d: d.time, args, kwargs)
+
+    def positions_get(self, symbol=None, group=None, ticket=None, position=None):
+        with self._lock:
+            self._sync_positions()
+            ticket = ticket if ticket is not None else position
+            result = [
+                p
+                for p in self.positions.values()
+                if (ticket is None or p.ticket == ticket)
+                and (symbol is None or p.symbol == symbol)
+                and self._matches_group(p.symbol, group)
+            ]
+            self._sleep(len(result))
+            self._ok()
+            return tuple(result)
+
+    def positions_total(self) -> int:
+        with self._lock:
+            self._sleep()
+            self._ok()
+            return len(self.positions)
+
+    def symbol_info(self, symbol: str):
+        with self._lock:
+            self._sleep()
+            if symbol not in SYMBOLS:
+                return self._fail(RES_E_NOT_FOUND, "Terminal: Not found")
+            self._ok()
+            return self._symbol_info(symbol)
+
+    def symbols_get(self, group: Optional[str] = None):
+        with self._lock:
+            result = [
+                self._symbol_info(symbol)
+                for symbol in SYMBOLS
+                if self._matches_group(symbol, group)
+            ]
+            self._sleep(len(result))
+            self._ok()
+            return tuple(result)
+
+    def _symbol_info(self, symbol: str) -> SymbolInfo:
+        _, digits, contract_size, currency = SYMBOLS[symbol]
+        bid, ask = self._quote(symbol)
+        point = 10**-digits
+        tick_value = contract_size * point
+        if currency == "JPY":
+            tick_value /= self.prices["USDJPY"]
+        return SymbolInfo(
+            name=symbol,
+            visible=self.visible[symbol],
+            select=self.visible[symbol],
+            digits=digits,
+            point=point,
+            bid=bid,
+            ask=ask,
+            trade_tick_value=tick_value,
+            trade_tick_size=point,
+            trade_contract_size=contract_size,
+            volume_min=0.01,
+            volume_max=100.0,
+            volume_step=0.01,
+            currency_base=symbol[:3],
+            currency_profit=currency,
+            currency_margin=symbol[:3],
+            margin_initial=0.0,
+            path=f"Forex\\{symbol}",
+        )
+
+    def symbol_info_tick(self, symbol: str):
+        with self._lock:
+            self._sleep()
+            if symbol not in SYMBOLS:
+                return self._fail(RES_E_NOT_FOUND, "Terminal: Not found")
+            self._move(symbol)
+            bid, ask = self._quote(symbol)
+            now = int(time.time())
+            self._ok()
+            return Tick(now, bid, ask, 0.0, 0, now * 1000, 6, 0.0)
+
+    def symbol_select(self, symbol: str, enable: bool = True) -> bool:
+        with self._lock:
+            self._sleep()
+            if symbol not in SYMBOLS:
+                self._fail(RES_E_NOT_FOUND, "Terminal: Not found")
+                return False
+            self.visible[symbol] = enable
+            self._ok()
+            return True
+
+    def account_info(self):
+        with self._lock:
+            self._sleep()
+            self._sync_positions()
+            balance = round(self.initial_balance + self._deals_profit, 2)
+            floating = round(sum(p.profit for p in self.positions.values()), 2)
+            margin = round(
+                sum(
+                    p.volume * SYMBOLS[p.symbol][2] * p.price_open / LEVERAGE
+                    for p in self.positions.values()
+                ),
+                2,
+            )
+            equity = round(balance + floating, 2)
+            self._ok()
+            return AccountInfo(
+                login=self.login,
+                trade_mode=0,
+                leverage=LEVERAGE,
+                limit_orders=200,
+                margin_so_mode=0,
+                trade_allowed=True,
+                trade_expert=True,
+                margin_mode=2,
+                currency_digits=2,
+                fifo_close=False,
+                balance=balance,
+                credit=0.0,
+                profit=floating,
+                equity=equity,
+                margin=margin,
+                margin_free=round(equity - margin, 2),
+                margin_level=round(equity / margin * 100, 2) if margin else 0.0,
+                margin_so_call=50.0,
+                margin_so_so=30.0,
+                margin_initial=0.0,
+                margin_maintenance=0.0,
+                assets=0.0,
+                liabilities=0.0,
+                commission_blocked=0.0,
+                name="Fake Account",
+                server="Fake-Server",
+                currency=self.currency,
+                company="Fake Broker Ltd",
+            )
+
+    def order_send(self, request: dict):
+        with self._lock:
+            self._sleep()
+            symbol = request.get("symbol")
+            action = request.get("action")
+            if symbol not in SYMBOLS:
+                return self._fail(RES_E_INVALID_PARAMS, "Invalid arguments")
+
+            if action == TRADE_ACTION_SLTP:
+                position = self.positions.get(request.get("position"))
+                if position is None:
+                    return self._result(TRADE_RETCODE_POSITION_CLOSED, request)
+                self.positions[position.ticket] = position._replace(
+                    sl=request.get("sl", position.sl), tp=request.get("tp", position.tp)
+                )
+                return self._result(TRADE_RETCODE_DONE, request)
+
+            if action != TRADE_ACTION_DEAL:
+                return self._fail(RES_E_INVALID_PARAMS, "Invalid arguments")
+
+            volume = request.get("volume") or 0
+            if volume < 0.01 or volume > 100 or round(volume, 2) != volume:
+                return self._result(TRADE_RETCODE_INVALID_VOLUME, request)
+
+            self._move(symbol)
+            bid, ask = self._quote(symbol)
+            is_buy = request.get("type") == ORDER_TYPE_BUY
+            price = ask if is_buy else bid
+            t = int(time.time())
+
+            if request.get("position"):
+                position = self.positions.get(request["position"])
+                if position is None:
+                    return self._result(TRADE_RETCODE_POSITION_CLOSED, request)
+                order, deal = self._close(
+                    position, min(volume, position.volume), price, t
+                )
+            else:
+                sl, tp = request.get("sl", 0.0), request.get("tp", 0.0)
+                if sl and ((is_buy and sl >= price) or (not is_buy and sl <= price)):
+                    return self._result(TRADE_RETCODE_INVALID_STOPS, request)
+                order, deal = self._open(symbol, is_buy, volume, price, sl, tp, t)
+
+            return self._result(TRADE_RETCODE_DONE, request, order, deal, bid, ask)
+
+    def _result(self, retcode, request, order=None, deal=None, bid=0.0, ask=0.0):
+        self._ok()
+        return OrderSendResult(
+            retcode,
+            deal.ticket if deal else 0,
+            order.ticket if order else 0,
+            order.volume_initial if order else 0.0,
+            order.price_current if order else 0.0,
+            bid,
+            ask,
+            "Request executed" if retcode == TRADE_RETCODE_DONE else "Request rejected",
+            0,
+            0,
+            request,
+        )
+
+
+def _timestamp(value) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+def _from_env() -> FakeTerminal:
+    return FakeTerminal(
+        history_positions=int(os.getenv("FAKE_MT5_HISTORY_POSITIONS", "100")),
+        open_positions=int(os.getenv("FAKE_MT5_OPEN_POSITIONS", "2")),
+        seed=int(os.getenv("FAKE_MT5_SEED", "42")),
+        latency=os.getenv("FAKE_MT5_LATENCY", "none"),
+    )
+
+
+_terminal = _from_env()
+
+
+def configure(**kwargs) -> FakeTerminal:
+    """
+    Replaces the fake terminal state, see FakeTerminal for the available options
+    """
+    global _terminal
+    _terminal = FakeTerminal(**kwargs)
+    return _terminal
+
+
+def get_terminal() -> FakeTerminal:
+    return _terminal
+
+
+def install():
+    """
+    Makes `import MetaTrader5` resolve to this module, and rebinds `mt5` in any adapter module that already imported
+    the real package.
+    """
+    this = sys.modules[__name__]
+    real = sys.modules.get("MetaTrader5")
+    sys.modules["MetaTrader5"] = this
+    if real is not None and real is not this:
+        for module in list(sys.modules.values()):
+            if getattr(module, "mt5", None) is real:
+                module.mt5 = this
+    return this
+
+
+@contextmanager
+def patched(**kwargs):
+    """
+    Temporarily points every adapter module's `mt5` at this module, with a freshly configured terminal. Unlike
+    `install()`, this is undone on exit, so tests using it can share a session with tests against a real terminal.
+    """
+    terminal = configure(**kwargs)
+    this = sys.modules[__name__]
+    current = sys.modules.get("MetaTrader5")
+    rebound = []
+    if current is not None and current is not this:
+        for module in list(sys.modules.values()):
+            if getattr(module, "mt5", None) is current:
+                module.mt5 = this
+                rebound.append(module)
+    try:
+        yield terminal
+    finally:
+        for module in rebound:
+            module.mt5 = current
+
+
+def _delegate(name):
+    def call(*args, **kwargs):
+        _terminal.calls[name] += 1
+        return getattr(_terminal, name)(*args, **kwargs)
+
+    call.__name__ = name
+    return call
+
+
+initialize = _delegate("initialize")
+shutdown = _delegate("shutdown")
+last_error = _delegate("last_error")
+history_orders_get = _delegate("history_orders_get")
+history_orders_total = _delegate("history_orders_total")
+history_deals_get = _delegate("history_deals_get")
+positions_get = _delegate("positions_get")
+positions_total = _delegate("positions_total")
+symbol_info = _delegate("symbol_info")
+symbols_get = _delegate("symbols_get")
+symbol_info_tick = _delegate("symbol_info_tick")
+symbol_select = _delegate("symbol_select")
+account_info = _delegate("account_info")
+order_send = _delegate("order_send")
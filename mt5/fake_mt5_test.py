@@ -0,0 +1,207 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from mt5 import fake_mt5
+from mt5.mt5_utils import (
+    build_open_trade_from_position_id,
+    get_open_positions_for_account,
+    get_trades_for_account,
+    sync_account_history,
+)
+from mt5.history_store import reset_account_history
+
+
+class FakeTerminalTestCase(unittest.TestCase):
+    def test_history_is_deterministic(self):
+        first = fake_mt5.FakeTerminal(history_positions=20, seed=3)
+        second = fake_mt5.FakeTerminal(history_positions=20, seed=3)
+        other = fake_mt5.FakeTerminal(history_positions=20, seed=4)
+
+        self.assertEqual(first.orders, second.orders)
+        self.assertEqual(first.deals, second.deals)
+        self.assertNotEqual(first.orders, other.orders)
+        self.assertEqual(2 * 20 + 2, len(first.orders))
+
+    def test_large_histories_fit_the_history_span(self):
+        with patch.object(fake_mt5, "HISTORY_SPAN", 86400):
+            terminal = fake_mt5.FakeTerminal(history_positions=500)
+
+        start = fake_mt5.HISTORY_START.timestamp()
+        self.assertLessEqual(terminal.orders[-1].time_done, start + 86400)
+
+    def test_balance_follows_the_deals(self):
+        terminal = fake_mt5.FakeTerminal(history_positions=20, open_positions=1)
+        ticket, position = next(iter(terminal.positions.items()))
+        terminal.order_send(
+            {
+                "action": fake_mt5.TRADE_ACTION_DEAL,
+                "symbol": position.symbol,
+                "volume": position.volume,
+                "type": 1 - position.type,
+                "position": ticket,
+            }
+        )
+
+        expected = terminal.initial_balance + sum(
+            d.profit + d.commission + d.swap for d in terminal.deals
+        )
+        self.assertAlmostEqual(expected, terminal.account_info().balance, places=2)
+
+    def test_group_filter(self):
+        terminal = fake_mt5.FakeTerminal(history_positions=50)
+        end = datetime.now() + timedelta(days=1)
+
+        orders = terminal.history_orders_get(
+            datetime(2024, 1, 1), end, group="*USD*,!XAU*"
+        )
+
+        self.assertTrue(orders)
+        self.assertTrue(
+            all("USD" in o.symbol and "XAU" not in o.symbol for o in orders)
+        )
+
+
+class FakeTerminalAdapterTestCase(unittest.TestCase):
+    def setUp(self):
+        reset_account_history(1)
+
+    def test_get_trades_for_account(self):
+        with fake_mt5.patched(history_positions=30, open_positions=2) as terminal:
+            trades = get_trades_for_account(1)
+
+        self.assertEqual(32, len(trades))
+        self.assertEqual(2, len([t for t in trades if t["is_open"]]))
+        closed = [t for t in trades if not t["is_open"]]
+        self.assertTrue(all(t["profit"] is not None for t in closed))
+        self.assertEqual(
+            {d.order for d in terminal.deals if d.entry == fake_mt5.DEAL_ENTRY_OUT},
+            {t["close_order_ticket"] for t in closed},
+        )
+
+    def test_position_closed_during_sync_is_rechecked(self):
+        with fake_mt5.patched(history_positions=5, open_positions=2) as terminal:
+            ticket, position = next(iter(terminal.positions.items()))
+            # Gone from the open positions, with its closing order not yet in the history that was read
+            del terminal.positions[ticket]
+
+            history = sync_account_history(1)
+
+            self.assertIn(ticket, history.dirty_positions)
+            self.assertEqual(6, len(history.trades))
+
+            terminal.positions[ticket] = position
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": position.symbol,
+                    "volume": position.volume,
+                    "type": 1 - position.type,
+                    "position": ticket,
+                }
+            )
+            history = sync_account_history(1)
+
+        self.assertNotIn(ticket, history.dirty_positions)
+        self.assertFalse(history.trades[ticket]["is_open"])
+
+    def test_partially_closed_position_stays_open(self):
+        with fake_mt5.patched(history_positions=5, open_positions=0) as terminal:
+            tick = fake_mt5.symbol_info_tick("EURUSD")
+            ticket = fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": "EURUSD",
+                    "volume": 0.1,
+                    "type": fake_mt5.ORDER_TYPE_BUY,
+                    "price": tick.ask,
+                }
+            ).order
+            sync_account_history(1)
+
+            def close(volume):
+                fake_mt5.order_send(
+                    {
+                        "action": fake_mt5.TRADE_ACTION_DEAL,
+                        "symbol": "EURUSD",
+                        "volume": volume,
+                        "type": fake_mt5.ORDER_TYPE_SELL,
+                        "position": ticket,
+                    }
+                )
+
+            close(0.05)
+            history = sync_account_history(1)
+            self.assertTrue(history.trades[ticket]["is_open"])
+            self.assertTrue(history.trades[ticket]["is_long"])
+            self.assertEqual(0.05, history.trades[ticket]["total_volume"])
+            self.assertIn(ticket, history.open_positions)
+
+            # Without new orders, it is still rebuilt as an open position
+            history = sync_account_history(1)
+            self.assertTrue(history.trades[ticket]["is_open"])
+
+            close(0.05)
+            history = sync_account_history(1)
+
+        trade = history.trades[ticket]
+        self.assertFalse(trade["is_open"])
+        self.assertNotIn(ticket, history.open_positions)
+        self.assertAlmostEqual(
+            sum(
+                d.profit + d.commission
+                for d in terminal.deals
+                if d.position_id == ticket and d.entry == fake_mt5.DEAL_ENTRY_OUT
+            ),
+            trade["profit"],
+        )
+
+    def test_open_positions_match_open_trades(self):
+        with fake_mt5.patched(history_positions=10, open_positions=3):
+            open_trades = [t for t in get_trades_for_account(1) if t["is_open"]]
+            positions = get_open_positions_for_account(1)
+
+        self.assertEqual(
+            {t["position_id"]: t["total_volume"] for t in open_trades},
+            {p["position_id"]: p["total_volume"] for p in positions},
+        )
+
+    def test_open_and_close_trade(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            tick = fake_mt5.symbol_info_tick("EURUSD")
+            result = fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": "EURUSD",
+                    "volume": 0.1,
+                    "type": fake_mt5.ORDER_TYPE_BUY,
+                    "price": tick.ask,
+                    "sl": tick.bid - 0.001,
+                    "tp": tick.ask + 0.002,
+                }
+            )
+            self.assertEqual(fake_mt5.TRADE_RETCODE_DONE, result.retcode)
+
+            trade = build_open_trade_from_position_id(result.order)
+            self.assertTrue(trade["is_open"])
+            self.assertEqual(0.1, trade["total_volume"])
+
+            result = fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": "EURUSD",
+                    "volume": 0.1,
+                    "type": fake_mt5.ORDER_TYPE_SELL,
+                    "position": trade["position_id"],
+                }
+            )
+            self.assertEqual(fake_mt5.TRADE_RETCODE_DONE, result.retcode)
+            self.assertEqual(0, fake_mt5.positions_total())
+
+            trades = get_trades_for_account(1)
+            self.assertEqual(1, len(trades))
+            self.assertFalse(trades[0]["is_open"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from internal_types import Trade, TradesList
+from mt5.trade_stats import reset_account_stats
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Earliest point in time we care about when cold syncing an account
+HISTORY_START = datetime(2024, 1, 1)
+
+# How far behind the watermark each incremental sync re-reads. Orders already seen are de-duplicated by ticket, so
+# this only needs to be wide enough to cover terminal/server timezone differences.
+SYNC_OVERLAP = timedelta(days=1)
+
+
+class AccountHistory:
+    """
+    Incrementally synced order history and reconstructed trades for a single account.
+
+    Orders are stored by position id and de-duplicated by ticket. The watermark is the latest `time_done` seen, so
+    each sync only needs to request orders from (watermark - SYNC_OVERLAP) onwards.
+    """
+
+    def __init__(self, account_id: int):
+        self.account_id = account_id
+        self.orders_by_position: Dict[int, Dict[int, dict]] = {}
+        self.trades: Dict[int, Trade] = {}
+        self.open_positions: Set[int] = set()
+        # Positions with new orders that have not been (successfully) rebuilt yet, in the order they were first seen
+        self.dirty_positions: Dict[int, None] = {}
+        self.watermark: Optional[int] = None
+        self.last_ticket: Optional[int] = None
+        # mt5_utils.DealIndex of all deals synced so far, created on first sync
+        self.deal_index = None
+        # Synced since the history was last persisted
+        self.unsaved_orders: List[dict] = []
+        self.unsaved_deals: List[dict] = []
+        self.unsaved_trades: Dict[int, None] = {}
+
+    def sync_window_start(self) -> datetime:
+        if self.watermark is None:
+            return HISTORY_START
+        return max(HISTORY_START, datetime.fromtimestamp(self.watermark) - SYNC_OVERLAP)
+
+    def merge_orders(self, orders) -> Set[int]:
+        """
+        Merges a window of history orders into the store.
+
+        :param orders: Iterable of MT5 TradeOrder namedtuples
+        :return: The set of position ids that received new orders
+        """
+        changed = {}
+        for order in orders:
+            order_dict = order._asdict()
+            position_id = order_dict["position_id"]
+            ticket = order_dict["ticket"]
+
+            position_orders = self.orders_by_position.setdefault(position_id, {})
+            if ticket in position_orders:
+                continue
+
+            position_orders[ticket] = order_dict
+            self.unsaved_orders.append(order_dict)
+            changed[position_id] = None
+
+            if self.watermark is None or order_dict["time_done"] >= self.watermark:
+                self.watermark = order_dict["time_done"]
+                self.last_ticket = max(ticket, self.last_ticket or 0)
+
+        self.dirty_positions.update(changed)
+        return set(changed)
+
+    def positions_to_rebuild(self) -> List[int]:
+        """
+        Open positions are always rebuilt, as their profit, SL and TP are live values.
+        """
+        return list(self.dirty_positions) + [
+            p for p in self.open_positions if p not in self.dirty_positions
+        ]
+
+    def orders_for_position(self, position_id: int) -> List[dict]:
+        return list(self.orders_by_position.get(position_id, {}).values())
+
+    def store_trade(self, trade: Trade):
+        """
+        Only trades that changed are marked unsaved. The profit of an open trade moves with every tick and is re-read
+        on every sync, so it is not a change by itself.
+        """
+        position_id = trade["position_id"]
+        previous = self.trades.get(position_id)
+        if trade["is_open"] and previous is not None:
+            previous = {**previous, "profit": trade["profit"]}
+        if previous != trade:
+            self.unsaved_trades[position_id] = None
+        self.trades[position_id] = trade
+        if trade["is_open"]:
+            self.open_positions.add(position_id)
+        else:
+            self.open_positions.discard(position_id)
+        self.dirty_positions.pop(position_id, None)
+
+    def mark_dirty(self, position_id: int):
+        """
+        Rebuilds the position on the next sync, as it could not be in this one
+        """
+        self.dirty_positions[position_id] = None
+
+    def discard_position(self, position_id: int):
+        self.open_positions.discard(position_id)
+        self.dirty_positions.pop(position_id, None)
+
+    def list_trades(self) -> TradesList:
+        return list(self.trades.values())
+
+    def take_unsaved(self) -> Tuple[List[dict], List[dict], TradesList]:
+        """
+        :return: The new orders and deals, and the changed trades, synced since the last call
+        """
+        trades = [self.trades[p] for p in self.unsaved_trades if p in self.trades]
+        orders, deals = self.unsaved_orders, self.unsaved_deals
+        self.unsaved_orders, self.unsaved_deals, self.unsaved_trades = [], [], {}
+        return orders, deals, trades
+
+
+_histories: Dict[int, AccountHistory] = {}
+
+
+def get_account_history(account_id: int) -> AccountHistory:
+    if account_id not in _histories:
+        _histories[account_id] = AccountHistory(account_id)
+    return _histories[account_id]
+
+
+def set_account_history(account_id: int, history: AccountHistory):
+    _histories[account_id] = history
+
+
+def reset_account_history(account_id: int):
+    """
+    Drops any synced history (and the stats computed from it) for the account, forcing the next sync to start from
+    HISTORY_START
+    """
+    _histories.pop(account_id, None)
+    reset_account_stats(account_id)
@@ -0,0 +1,65 @@
+import unittest
+from collections import namedtuple
+from datetime import datetime
+
+from mt5.history_store import AccountHistory, HISTORY_START, SYNC_OVERLAP
+
+Order = namedtuple("TradeOrder", "ticket position_id type time_done symbol")
+
+
+class AccountHistoryTestCase(unittest.TestCase):
+    def test_cold_sync_starts_from_history_start(self):
+        history = AccountHistory(1)
+
+        self.assertEqual(HISTORY_START, history.sync_window_start())
+
+    def test_merge_orders_tracks_watermark_and_dedupes(self):
+        history = AccountHistory(1)
+        t = int(datetime(2024, 6, 1).timestamp())
+
+        changed = history.merge_orders(
+            [Order(10, 100, 0, t, "EURUSD"), Order(11, 100, 1, t + 60, "EURUSD")]
+        )
+        self.assertEqual({100}, changed)
+        self.assertEqual(t + 60, history.watermark)
+        self.assertEqual(11, history.last_ticket)
+        self.assertEqual(
+            datetime.fromtimestamp(t + 60) - SYNC_OVERLAP, history.sync_window_start()
+        )
+
+        # Re-reading the overlap window should not mark anything as changed
+        changed = history.merge_orders([Order(11, 100, 1, t + 60, "EURUSD")])
+        self.assertEqual(set(), changed)
+        self.assertEqual(2, len(history.orders_for_position(100)))
+
+    def test_open_positions_are_always_rebuilt(self):
+        history = AccountHistory(1)
+        t = int(datetime(2024, 6, 1).timestamp())
+        history.merge_orders(
+            [Order(10, 100, 0, t, "EURUSD"), Order(20, 200, 0, t, "EURUSD")]
+        )
+
+        history.store_trade({"position_id": 100, "is_open": False})
+        history.store_trade({"position_id": 200, "is_open": True})
+
+        self.assertEqual([200], history.positions_to_rebuild())
+        self.assertEqual(2, len(history.list_trades()))
+
+    def test_only_changed_trades_are_unsaved(self):
+        history = AccountHistory(1)
+        trade = {"position_id": 100, "is_open": True, "stop_loss": 0.0, "profit": 1.0}
+        history.store_trade(trade)
+        self.assertEqual([trade], history.take_unsaved()[2])
+
+        # Rebuilt with only its live profit moved
+        history.store_trade({**trade, "profit": 2.0})
+        self.assertEqual([], history.take_unsaved()[2])
+        self.assertEqual(2.0, history.trades[100]["profit"])
+
+        history.store_trade({**trade, "stop_loss": 1.05})
+        history.store_trade({**trade, "is_open": False})
+        self.assertEqual([{**trade, "is_open": False}], history.take_unsaved()[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,303 @@
+import asyncio
+import math
+import os
+import time
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+import MetaTrader5 as mt5
+from fastapi import HTTPException
+
+from mt5.executor import get_terminal
+from mt5.symbol_cache import symbol_cache
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Seconds between background refreshes of the rates converting profit currencies to the account currency
+LOT_RATE_REFRESH_INTERVAL = float(os.getenv("LOT_RATE_REFRESH_INTERVAL", "5"))
+# Seconds a conversion rate is used for before an order re-reads it itself, e.g. when refreshes are failing
+LOT_RATE_MAX_AGE = float(os.getenv("LOT_RATE_MAX_AGE", "60"))
+# Seconds without an order after which an account's conversion rates stop being refreshed
+LOT_RATE_IDLE_TIMEOUT = float(os.getenv("LOT_RATE_IDLE_TIMEOUT", "600"))
+
+# Calculation modes in which a lot's profit is the price change times the contract size, in the profit currency:
+# SYMBOL_CALC_MODE_FOREX, _CFD, _CFDINDEX, _CFDLEVERAGE and _FOREX_NO_LEVERAGE. For any other mode the terminal's
+# trade_tick_value (already in the account currency) is used as is.
+LINEAR_CALC_MODES = (0, 2, 3, 4, 5)
+
+# Absorbs float error when flooring to the volume step, e.g. 0.29 / 0.01 = 28.999999999999996
+STEP_EPSILON = 1e-9
+
+
+class SymbolSpec:
+    """
+    The properties of a symbol needed to size an order, derived once from its (cached) SymbolInfo
+    """
+
+    __slots__ = (
+        "info",
+        "tick_size",
+        "tick_value",
+        "currency",
+        "volume_min",
+        "volume_max",
+        "volume_step",
+        "volume_digits",
+    )
+
+    def __init__(self, info):
+        self.info = info
+        self.tick_size = info.trade_tick_size or info.point
+        if getattr(info, "trade_calc_mode", 0) in LINEAR_CALC_MODES:
+            # Value of a tick per lot, in the profit currency
+            self.tick_value = self.tick_size * info.trade_contract_size
+            self.currency = info.currency_profit
+        else:
+            # Already in the account currency
+            self.tick_value = info.trade_tick_value
+            self.currency = None
+        self.volume_min = info.volume_min
+        self.volume_max = info.volume_max
+        self.volume_step = info.volume_step or info.volume_min
+        self.volume_digits = max(
+            0, -Decimal(repr(self.volume_step)).normalize().as_tuple().exponent
+        )
+
+    def volume_for_risk(self, risk_amount: float, stop_distance: float, rate: float):
+        """
+        :param risk_amount: The most to lose at the stop, in the account currency
+        :param stop_distance: The price distance from entry to stop
+        :param rate: Converts the profit currency to the account currency
+        :return: The largest volume, in whole volume steps, that loses at most `risk_amount` at the stop, capped at
+                 the maximum volume
+        """
+        loss_per_lot = stop_distance / self.tick_size * self.tick_value * rate
+        steps = math.floor(risk_amount / loss_per_lot / self.volume_step + STEP_EPSILON)
+        volume = min(steps * self.volume_step, self.volume_max)
+        return round(volume, self.volume_digits)
+
+
+class LotSizer:
+    """
+    Sizes orders from the amount to risk and the stop distance, per account.
+
+    Symbol specs are derived from symbol_cache's SymbolInfo and kept for as long as that object is cached, and the
+    rates converting each profit currency to the account currency are kept up to date by `refresh_rates`, run off the
+    order path. Sizing an order is then a few dict lookups and some arithmetic, with no terminal calls, unless a rate
+    was never read or has gone stale.
+
+    Terminal-side state, only used through the account's executor (see mt5.executor.TerminalExecutor).
+    """
+
+    def __init__(self, max_age: float = LOT_RATE_MAX_AGE):
+        self.max_age = max_age
+        self._specs: Dict[Tuple[int, str], SymbolSpec] = {}
+        self._account_currency: Dict[int, str] = {}
+        # (account, currency) -> (symbol quoting it against the account currency, whether the rate is its inverse)
+        self._conversions: Dict[Tuple[int, str], Tuple[str, bool]] = {}
+        # (account, currency) -> (rate, time read)
+        self._rates: Dict[Tuple[int, str], Tuple[float, float]] = {}
+
+    def spec(self, account_id: int, info) -> SymbolSpec:
+        key = (account_id, info.name)
+        spec = self._specs.get(key)
+        # The cache returns the same object until the symbol's properties are re-read
+        if spec is None or spec.info is not info:
+            spec = self._specs[key] = SymbolSpec(info)
+        return spec
+
+    def volume(
+        self, account_id: int, info, risk_amount: float, stop_distance: float
+    ) -> float:
+        """
+        :param info: The symbol's SymbolInfo, from symbol_cache
+        :param risk_amount: The most to lose at the stop, in the account currency
+        :param stop_distance: The price distance from entry to stop
+        :return: The volume to order
+        """
+        if stop_distance <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Stop loss must differ from the entry price to size an order for {info.name}",
+            )
+        spec = self.spec(account_id, info)
+        rate = 1.0 if spec.currency is None else self.rate(account_id, spec.currency)
+        volume = spec.volume_for_risk(risk_amount, stop_distance, rate)
+        if volume < spec.volume_min:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Risking {risk_amount} over a stop of {stop_distance} is less than the minimum volume of "
+                f"{spec.volume_min} {info.name}",
+            )
+        return volume
+
+    def rate(self, account_id: int, currency: str) -> float:
+        """
+        :return: The rate converting `currency` to the account currency
+        """
+        entry = self._rates.get((account_id, currency))
+        if entry is not None and time.monotonic() - entry[1] < self.max_age:
+            return entry[0]
+        return self._read_rate(account_id, currency)
+
+    def refresh_rates(self, account_id: int) -> int:
+        """
+        Re-reads every conversion rate the account's orders have used
+
+        :return: The number of rates refreshed
+        """
+        currencies = [c for (a, c) in self._rates if a == account_id]
+        for currency in currencies:
+            try:
+                self._read_rate(account_id, currency)
+            except HTTPException as e:
+                log.warning(
+                    f"Failed to refresh {currency} rate for {account_id}: {e.detail}"
+                )
+        return len(currencies)
+
+    def reset(self, account_id: int):
+        self._account_currency.pop(account_id, None)
+        for cache in (self._specs, self._conversions, self._rates):
+            for key in [k for k in cache if k[0] == account_id]:
+                del cache[key]
+
+    def _read_rate(self, account_id: int, currency: str) -> float:
+        if currency == self._get_account_currency(account_id):
+            rate = 1.0
+        else:
+            symbol, inverse = self._get_conversion(account_id, currency)
+            tick = symbol_cache.symbol_info_tick(account_id, symbol)
+            if not tick or not tick.bid or not tick.ask:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"No price for {symbol} to convert {currency} to the account currency",
+                )
+            mid = (tick.bid + tick.ask) / 2
+            rate = 1 / mid if inverse else mid
+        self._rates[(account_id, currency)] = (rate, time.monotonic())
+        return rate
+
+    def _get_account_currency(self, account_id: int) -> str:
+        currency = self._account_currency.get(account_id)
+        if currency is None:
+            account = mt5.account_info()
+            if account is None:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Failed to read the account currency of {account_id}: {mt5.last_error()}",
+                )
+            currency = self._account_currency[account_id] = account.currency
+        return currency
+
+    def _get_conversion(self, account_id: int, currency: str) -> Tuple[str, bool]:
+        key = (account_id, currency)
+        conversion = self._conversions.get(key)
+        if conversion is not None:
+            return conversion
+
+        account_currency = self._get_account_currency(account_id)
+        inverse: Optional[str] = None
+        for s in mt5.symbols_get() or ():
+            if s.currency_base == currency and s.currency_profit == account_currency:
+                conversion = (s.name, False)
+                break
+            if (
+                inverse is None
+                and s.currency_base == account_currency
+                and s.currency_profit == currency
+            ):
+                inverse = s.name
+        if conversion is None and inverse is not None:
+            conversion = (inverse, True)
+        if conversion is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No symbol converts {currency} to the account currency {account_currency}",
+            )
+        # Ticks are only streamed for symbols in MarketWatch
+        if not symbol_cache.ensure_selected(account_id, conversion[0]):
+            raise HTTPException(
+                status_code=500,
+                detail=f"Symbol {conversion[0]} failed to be selected",
+            )
+        log.debug(f"Converting {currency} to {account_currency} with {conversion}")
+        self._conversions[key] = conversion
+        return conversion
+
+
+lot_sizer = LotSizer()
+
+
+def refresh_conversion_rates(account_id: int) -> int:
+    """
+    Runs on the terminal thread/process, which holds the account's LotSizer state
+    """
+    return lot_sizer.refresh_rates(account_id)
+
+
+class RateRefresher:
+    """
+    Refreshes an account's conversion rates in the background while it is placing orders, so orders size from a
+    recent rate without reading it themselves
+    """
+
+    def __init__(
+        self,
+        account_id: int,
+        interval: float = LOT_RATE_REFRESH_INTERVAL,
+        idle_timeout: float = LOT_RATE_IDLE_TIMEOUT,
+    ):
+        self.account_id = account_id
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self._last_order = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self):
+        """
+        Called on every order, (re)starting the refreshes
+        """
+        self._last_order = time.monotonic()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        try:
+            while time.monotonic() - self._last_order < self.idle_timeout:
+                await asyncio.sleep(self.interval)
+                try:
+                    await get_terminal(self.account_id).run(
+                        refresh_conversion_rates, self.account_id
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.error(
+                        f"Failed to refresh conversion rates for {self.account_id}: {e}"
+                    )
+            log.debug(f"Stopped refreshing idle conversion rates for {self.account_id}")
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+
+_refreshers: Dict[int, RateRefresher] = {}
+
+
+def get_rate_refresher(account_id: int) -> RateRefresher:
+    if account_id not in _refreshers:
+        _refreshers[account_id] = RateRefresher(account_id)
+    return _refreshers[account_id]
+
+
+def reset_rate_refresher(account_id: int):
+    refresher = _refreshers.pop(account_id, None)
+    if refresher is not None:
+        refresher.stop()
@@ -0,0 +1,137 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from mt5 import fake_mt5
+from mt5 import lot_sizing
+from mt5.lot_sizing import LotSizer, RateRefresher
+from mt5.symbol_cache import symbol_cache
+
+ACCOUNT_ID = 1000000
+
+
+class LotSizerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sizer = LotSizer(max_age=60)
+        symbol_cache.invalidate(ACCOUNT_ID)
+
+    def size(self, symbol: str, risk_amount: float, stop_distance: float) -> float:
+        info = symbol_cache.symbol_info(ACCOUNT_ID, symbol)
+        return self.sizer.volume(ACCOUNT_ID, info, risk_amount, stop_distance)
+
+    def test_sizes_account_currency_symbols_without_conversion(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            # A 20 pip stop loses $200 per lot
+            self.assertEqual(0.5, self.size("EURUSD", 100.0, 0.002))
+            # 30 points of 1 contract lose $30 per lot
+            self.assertEqual(1.0, self.size("US100.cash", 30.0, 30.0))
+
+        self.assertEqual(0, terminal.calls["symbols_get"])
+        self.assertEqual(0, terminal.calls["symbol_info_tick"])
+
+    def test_repeat_orders_make_no_terminal_calls(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            self.size("USDJPY", 100.0, 0.3)
+            calls = sum(terminal.calls.values())
+
+            for _ in range(10):
+                self.size("USDJPY", 100.0, 0.3)
+
+            self.assertEqual(calls, sum(terminal.calls.values()))
+
+    def test_converts_with_the_inverse_of_a_pair(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0):
+            # A 30 pip stop loses 30000 JPY per lot, or $200 at 150
+            self.assertEqual(0.5, self.size("USDJPY", 101.0, 0.3))
+
+    def test_converts_with_the_inverse_of_a_pair_quoted_in_another_currency(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0, currency="EUR"):
+            # $200 per lot is ~185 EUR at EURUSD 1.08
+            self.assertEqual(0.54, self.size("GBPUSD", 101.0, 0.002))
+
+    def test_converts_with_a_direct_pair(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0, currency="JPY"):
+            # $200 per lot is ~30000 JPY at USDJPY 150
+            self.assertEqual(0.5, self.size("EURUSD", 15100.0, 0.002))
+
+    def test_floors_to_the_volume_step_and_caps_at_the_maximum(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0):
+            # 0.299 lots, which must not be rounded up to risk more than asked
+            self.assertEqual(0.29, self.size("EURUSD", 59.8, 0.002))
+            self.assertEqual(100.0, self.size("EURUSD", 10**7, 0.002))
+
+    def test_rejects_orders_below_the_minimum_volume(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0):
+            with self.assertRaises(HTTPException) as e:
+                self.size("EURUSD", 1.0, 0.002)
+            self.assertEqual(400, e.exception.status_code)
+
+            with self.assertRaises(HTTPException) as e:
+                self.size("EURUSD", 100.0, 0.0)
+            self.assertEqual(400, e.exception.status_code)
+
+    def test_rejects_currencies_without_a_conversion(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0, currency="CHF"):
+            with self.assertRaises(HTTPException) as e:
+                self.size("EURUSD", 100.0, 0.002)
+
+        self.assertEqual(400, e.exception.status_code)
+
+    def test_stale_rates_are_re_read(self):
+        self.sizer.max_age = 0.05
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            self.size("USDJPY", 100.0, 0.3)
+            symbol_cache.invalidate_tick(ACCOUNT_ID, "USDJPY")
+            self.size("USDJPY", 100.0, 0.3)
+            self.assertEqual(1, terminal.calls["symbol_info_tick"])
+
+            time.sleep(0.06)
+            self.size("USDJPY", 100.0, 0.3)
+            self.assertEqual(2, terminal.calls["symbol_info_tick"])
+
+    def test_refresh_rates_re_reads_used_rates(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            self.size("EURUSD", 100.0, 0.002)
+            self.size("USDJPY", 100.0, 0.3)
+            symbol_cache.invalidate_tick(ACCOUNT_ID, "USDJPY")
+
+            self.assertEqual(2, self.sizer.refresh_rates(ACCOUNT_ID))
+            self.assertEqual(2, terminal.calls["symbol_info_tick"])
+            self.assertEqual(0, self.sizer.refresh_rates(ACCOUNT_ID + 1))
+
+    def test_specs_follow_the_cached_symbol_info(self):
+        with fake_mt5.patched(history_positions=0, open_positions=0):
+            info = symbol_cache.symbol_info(ACCOUNT_ID, "EURUSD")
+            spec = self.sizer.spec(ACCOUNT_ID, info)
+            self.assertIs(spec, self.sizer.spec(ACCOUNT_ID, info))
+
+            symbol_cache.invalidate(ACCOUNT_ID, "EURUSD")
+            info = symbol_cache.symbol_info(ACCOUNT_ID, "EURUSD")
+            self.assertIsNot(spec, self.sizer.spec(ACCOUNT_ID, info))
+
+
+class RateRefresherTestCase(unittest.TestCase):
+    def test_refreshes_while_orders_are_placed(self):
+        refreshed = []
+        refresher = RateRefresher(ACCOUNT_ID, interval=0.01, idle_timeout=0.05)
+
+        async def scenario():
+            refresher.touch()
+            await asyncio.sleep(0.2)
+
+        with patch.object(
+            lot_sizing, "refresh_conversion_rates", side_effect=refreshed.append
+        ):
+            asyncio.run(scenario())
+
+        self.assertGreater(len(refreshed), 1)
+        self.assertEqual({ACCOUNT_ID}, set(refreshed))
+        # Idle, so stopped
+        self.assertIsNone(refresher._task)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,19 @@
 import MetaTrader5 as mt5
 from typing import Tuple, Optional
+from mt5.executor import (
+    WORKER_MODE,
+    get_terminal,
+    register_worker,
+    unregister_worker,
+)
+from mt5.history_store import reset_account_history
+from mt5.lot_sizing import lot_sizer
+from mt5.risk_gate import reset_exposure
+from mt5.mt5_utils import load_stored_history
+from mt5.symbol_cache import symbol_cache
+from mt5.worker_pool import get_or_start_worker, stop_worker
 from utils.logging import get_logger
+from utils.metrics import set_mt5_account
 
 log = get_logger(__name__)
 
@@ -20,10 +33,46 @@ def init_mt5_instance(
     :return: A tuple with a success flag (boolean) and an optional error (tuple of error code and message)
     """
     log.info(f"Initializing MT5 Account {accountId}")
+    if WORKER_MODE == "process":
+        # The account gets its own process, so it cannot redirect any other account's calls
+        worker = get_or_start_worker(accountId)
+        # A worker is not thread safe, so a re-initialization queues behind the background calls on the account's
+        # executor rather than calling the worker from this thread
+        register_worker(accountId, worker)
+        success, error = get_terminal(accountId).call(
+            initialize_terminal, accountId, password, server, path
+        )
+        if not success:
+            unregister_worker(accountId)
+            stop_worker(accountId)
+            instances.pop(accountId, None)
+            return False, error
+    else:
+        success, error = initialize_terminal(accountId, password, server, path)
+        if not success:
+            return False, error
+
+    instances[accountId] = {"login": accountId, "server": server, "path": path}
+    return True, None
+
+
+def initialize_terminal(
+    accountId: int, password: str, server: str, path: str
+) -> Tuple[bool, Optional[Tuple[int, str]]]:
+    """
+    Connects the current process to the MT5 terminal. In process mode this runs inside the account's worker process.
+    """
     if not mt5.initialize(login=accountId, password=password, server=server, path=path):
         error = mt5.last_error()
         return False, error
-    instances[accountId] = {"login": accountId, "server": server, "path": path}
+    # Any previously synced history may belong to a different terminal/session, so only keep what was persisted for
+    # this account
+    reset_account_history(accountId)
+    load_stored_history(accountId)
+    symbol_cache.invalidate(accountId)
+    lot_sizer.reset(accountId)
+    reset_exposure(accountId)
+    set_mt5_account(accountId)
     return True, None
 
 
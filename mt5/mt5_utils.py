@@ -1,26 +1,118 @@
 from datetime import datetime, timedelta
-from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import HTTPException
-import json
 import MetaTrader5 as mt5
 
-from internal_types import Trade, TradesList
+from internal_types import Trade, TradeFilter, TradesList
+from mt5.history_store import (
+    HISTORY_START,
+    SYNC_OVERLAP,
+    AccountHistory,
+    get_account_history,
+    set_account_history,
+)
+from mt5.risk_gate import record_positions
+from mt5.trade_stats import get_account_stats, position_profit
+from mt5.trade_store import get_trade_store
 
 from utils.logging import get_logger, log_error
 
 log = get_logger(__name__)
 
 
+class PositionClosedError(Exception):
+    """
+    The position of a trade that was not fully closed in the orders read has closed since, so its (last) closing order
+    is only in the next sync's window
+    """
+
+
+class DealIndex:
+    """
+    Deals indexed by (position_id, order), so profit for any order can be looked up without a terminal call.
+
+    Built from a single `history_deals_get(from, to)` window, and can be extended with later windows. Deals are
+    de-duplicated by ticket, so overlapping windows are safe to add.
+    """
+
+    def __init__(self, deals=()):
+        self._deals: Dict[Tuple[int, int], List[dict]] = {}
+        self._tickets: Set[int] = set()
+        self.add_deals(deals)
+
+    def add_deals(self, deals, added_deals: Optional[List[dict]] = None) -> int:
+        """
+        :param deals: Iterable of MT5 TradeDeal namedtuples, or their dicts
+        :param added_deals: Appended with the deals that were not already indexed
+        :return: The number of deals that were not already indexed
+        """
+        added = 0
+        for deal in deals:
+            deal_dict = deal._asdict() if hasattr(deal, "_asdict") else deal
+            if deal_dict["ticket"] in self._tickets:
+                continue
+            self._tickets.add(deal_dict["ticket"])
+
+            key = (deal_dict["position_id"], deal_dict["order"])
+            self._deals.setdefault(key, []).append(deal_dict)
+            if added_deals is not None:
+                added_deals.append(deal_dict)
+            added += 1
+        return added
+
+    def deals_for_order(self, position_id: int, order: int) -> List[dict]:
+        return self._deals.get((position_id, order), [])
+
+    def profit_for_order(self, position_id: int, order: int) -> Optional[float]:
+        """
+        Net profit (profit + swap + commission) of all deals executed by the order, or None if it has no deals
+        """
+        deals = self.deals_for_order(position_id, order)
+        if not deals:
+            return None
+        return round(
+            sum(
+                deal.get("profit", 0) + deal.get("swap", 0) + deal.get("commission", 0)
+                for deal in deals
+            ),
+            2,
+        )
+
+    def __len__(self):
+        return len(self._tickets)
+
+
 def get_trades_for_account(accountId: int) -> TradesList:
-    list_of_trades: TradesList = []
-    log.info(f"Finding trades in account {accountId}")
+    """
+    Returns all trades for the account, syncing only the orders since the last watermark.
 
-    start_time = datetime(2024, 1, 1)
+    Closed positions are only reconstructed once, when their orders are first seen. Open positions are rebuilt on
+    every call as their profit, SL and TP are live.
+    """
+    return sync_account_history(accountId).list_trades()
+
+
+def get_account_stats_summary(accountId: int) -> dict:
+    """
+    Syncs the account's history, and returns the performance aggregates of its closed trades
+    """
+    sync_account_history(accountId)
+    return get_account_stats(accountId).summary()
+
+
+def sync_account_history(accountId: int) -> AccountHistory:
+    """
+    Syncs the account's orders and deals since the last watermark, and rebuilds the trades that changed
+    """
+    history = get_account_history(accountId)
+    log.info("Finding trades in account %s", accountId)
+
+    start_time = history.sync_window_start()
     end_time = datetime.now() + timedelta(
         days=1
     )  # To get around any timezone differences
 
-    # Get all orders
+    # Get all orders since the last sync
     orders = mt5.history_orders_get(start_time, end_time)
     err = mt5.last_error()
     if orders == None:
@@ -31,165 +123,439 @@ def get_trades_for_account(accountId: int) -> TradesList:
             status_code=500, detail=f"Failed to get historic trades: {err_str}"
         )
 
-    log.debug(f"Found {len(orders)} orders for account {accountId}")
-
-    position_id_orders = defaultdict(list)
-
-    # Format orders in to a position dict
-    for trade in orders:
-        trade_dict = trade._asdict()
-        position_id_orders[trade_dict["position_id"]].append(trade_dict)
-
-    log.info(f"Found {len(position_id_orders)} individual positions.")
-
-    for position_id, order_list in position_id_orders.items():
-        # Build generic trade data
-        combined_trade: Trade = {
-            "position_id": position_id,
-            "symbol": order_list[0]["symbol"],
-            "total_volume": order_list[0]["volume_initial"],
-        }
-
-        # All trades should have a buy and sell order (eventually)
-        order_buy = {}
-        order_sell = {}
-
-        for order in order_list:
-            log.debug(f"Found order: {json.dumps(order, indent=4)}")
-            if (
-                order["type"] == 0
-            ):  # ORDER_TYPE_BUY https://www.mql5.com/en/docs/constants/tradingconstants/orderproperties#enum_order_type
-                log.debug(
-                    f"For position {position_id} found BUY order with ticket {order.get('ticket')}"
-                )
-                order_buy = order
-            elif (
-                order["type"] == 1
-            ):  # ORDER_TYPE_SELL https://www.mql5.com/en/docs/constants/tradingconstants/orderproperties#enum_order_type
-                order_sell = order
-                log.debug(
-                    f"For position {position_id} found SELL order with ticket {order.get('ticket')}"
-                )
-            else:
-                log.warn(f"Unsupport order type for position {position_id}: {order}")
-
-        # Handles the case if an order doesnt have a corresponding close. This means we have found an open trade.
-        if order_buy == {} and order_sell == {}:
-            log.warn(
-                f"For position {position_id}, found no order_buy or order_sell -  order_buy: {json.dumps(order_buy, indent=4)}, order_sell: {json.dumps(order_sell, indent=4)}"
-            )
-        # If there arent at least 2 orders for a position, it must be an open trade.
-        elif order_buy == {} or order_sell == {}:
-            log.debug(
-                f"For position {position_id} no {'BUY' if order_buy == {} else 'SELL'} order. Treating as open"
-            )
-            open_position = mt5.positions_get(
-                ticket=order_buy.get("ticket")
-                if order_buy
-                else order_sell.get("ticket")
+    log.debug(
+        "Found %s orders for account %s since %s", len(orders), accountId, start_time
+    )
+
+    # Get all deals for the same window in one call, rather than one call per closed position
+    deals = mt5.history_deals_get(start_time, end_time)
+    err = mt5.last_error()
+    if deals == None:
+        err_str = log_error(
+            err, f"/trades/<accountId> [GET] with accountId: {accountId}"
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get historic deals: {err_str}"
+        )
+
+    if history.deal_index is None:
+        history.deal_index = DealIndex()
+    history.deal_index.add_deals(deals, history.unsaved_deals)
+
+    changed_positions = history.merge_orders(orders)
+
+    log.info(
+        "Found %s individual positions (%s changed).",
+        len(history.orders_by_position),
+        len(changed_positions),
+    )
+
+    for position_id in history.positions_to_rebuild():
+        try:
+            trade = _build_trade(
+                accountId,
+                position_id,
+                history.orders_for_position(position_id),
+                history.deal_index,
             )
-            err = mt5.last_error()
-            if open_position is None:
-                err_str = log_error(
-                    err, f"/trades/<accountId> [GET] with accountId: {accountId}"
-                )
-                raise HTTPException(
-                    status_code=500, detail=f"Failed to get historic trades: {err_str}"
-                )
-
-            pos_dict = open_position[0]._asdict()
-
-            # Build the open trades data
-            combined_trade["is_open"] = True
-            combined_trade["is_long"] = True if pos_dict["type"] == 0 else False
-            combined_trade["open_order_ticket"] = pos_dict["ticket"]
-            combined_trade["open_order_price"] = pos_dict["price_open"]
-            combined_trade["open_order_time"] = pos_dict["time"]
-            combined_trade["stop_loss"] = pos_dict["sl"]
-            combined_trade["take_profit"] = pos_dict["tp"]
-            combined_trade["profit"] = round(
-                pos_dict.get("profit", 0)
-                + pos_dict.get("swap", 0)
-                + pos_dict.get("commission", 0),
-                2,
+        except PositionClosedError:
+            log.info(
+                "Position %s closed during the sync, rechecking it on the next one",
+                position_id,
             )
+            history.mark_dirty(position_id)
+            continue
+        if trade is None:
+            history.discard_position(position_id)
+            continue
+        history.store_trade(trade)
+
+    _after_sync(history)
+    return history
+
+
+def _after_sync(history: AccountHistory):
+    """
+    Updates the stats with, and persists, what the sync changed. Most syncs (e.g. the stream's reconciles) change
+    nothing, and write nothing.
+    """
+    orders, deals, trades = history.take_unsaved()
+    if not (orders or deals or trades):
+        return
+    get_account_stats(history.account_id).add_trades(trades)
+    store = get_trade_store()
+    if store is not None:
+        store.save(
+            history.account_id,
+            orders,
+            deals,
+            trades,
+            history.watermark,
+            history.last_ticket,
+        )
+
+
+def load_stored_history(accountId: int) -> bool:
+    """
+    Replaces the account's history with the one persisted by its last syncs, so the next sync starts from the stored
+    watermark rather than HISTORY_START. Only the orders and deals later syncs can need are loaded, so the deal index
+    does not cover older closed positions.
+
+    :return: Whether a stored history was found
+    """
+    store = get_trade_store()
+    if store is None:
+        return False
+    stored = store.load(accountId, int(SYNC_OVERLAP.total_seconds()))
+    if stored is None:
+        return False
+
+    history = AccountHistory(accountId)
+    for order in stored.orders:
+        history.orders_by_position.setdefault(order["position_id"], {})[
+            order["ticket"]
+        ] = order
+    history.deal_index = DealIndex(stored.deals)
+    for trade in stored.trades:
+        history.trades[trade["position_id"]] = trade
+        if trade["is_open"]:
+            history.open_positions.add(trade["position_id"])
+    history.watermark = stored.watermark
+    history.last_ticket = stored.last_ticket
+
+    # Positions that are still open but were stored as closed (as partial closes were, before they were recognised)
+    # are rebuilt by the next sync, which then replaces their stored trade
+    positions = mt5.positions_get()
+    if positions is None:
+        log_error(mt5.last_error(), f"checking the stored trades of {accountId}")
+        positions = ()
+    reopened = [
+        position.identifier
+        for position in positions
+        if position.identifier in history.trades
+        and not history.trades[position.identifier]["is_open"]
+    ]
+    if reopened:
+        log.warning(
+            f"Rebuilding {len(reopened)} stored trades of account {accountId} that are still open"
+        )
+        orders, deals = store.load_positions(accountId, reopened)
+        for order in orders:
+            history.orders_by_position.setdefault(order["position_id"], {})[
+                order["ticket"]
+            ] = order
+        history.deal_index.add_deals(deals)
+        for position_id in reopened:
+            del history.trades[position_id]
+            history.mark_dirty(position_id)
+
+    set_account_history(accountId, history)
+    get_account_stats(accountId).add_trades(history.list_trades())
+    log.info(
+        f"Loaded {len(stored.trades)} stored trades for account {accountId}, syncing from {stored.watermark}"
+    )
+    return True
+
+
+def find_trades(accountId: int, trade_filter: TradeFilter) -> dict:
+    """
+    Returns a page of the account's trades matching the filter, ordered by open time then position id.
 
-            list_of_trades.append(combined_trade)
+    Filters are pushed down to the terminal where they can be: `status=open` only reads the open positions, and until
+    the account's full history has been synced, history is only read from `from_time` and for `symbol`. Once it has,
+    the (incremental) full sync is cheaper to reuse and the trades are filtered in memory. Filters that do not narrow
+    the history read (`to_time`, `status=closed` and `limit`) sync it in full, so later requests sync incrementally.
+
+    :return: The page of trades, and the cursor to the next page (None on the last page)
+    """
+    after = _parse_trade_cursor(trade_filter.cursor)
+    from_time = trade_filter.from_time
+    if after is not None and (from_time is None or after[0] > from_time):
+        from_time = after[0]
+
+    if trade_filter.status == "open":
+        trades = get_open_positions_for_account(accountId, trade_filter.symbol)
+    elif get_account_history(accountId).watermark is None and (
+        from_time is not None or trade_filter.symbol
+    ):
+        trades = _find_trades_in_window(accountId, from_time, trade_filter.symbol)
+    else:
+        trades = get_trades_for_account(accountId)
+
+    keys = []
+    for trade in trades:
+        key = (trade["open_order_time"], trade["position_id"])
+        if (
+            (from_time is not None and key[0] < from_time)
+            or (trade_filter.to_time is not None and key[0] >= trade_filter.to_time)
+            or (trade_filter.symbol and trade["symbol"] != trade_filter.symbol)
+            or (trade_filter.status == "closed" and trade["is_open"])
+            or (after is not None and key <= after)
+        ):
             continue
+        keys.append((key, trade))
+    keys.sort(key=lambda k: k[0])
 
-        isLong = order_buy["time_done"] < order_sell["time_done"]
-        combined_trade["is_long"] = isLong
+    page = [trade for _, trade in keys[: trade_filter.limit]]
+    next_cursor = None
+    if trade_filter.limit is not None and len(keys) > trade_filter.limit:
+        last = keys[trade_filter.limit - 1][0]
+        next_cursor = f"{last[0]}_{last[1]}"
+    return {"trades": page, "next_cursor": next_cursor}
 
-        combined_trade["open_order_ticket"] = (
-            order_buy["ticket"] if isLong else order_sell["ticket"]
+
+def _parse_trade_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    :param cursor: `<open time>_<position id>` of the last trade of the previous page
+    """
+    if not cursor:
+        return None
+    try:
+        open_time, position_id = cursor.split("_")
+        return int(open_time), int(position_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {cursor}")
+
+
+def _find_trades_in_window(
+    accountId: int, from_time: Optional[int], symbol: Optional[str]
+) -> TradesList:
+    """
+    Reconstructs the trades opened since from_time, for the symbol if given, from only the orders and deals of that
+    window. Trades opened before it are left out, even when they were closed within it.
+
+    Nothing is stored in the account's history, as it is incomplete.
+    """
+    start_time = HISTORY_START
+    if from_time is not None:
+        # Widened like incremental syncs, to cover terminal/server timezone differences
+        start_time = max(
+            HISTORY_START, datetime.fromtimestamp(from_time) - SYNC_OVERLAP
         )
-        # If the order was long, we can use the buy order to set open/close data
-        combined_trade["open_order_price"] = (
-            order_buy["price_current"] if isLong else order_sell["price_current"]
+    end_time = datetime.now() + timedelta(days=1)
+    kwargs = {"group": symbol} if symbol else {}
+
+    orders = mt5.history_orders_get(start_time, end_time, **kwargs)
+    if orders is None:
+        err_str = log_error(mt5.last_error(), f"finding trades for {accountId}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get historic trades: {err_str}"
         )
-        combined_trade["open_order_time"] = (
-            order_buy["time_done"] if isLong else order_sell["time_done"]
+    deals = mt5.history_deals_get(start_time, end_time, **kwargs)
+    if deals is None:
+        err_str = log_error(mt5.last_error(), f"finding trades for {accountId}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get historic deals: {err_str}"
         )
+    log.debug(
+        "Found %s orders for account %s since %s", len(orders), accountId, start_time
+    )
+
+    open_positions = {
+        trade["position_id"]: trade
+        for trade in get_open_positions_for_account(accountId, symbol)
+    }
+    deal_index = DealIndex(deals)
+    orders_by_position: Dict[int, List[dict]] = {}
+    for order in orders:
+        order_dict = order._asdict()
+        orders_by_position.setdefault(order_dict["position_id"], []).append(order_dict)
+
+    trades = []
+    for position_id, order_list in orders_by_position.items():
+        if position_id in open_positions:
+            trades.append(open_positions[position_id])
+            continue
+        # A closed position with only one side in the window was opened before it
+        if len({order["type"] for order in order_list} & {0, 1}) < 2:
+            continue
+        try:
+            trade = _build_trade(accountId, position_id, order_list, deal_index)
+        except PositionClosedError:
+            # Partially closed, and closed since the orders were read
+            continue
+        if trade is not None:
+            trades.append(trade)
+    return trades
 
-        combined_trade["stop_loss"] = order_buy["sl"] if isLong else order_sell["sl"]
-        combined_trade["take_profit"] = order_buy["tp"] if isLong else order_sell["tp"]
 
-        combined_trade["close_order_ticket"] = (
-            order_sell["ticket"] if isLong else order_buy["ticket"]
+def _build_trade(
+    accountId: int, position_id: int, order_list: List[dict], deal_index: DealIndex
+) -> Optional[Trade]:
+    """
+    Reconstructs a single trade from all the orders of its position
+    """
+    # Build generic trade data
+    combined_trade: Trade = {
+        "position_id": position_id,
+        "symbol": order_list[0]["symbol"],
+        "total_volume": order_list[0]["volume_initial"],
+    }
+
+    # All trades should have a buy and sell order (eventually)
+    order_buy = {}
+    order_sell = {}
+    # Orders of each type, as partial closes add more than one closing order
+    orders_by_type: Dict[int, List[dict]] = {0: [], 1: []}
+
+    for order in order_list:
+        log.debug("Found order: %s", order)
+        if order["type"] in orders_by_type:
+            orders_by_type[order["type"]].append(order)
+        if (
+            order["type"] == 0
+        ):  # ORDER_TYPE_BUY https://www.mql5.com/en/docs/constants/tradingconstants/orderproperties#enum_order_type
+            log.debug(
+                "For position %s found BUY order with ticket %s",
+                position_id,
+                order.get("ticket"),
+            )
+            order_buy = order
+        elif (
+            order["type"] == 1
+        ):  # ORDER_TYPE_SELL https://www.mql5.com/en/docs/constants/tradingconstants/orderproperties#enum_order_type
+            order_sell = order
+            log.debug(
+                "For position %s found SELL order with ticket %s",
+                position_id,
+                order.get("ticket"),
+            )
+        else:
+            log.warn(f"Unsupport order type for position {position_id}: {order}")
+
+    # Handles the case if an order doesnt have a corresponding close. This means we have found an open trade.
+    if order_buy == {} and order_sell == {}:
+        log.warning(
+            "For position %s, found no order_buy or order_sell -  order_buy: %s, order_sell: %s",
+            position_id,
+            order_buy,
+            order_sell,
         )
-        combined_trade["close_order_price"] = (
-            order_sell["price_current"] if isLong else order_buy["price_current"]
+        return None
+    # If there arent at least 2 orders for a position, it must be an open trade.
+    elif order_buy == {} or order_sell == {}:
+        log.debug(
+            "For position %s no %s order. Treating as open",
+            position_id,
+            "BUY" if order_buy == {} else "SELL",
         )
-        combined_trade["close_order_time"] = (
-            order_sell["time_done"] if isLong else order_buy["time_done"]
+        return _build_open_trade(
+            accountId,
+            combined_trade,
+            order_buy.get("ticket") if order_buy else order_sell.get("ticket"),
         )
 
+    # Tickets break ties, as a position can be opened and (partially) closed within a second
+    isLong = (order_buy["time_done"], order_buy["ticket"]) < (
+        order_sell["time_done"],
+        order_sell["ticket"],
+    )
+    combined_trade["is_long"] = isLong
+
+    # A partial close also leaves a BUY and a SELL order, so the position is only closed once its closing orders
+    # cover the volume it was opened with
+    opening_orders = orders_by_type[0 if isLong else 1]
+    closing_orders = orders_by_type[1 if isLong else 0]
+    open_volume = round(sum(o["volume_initial"] for o in opening_orders), 2)
+    close_volume = round(sum(o["volume_initial"] for o in closing_orders), 2)
+    if close_volume < open_volume:
         log.debug(
-            f"Populated basic order data for position {position_id}: {combined_trade}"
+            "Position %s is partially closed (%s of %s). Treating as open",
+            position_id,
+            close_volume,
+            open_volume,
         )
+        return _build_open_trade(accountId, combined_trade, opening_orders[0]["ticket"])
+
+    combined_trade["open_order_ticket"] = (
+        order_buy["ticket"] if isLong else order_sell["ticket"]
+    )
+    # If the order was long, we can use the buy order to set open/close data
+    combined_trade["open_order_price"] = (
+        order_buy["price_current"] if isLong else order_sell["price_current"]
+    )
+    combined_trade["open_order_time"] = (
+        order_buy["time_done"] if isLong else order_sell["time_done"]
+    )
 
-        # Since we have the open/closed ticket... we can get the profit at close, by getting the corresponding deal data
-        deals_for_position = mt5.history_deals_get(
-            position=combined_trade["position_id"]
+    combined_trade["stop_loss"] = order_buy["sl"] if isLong else order_sell["sl"]
+    combined_trade["take_profit"] = order_buy["tp"] if isLong else order_sell["tp"]
+
+    combined_trade["close_order_ticket"] = (
+        order_sell["ticket"] if isLong else order_buy["ticket"]
+    )
+    combined_trade["close_order_price"] = (
+        order_sell["price_current"] if isLong else order_buy["price_current"]
+    )
+    combined_trade["close_order_time"] = (
+        order_sell["time_done"] if isLong else order_buy["time_done"]
+    )
+
+    # Since we have the closing tickets... we can get the profit at close, from the corresponding deal data
+    profits = [
+        deal_index.profit_for_order(position_id, order["ticket"])
+        for order in closing_orders
+    ]
+    combined_trade["profit"] = None if None in profits else round(sum(profits), 2)
+
+    # We shouldn't not have a profit in historical trades
+    if combined_trade.get("profit") is None:
+        log.error(
+            f"Profit should not be None for position {combined_trade['position_id']}"
+        )
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unable to calculate profit for position {combined_trade['position_id']}. Check adapter logs.",
         )
 
-        log.debug(
-            f"Found {len(deals_for_position)} deal(s) for position {position_id} with tickets {[t._asdict().get('ticket') for t in deals_for_position]}"
-        )
-
-        for deal in deals_for_position:
-            deal_dict = deal._asdict()
-            if deal_dict.get("order") == combined_trade["close_order_ticket"]:
-                profit = round(
-                    deal_dict.get("profit", 0)
-                    + deal_dict.get("swap", 0)
-                    + deal_dict.get("commission", 0),
-                    2,
-                )
-                combined_trade["profit"] = profit
-
-        # We shouldn't not have a profit in historical trades
-        if combined_trade.get("profit") is None:
-            log.error(
-                f"Profit should not be None for position {combined_trade['position_id']}"
-            )
-            raise HTTPException(
-                status_code=500,
-                detail=f"Unable to calculate profit for position {combined_trade['position_id']}. Check adapter logs.",
-            )
+    combined_trade["is_open"] = False
+
+    # Logged once complete, as records are formatted later, on the logging thread
+    log.debug("Built trade for position %s: %s", position_id, combined_trade)
+
+    return combined_trade
+
+
+def _build_open_trade(accountId: int, combined_trade: Trade, ticket: int) -> Trade:
+    """
+    Populates an open trade's live data from its position
+
+    :raises PositionClosedError: The position is no longer open
+    """
+    open_position = mt5.positions_get(ticket=ticket)
+    err = mt5.last_error()
+    if open_position is None:
+        err_str = log_error(
+            err, f"/trades/<accountId> [GET] with accountId: {accountId}"
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get historic trades: {err_str}"
+        )
 
-        combined_trade["is_open"] = False
+    if not open_position:
+        raise PositionClosedError(ticket)
 
-        list_of_trades.append(combined_trade)
-    return list_of_trades
+    pos_dict = open_position[0]._asdict()
+
+    # Build the open trades data
+    combined_trade["is_open"] = True
+    combined_trade["is_long"] = True if pos_dict["type"] == 0 else False
+    # The live volume, which is less than the opening order's after a partial close
+    combined_trade["total_volume"] = pos_dict["volume"]
+    combined_trade["open_order_ticket"] = pos_dict["ticket"]
+    combined_trade["open_order_price"] = pos_dict["price_open"]
+    combined_trade["open_order_time"] = pos_dict["time"]
+    combined_trade["stop_loss"] = pos_dict["sl"]
+    combined_trade["take_profit"] = pos_dict["tp"]
+    combined_trade["profit"] = position_profit(pos_dict)
+
+    return without_close(combined_trade)
 
 
 def build_open_trade_from_position_id(position_id) -> Trade:
     """
     This method should only be called directly after opening a trade. We assume that the trade is open here
     """
-    formatted_trade: Trade = {}
-
     open_position = mt5.positions_get(position=position_id)
     err = mt5.last_error()
     if open_position is None:
@@ -201,11 +567,42 @@ def build_open_trade_from_position_id(position_id) -> Trade:
             detail=f"Failed to get open position from position id: {err_str}",
         )
 
-    log.info(f"Found {len(open_position)} open positions for position_id {position_id}")
+    log.info(
+        "Found %s open positions for position_id %s", len(open_position), position_id
+    )
 
-    pos_dict = open_position[0]._asdict()
+    return _trade_from_position(position_id, open_position[0]._asdict())
 
-    pos_dict = open_position[0]._asdict()
+
+def get_open_positions_for_account(
+    accountId: int, symbol: Optional[str] = None
+) -> TradesList:
+    """
+    Reads the account's open positions as trades, with a single positions_get call and no history.
+
+    Cheap enough to poll frequently, but only sees open positions, so closes need a history sync to get their profit.
+
+    :param symbol: Only read positions of this symbol (or MT5 group pattern)
+    """
+    positions = mt5.positions_get(group=symbol) if symbol else mt5.positions_get()
+    if positions is None:
+        err = mt5.last_error()
+        err_str = log_error(err, f"reading open positions for accountId: {accountId}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get open positions: {err_str}"
+        )
+
+    trades = [
+        _trade_from_position(position.identifier, position._asdict())
+        for position in positions
+    ]
+    if not symbol:
+        record_positions(accountId, trades)
+    return trades
+
+
+def _trade_from_position(position_id: int, pos_dict: dict) -> Trade:
+    formatted_trade: Trade = {}
     # Generic data
     formatted_trade["position_id"] = position_id
     formatted_trade["symbol"] = pos_dict.get("symbol")
@@ -219,11 +616,17 @@ def build_open_trade_from_position_id(position_id) -> Trade:
     formatted_trade["open_order_time"] = pos_dict["time"]
     formatted_trade["stop_loss"] = pos_dict["sl"]
     formatted_trade["take_profit"] = pos_dict["tp"]
-    formatted_trade["profit"] = round(
-        pos_dict.get("profit", 0)
-        + pos_dict.get("swap", 0)
-        + pos_dict.get("commission", 0),
-        2,
-    )
+    formatted_trade["profit"] = position_profit(pos_dict)
 
-    return formatted_trade
+    return without_close(formatted_trade)
+
+
+def without_close(trade: Trade) -> Trade:
+    """
+    Sets an open trade's close fields to None, like the response model would, so trades served without validation
+    have the same fields
+    """
+    trade["close_order_ticket"] = None
+    trade["close_order_price"] = None
+    trade["close_order_time"] = None
+    return trade
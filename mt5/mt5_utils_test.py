@@ -1,7 +1,12 @@
 import unittest
 import os
+from collections import namedtuple
 from dotenv import load_dotenv
-from mt5.mt5_utils import get_trades_for_account, build_open_trade_from_position_id
+from mt5.mt5_utils import (
+    DealIndex,
+    get_trades_for_account,
+    build_open_trade_from_position_id,
+)
 from mt5.mt5_instance import init_mt5_instance
 import json
 
@@ -42,5 +47,34 @@ class MetaTraderAPITestCase(unittest.TestCase):
         self.assertIsNotNone(res["profit"])
 
 
+Deal = namedtuple("TradeDeal", "ticket order position_id profit swap commission")
+
+
+class DealIndexTestCase(unittest.TestCase):
+    def test_profit_for_order(self):
+        index = DealIndex(
+            [
+                Deal(1, 10, 100, 0.0, 0.0, -0.5),
+                Deal(2, 11, 100, 12.345, -1.0, -0.5),
+                Deal(3, 21, 200, 5.0, 0.0, 0.0),
+            ]
+        )
+
+        self.assertEqual(10.85, index.profit_for_order(100, 11))
+        self.assertEqual(5.0, index.profit_for_order(200, 21))
+        self.assertIsNone(index.profit_for_order(100, 21))
+
+    def test_overlapping_windows_are_deduplicated(self):
+        index = DealIndex([Deal(1, 10, 100, 1.0, 0.0, 0.0)])
+
+        added = index.add_deals(
+            [Deal(1, 10, 100, 1.0, 0.0, 0.0), Deal(2, 10, 100, 2.0, 0.0, 0.0)]
+        )
+
+        self.assertEqual(1, added)
+        self.assertEqual(2, len(index))
+        self.assertEqual(3.0, index.profit_for_order(100, 10))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,451 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+import MetaTrader5 as mt5
+from fastapi import HTTPException
+
+from internal_types import Trade
+from mt5.lot_sizing import lot_sizer
+from mt5.symbol_cache import symbol_cache
+from mt5.trade_stats import SECONDS_PER_DAY, position_profit
+from utils.logging import get_logger, log_error
+from utils.metrics import risk_rejections_total
+
+log = get_logger(__name__)
+
+# Limits checked before every order is sent. 0 disables a limit, and with all of them disabled the gate makes no
+# terminal calls at all.
+# Open positions, including the new one
+RISK_MAX_POSITIONS = int(os.getenv("RISK_MAX_POSITIONS", "0"))
+# Lots open in a single symbol, long and short combined, including the new order
+RISK_MAX_SYMBOL_LOTS = float(os.getenv("RISK_MAX_SYMBOL_LOTS", "0"))
+# Margin, including the new order's, as a percentage of equity
+RISK_MAX_MARGIN_PERCENT = float(os.getenv("RISK_MAX_MARGIN_PERCENT", "0"))
+# Loss today (in trade server time), realized and floating, in the account currency, beyond which no more orders are
+# opened
+RISK_MAX_DAILY_LOSS = float(os.getenv("RISK_MAX_DAILY_LOSS", "0"))
+# Seconds the index can go without its positions or account being re-read (by the transaction stream, account
+# snapshots or the gate itself) before an order re-reads them
+RISK_SYNC_MAX_AGE = float(os.getenv("RISK_SYNC_MAX_AGE", "60"))
+
+# Trade servers are a whole number of quarter hours from UTC, and never more than 14 hours
+SERVER_OFFSET_STEP = 900
+MAX_SERVER_OFFSET = 14 * 3600
+# Absorbs float error in summed volumes
+VOLUME_EPSILON = 1e-9
+
+
+class RiskLimits:
+    def __init__(
+        self,
+        max_positions: int = RISK_MAX_POSITIONS,
+        max_symbol_lots: float = RISK_MAX_SYMBOL_LOTS,
+        max_margin_percent: float = RISK_MAX_MARGIN_PERCENT,
+        max_daily_loss: float = RISK_MAX_DAILY_LOSS,
+    ):
+        self.max_positions = max_positions
+        self.max_symbol_lots = max_symbol_lots
+        self.max_margin_percent = max_margin_percent
+        self.max_daily_loss = max_daily_loss
+
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            self.max_positions
+            or self.max_symbol_lots
+            or self.max_margin_percent
+            or self.max_daily_loss
+        )
+
+
+class PositionExposure:
+    __slots__ = ("symbol", "is_long", "volume", "margin", "profit")
+
+    def __init__(
+        self, symbol: str, is_long: bool, volume: float, margin: float, profit: float
+    ):
+        self.symbol = symbol
+        self.is_long = is_long
+        self.volume = volume
+        # Estimated when the position entered the index
+        self.margin = margin
+        self.profit = profit
+
+
+class ExposureIndex:
+    """
+    An account's open exposure, kept in memory so orders can be checked against the risk limits without reading
+    positions or the account first.
+
+    Seeded from the terminal on the first gated order, then maintained incrementally: fills and closes through the
+    adapter, open position polls of the transaction stream, and account_info reads (e.g. account snapshots) all update
+    it as they happen. Margin and balance are exact as of the last account read, and adjusted by estimates for
+    positions opened or closed since. If nothing has refreshed it for RISK_SYNC_MAX_AGE, or the day has changed, the
+    next order re-seeds it. Days are in trade server time, like deal times, with the server's UTC offset taken from the
+    ticks orders are priced from.
+
+    Terminal-side state, only used through the account's executor (see mt5.executor.TerminalExecutor).
+    """
+
+    def __init__(
+        self,
+        account_id: int,
+        limits: Optional[RiskLimits] = None,
+        max_age: float = RISK_SYNC_MAX_AGE,
+    ):
+        self.account_id = account_id
+        self.limits = limits or RiskLimits()
+        self.max_age = max_age
+        self.positions: Dict[int, PositionExposure] = {}
+        # (symbol, is long) -> open lots
+        self.volumes: Dict[Tuple[str, bool], float] = {}
+        self.floating = 0.0
+        self.balance = 0.0
+        self.leverage = 1
+        self.account_margin = 0.0
+        # Estimated margin of the positions opened, less that of those closed, since the last account read
+        self.margin_delta = 0.0
+        # Profit of the deals closed today
+        self.realized_today = 0.0
+        self.day: Optional[int] = None
+        # Seconds the trade server's clock is ahead of UTC
+        self.server_offset = 0
+        self.positions_synced_at = 0.0
+        self.account_synced_at = 0.0
+
+    @property
+    def seeded(self) -> bool:
+        return self.day is not None
+
+    @property
+    def margin(self) -> float:
+        return self.account_margin + self.margin_delta
+
+    @property
+    def equity(self) -> float:
+        return self.balance + self.floating
+
+    @property
+    def stale(self) -> bool:
+        if not self.seeded or self.day != self.server_day():
+            return True
+        now = time.monotonic()
+        return (
+            now - self.positions_synced_at > self.max_age
+            or now - self.account_synced_at > self.max_age
+        )
+
+    def check(
+        self,
+        info,
+        is_long: bool,
+        volume: float,
+        price: float,
+        server_time: Optional[int] = None,
+    ):
+        """
+        Rejects an order that would breach a limit, with a 403
+
+        :param info: The symbol's SymbolInfo, from symbol_cache
+        :param volume: The order's volume
+        :param price: The price the order is sent at
+        :param server_time: The time of the tick the price is from, in trade server time
+        """
+        limits = self.limits
+        if not limits.enabled:
+            return
+        if server_time:
+            self.observe_server_time(server_time)
+        if self.stale:
+            self.seed()
+
+        if limits.max_positions and len(self.positions) >= limits.max_positions:
+            self._reject(
+                "max_positions",
+                f"{len(self.positions)} positions are open, the most allowed is {limits.max_positions}",
+            )
+
+        if limits.max_symbol_lots:
+            lots = (
+                self.volumes.get((info.name, True), 0.0)
+                + self.volumes.get((info.name, False), 0.0)
+                + volume
+            )
+            if lots > limits.max_symbol_lots + VOLUME_EPSILON:
+                self._reject(
+                    "max_symbol_lots",
+                    f"{round(lots, 8)} lots of {info.name} would be open, the most allowed is "
+                    f"{limits.max_symbol_lots}",
+                )
+
+        if limits.max_daily_loss:
+            loss = -(self.realized_today + self.floating)
+            if loss >= limits.max_daily_loss:
+                self._reject(
+                    "max_daily_loss",
+                    f"Lost {round(loss, 2)} today, the most allowed is {limits.max_daily_loss}",
+                )
+
+        if limits.max_margin_percent:
+            margin = self.margin + self.estimate_margin(info, volume, price)
+            equity = self.equity
+            if equity <= 0 or margin / equity * 100 > limits.max_margin_percent:
+                self._reject(
+                    "max_margin_percent",
+                    f"Margin would be {round(margin, 2)} of {round(equity, 2)} equity, the most allowed is "
+                    f"{limits.max_margin_percent}%",
+                )
+
+    def observe_server_time(self, server_time: int):
+        """
+        Takes the trade server's UTC offset from the time of a recent tick. A tick a few minutes old still rounds to
+        the right offset, and the last tick of a market closed for days gives an impossible one, which is ignored.
+        """
+        offset = (
+            round((server_time - time.time()) / SERVER_OFFSET_STEP) * SERVER_OFFSET_STEP
+        )
+        if abs(offset) <= MAX_SERVER_OFFSET:
+            self.server_offset = offset
+
+    def server_day(self) -> int:
+        """
+        :return: Today's number of days since the epoch, in trade server time
+        """
+        return (int(time.time()) + self.server_offset) // SECONDS_PER_DAY
+
+    def estimate_margin(self, info, volume: float, price: float) -> float:
+        """
+        Estimates a position's margin in the account currency, as its notional value over the account leverage
+        """
+        spec = lot_sizer.spec(self.account_id, info)
+        rate = (
+            1.0
+            if spec.currency is None
+            else lot_sizer.rate(self.account_id, spec.currency)
+        )
+        notional = volume * price / spec.tick_size * spec.tick_value * rate
+        return notional / (self.leverage or 1)
+
+    def add_position(
+        self,
+        position_id: int,
+        info,
+        is_long: bool,
+        volume: float,
+        price: float,
+        profit: float = 0.0,
+    ):
+        """
+        Adds a position filled through the adapter
+        """
+        if not self.seeded or position_id in self.positions:
+            return
+        margin = self.estimate_margin(info, volume, price)
+        self._add(
+            position_id, PositionExposure(info.name, is_long, volume, margin, profit)
+        )
+        self.margin_delta += margin
+
+    def remove_position(self, position_id: int):
+        """
+        Removes a closed position, moving its last known profit to the realized profit until the next seed
+        """
+        position = self.positions.pop(position_id, None)
+        if position is None:
+            return
+        self._add_volume(position.symbol, position.is_long, -position.volume)
+        self.floating -= position.profit
+        self.margin_delta -= position.margin
+        self.balance += position.profit
+        self.realized_today += position.profit
+
+    def sync_positions(self, trades: Iterable[Trade]):
+        """
+        Reconciles the index with every open position of the account, as read from the terminal
+        """
+        if not self.seeded:
+            return
+        seen = set()
+        for trade in trades:
+            position_id = trade["position_id"]
+            seen.add(position_id)
+            position = self.positions.get(position_id)
+            if position is None:
+                self._add_trade(trade, track_margin=True)
+                continue
+            if position.volume != trade["total_volume"]:
+                self._add_volume(
+                    position.symbol,
+                    position.is_long,
+                    trade["total_volume"] - position.volume,
+                )
+                position.volume = trade["total_volume"]
+            self.floating += trade["profit"] - position.profit
+            position.profit = trade["profit"]
+        for position_id in [p for p in self.positions if p not in seen]:
+            self.remove_position(position_id)
+        self.positions_synced_at = time.monotonic()
+
+    def update_account(self, account: dict):
+        """
+        Takes the balance, margin and leverage of an account_info read
+        """
+        if not self.seeded:
+            return
+        self.balance = account["balance"]
+        self.account_margin = account["margin"]
+        self.margin_delta = 0.0
+        self.leverage = account["leverage"]
+        self.account_synced_at = time.monotonic()
+
+    def seed(self):
+        """
+        Reads the account, its open positions and today's deals from the terminal, replacing the whole index
+        """
+        account = mt5.account_info()
+        if account is None:
+            self._seed_failed("reading the account")
+        positions = mt5.positions_get()
+        if positions is None:
+            self._seed_failed("reading open positions")
+        day = self.server_day()
+        # In server time, like deal times
+        day_start = day * SECONDS_PER_DAY
+        # Padded by a day either side, to get around any timezone differences
+        deals = mt5.history_deals_get(
+            datetime.fromtimestamp(day_start) - timedelta(days=1),
+            datetime.now() + timedelta(days=1),
+        )
+        if deals is None:
+            self._seed_failed("reading today's deals")
+
+        self.positions = {}
+        self.volumes = {}
+        self.floating = 0.0
+        self.day = day
+        self.update_account(account._asdict())
+        for position in positions:
+            self._add_trade(
+                {
+                    "position_id": position.identifier,
+                    "symbol": position.symbol,
+                    "is_long": position.type == mt5.ORDER_TYPE_BUY,
+                    "total_volume": position.volume,
+                    "open_order_price": position.price_open,
+                    "profit": position_profit(position._asdict()),
+                },
+                track_margin=False,
+            )
+        # Only trade deals that closed (part of) a position realize profit. Deposits and withdrawals are balance
+        # deals, and not profit or loss.
+        trade_types = (mt5.DEAL_TYPE_BUY, mt5.DEAL_TYPE_SELL)
+        exits = (mt5.DEAL_ENTRY_OUT, mt5.DEAL_ENTRY_INOUT, mt5.DEAL_ENTRY_OUT_BY)
+        self.realized_today = sum(
+            d.profit + d.commission + d.swap + getattr(d, "fee", 0.0)
+            for d in deals
+            if d.time >= day_start and d.type in trade_types and d.entry in exits
+        )
+        self.positions_synced_at = time.monotonic()
+        log.info(
+            "Seeded exposure of account %s: %s positions, margin %s, realized today %s",
+            self.account_id,
+            len(self.positions),
+            self.margin,
+            round(self.realized_today, 2),
+        )
+
+    def summary(self) -> dict:
+        return {
+            "positions": len(self.positions),
+            "lots": {
+                f"{symbol} {'long' if is_long else 'short'}": round(lots, 8)
+                for (symbol, is_long), lots in sorted(self.volumes.items())
+            },
+            "margin": round(self.margin, 2),
+            "equity": round(self.equity, 2),
+            "daily_profit": round(self.realized_today + self.floating, 2),
+        }
+
+    def _add_trade(self, trade: Trade, track_margin: bool):
+        info = symbol_cache.symbol_info(self.account_id, trade["symbol"])
+        margin = 0.0
+        if info is not None:
+            try:
+                margin = self.estimate_margin(
+                    info, trade["total_volume"], trade["open_order_price"]
+                )
+            except HTTPException as e:
+                log.warning(
+                    f"Failed to estimate the margin of position {trade['position_id']}: {e.detail}"
+                )
+        self._add(
+            trade["position_id"],
+            PositionExposure(
+                trade["symbol"],
+                trade["is_long"],
+                trade["total_volume"],
+                margin,
+                trade["profit"],
+            ),
+        )
+        if track_margin:
+            self.margin_delta += margin
+
+    def _add(self, position_id: int, position: PositionExposure):
+        self.positions[position_id] = position
+        self._add_volume(position.symbol, position.is_long, position.volume)
+        self.floating += position.profit
+
+    def _add_volume(self, symbol: str, is_long: bool, volume: float):
+        key = (symbol, is_long)
+        lots = self.volumes.get(key, 0.0) + volume
+        if lots > VOLUME_EPSILON:
+            self.volumes[key] = lots
+        else:
+            self.volumes.pop(key, None)
+
+    def _reject(self, limit: str, reason: str):
+        risk_rejections_total.inc(str(self.account_id), limit)
+        log.warning(f"Rejected order for account {self.account_id}: {reason}")
+        raise HTTPException(status_code=403, detail=f"Risk limit {limit}: {reason}")
+
+    def _seed_failed(self, action: str):
+        err_str = log_error(
+            mt5.last_error(), f"{action} for the risk gate of {self.account_id}"
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Failed to check risk limits: {err_str}"
+        )
+
+
+_indexes: Dict[int, ExposureIndex] = {}
+
+
+def get_exposure(account_id: int) -> ExposureIndex:
+    if account_id not in _indexes:
+        _indexes[account_id] = ExposureIndex(account_id)
+    return _indexes[account_id]
+
+
+def reset_exposure(account_id: int):
+    _indexes.pop(account_id, None)
+
+
+def record_positions(account_id: int, trades: Iterable[Trade]):
+    """
+    Feeds a read of all the account's open positions to its index, if it has one
+    """
+    index = _indexes.get(account_id)
+    if index is not None:
+        index.sync_positions(trades)
+
+
+def record_account(account: dict):
+    """
+    Feeds an account_info read to the account's index, if it has one
+    """
+    index = _indexes.get(account["login"])
+    if index is not None:
+        index.update_account(account)
@@ -0,0 +1,188 @@
+import time
+import unittest
+
+from fastapi import HTTPException
+
+from mt5 import fake_mt5
+from mt5.lot_sizing import lot_sizer
+from mt5.risk_gate import ExposureIndex, RiskLimits
+from mt5.symbol_cache import symbol_cache
+
+ACCOUNT_ID = 1000000
+
+
+class ExposureIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        symbol_cache.invalidate(ACCOUNT_ID)
+        lot_sizer.reset(ACCOUNT_ID)
+
+    def index(self, **limits) -> ExposureIndex:
+        return ExposureIndex(ACCOUNT_ID, RiskLimits(**limits))
+
+    def check(self, index: ExposureIndex, symbol: str, volume: float):
+        info = symbol_cache.symbol_info(ACCOUNT_ID, symbol)
+        index.check(info, True, volume, info.ask)
+
+    def fill(self, index: ExposureIndex, position_id: int, symbol: str, volume: float):
+        info = symbol_cache.symbol_info(ACCOUNT_ID, symbol)
+        index.add_position(position_id, info, True, volume, info.ask)
+
+    def assert_rejected(self, limit: str, fn, *args):
+        with self.assertRaises(HTTPException) as e:
+            fn(*args)
+        self.assertEqual(403, e.exception.status_code)
+        self.assertIn(limit, e.exception.detail)
+
+    def test_disabled_limits_make_no_terminal_calls(self):
+        index = self.index()
+        with fake_mt5.patched(history_positions=0, open_positions=2) as terminal:
+            info = symbol_cache.symbol_info(ACCOUNT_ID, "EURUSD")
+            calls = sum(terminal.calls.values())
+
+            index.check(info, True, 100.0, info.ask)
+
+            self.assertEqual(calls, sum(terminal.calls.values()))
+        self.assertFalse(index.seeded)
+
+    def test_seeds_once_then_checks_from_memory(self):
+        index = self.index(max_positions=3)
+        with fake_mt5.patched(history_positions=0, open_positions=2) as terminal:
+            self.check(index, "EURUSD", 0.1)
+            self.assertEqual(2, len(index.positions))
+            calls = sum(terminal.calls.values())
+
+            self.fill(index, 1, "EURUSD", 0.1)
+            self.assert_rejected("max_positions", self.check, index, "EURUSD", 0.1)
+
+            self.assertEqual(calls, sum(terminal.calls.values()))
+
+    def test_max_symbol_lots_counts_both_directions(self):
+        index = self.index(max_symbol_lots=1.0)
+        with fake_mt5.patched(history_positions=0, open_positions=0):
+            self.check(index, "EURUSD", 1.0)
+            info = symbol_cache.symbol_info(ACCOUNT_ID, "EURUSD")
+            index.add_position(1, info, True, 0.3, info.ask)
+            index.add_position(2, info, False, 0.3, info.bid)
+
+            self.check(index, "EURUSD", 0.4)
+            self.check(index, "GBPUSD", 1.0)
+            self.assert_rejected("max_symbol_lots", self.check, index, "EURUSD", 0.41)
+
+            index.remove_position(2)
+            self.check(index, "EURUSD", 0.7)
+            self.assertEqual({("EURUSD", True): 0.3}, index.volumes)
+
+    def test_max_margin_percent(self):
+        index = self.index(max_margin_percent=10)
+        with fake_mt5.patched(history_positions=0, open_positions=0):
+            # A lot of EURUSD is ~1080 margin at 1:100, against 10000 equity
+            self.check(index, "EURUSD", 0.5)
+            self.assert_rejected("max_margin_percent", self.check, index, "EURUSD", 1.0)
+
+            self.fill(index, 1, "EURUSD", 0.5)
+            self.assert_rejected("max_margin_percent", self.check, index, "EURUSD", 0.5)
+
+    def test_margin_estimates_are_replaced_by_account_reads(self):
+        index = self.index(max_margin_percent=50)
+        with fake_mt5.patched(history_positions=0, open_positions=2) as terminal:
+            self.check(index, "EURUSD", 0.1)
+            margin = terminal.account_info().margin
+            self.assertAlmostEqual(margin, index.margin, delta=margin * 0.01)
+
+            self.fill(index, 1, "EURUSD", 1.0)
+            self.assertAlmostEqual(margin + 1080, index.margin, delta=margin * 0.01)
+
+            index.update_account({"balance": 9000.0, "margin": 100.0, "leverage": 100})
+            self.assertEqual(100.0, index.margin)
+            self.assertEqual(9000.0 + index.floating, index.equity)
+
+    def test_max_daily_loss_includes_floating_and_realized_losses(self):
+        index = self.index(max_daily_loss=100)
+        with fake_mt5.patched(history_positions=0, open_positions=0):
+            self.check(index, "EURUSD", 0.1)
+            trade = {
+                "position_id": 1,
+                "symbol": "EURUSD",
+                "is_long": True,
+                "total_volume": 0.1,
+                "open_order_price": 1.08,
+                "profit": -60.0,
+            }
+            index.sync_positions([trade])
+            self.check(index, "EURUSD", 0.1)
+
+            index.sync_positions([{**trade, "profit": -100.0}])
+            self.assert_rejected("max_daily_loss", self.check, index, "EURUSD", 0.1)
+
+            # Closed, so the loss is now realized
+            index.sync_positions([])
+            self.assertEqual({}, index.positions)
+            self.assertEqual(-100.0, index.realized_today)
+            self.assert_rejected("max_daily_loss", self.check, index, "EURUSD", 0.1)
+
+    def test_seed_reads_todays_realized_profit(self):
+        index = self.index(max_daily_loss=10**6)
+        with fake_mt5.patched(history_positions=20, open_positions=1) as terminal:
+            position = next(iter(terminal.positions.values()))
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": position.symbol,
+                    "volume": position.volume,
+                    "type": 1 - position.type,
+                    "position": position.ticket,
+                }
+            )
+            today = int(time.time()) // 86400 * 86400
+            expected = sum(
+                d.profit + d.commission + d.swap
+                for d in terminal.deals
+                if d.time >= today and d.entry == fake_mt5.DEAL_ENTRY_OUT
+            )
+            # A withdrawal, which is not a realized loss
+            terminal.deals.append(
+                terminal.deals[-1]._replace(
+                    ticket=terminal.deals[-1].ticket + 1,
+                    order=0,
+                    position_id=0,
+                    type=fake_mt5.DEAL_TYPE_BALANCE,
+                    entry=fake_mt5.DEAL_ENTRY_IN,
+                    volume=0.0,
+                    commission=0.0,
+                    profit=-5000.0,
+                )
+            )
+
+            self.check(index, "EURUSD", 0.1)
+
+        self.assertEqual({}, index.positions)
+        self.assertNotEqual(0, expected)
+        self.assertAlmostEqual(expected, index.realized_today)
+
+    def test_days_are_in_trade_server_time(self):
+        index = self.index(max_daily_loss=100)
+        now = time.time()
+
+        index.observe_server_time(int(now) + 3 * 3600 - 20)
+        self.assertEqual(3 * 3600, index.server_offset)
+        self.assertEqual((int(now) + 3 * 3600) // 86400, index.server_day())
+
+        # The last tick of a market closed for days says nothing about the offset
+        index.observe_server_time(int(now) - 3 * 86400)
+        self.assertEqual(3 * 3600, index.server_offset)
+
+    def test_stale_index_is_re_seeded(self):
+        index = self.index(max_positions=10)
+        index.max_age = 0.05
+        with fake_mt5.patched(history_positions=0, open_positions=1) as terminal:
+            self.check(index, "EURUSD", 0.1)
+            self.check(index, "EURUSD", 0.1)
+            self.assertEqual(1, terminal.calls["positions_get"])
+
+            time.sleep(0.06)
+            self.check(index, "EURUSD", 0.1)
+            self.assertEqual(2, terminal.calls["positions_get"])
+
+
+if __name__ == "__main__":
+    unittest.main()
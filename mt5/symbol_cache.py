@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Set, Tuple
+
+import MetaTrader5 as mt5
+
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Seconds static symbol properties (digits, contract size, volume step...) are cached for
+INFO_TTL = float(os.getenv("SYMBOL_INFO_TTL", "3600"))
+# Seconds a tick is considered fresh enough to price an order with
+TICK_TTL = float(os.getenv("SYMBOL_TICK_TTL", "0.2"))
+# Maximum (account, symbol) entries per cache before the least recently used is evicted
+MAX_ENTRIES = int(os.getenv("SYMBOL_CACHE_SIZE", "512"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A size bounded LRU cache whose entries expire after a fixed TTL, with hit/miss counters
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+class SymbolCache:
+    """
+    Caches symbol metadata and ticks per (account, symbol), so the order path doesn't look them up on every order.
+
+    Terminal-side state, only used through the account's executor (see mt5.executor.TerminalExecutor).
+    """
+
+    def __init__(
+        self,
+        info_ttl: float = INFO_TTL,
+        tick_ttl: float = TICK_TTL,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        self.info = TTLCache(info_ttl, max_entries)
+        self.ticks = TTLCache(tick_ttl, max_entries)
+        # Symbols known to be selected in MarketWatch, so symbol_select isn't re-run
+        self._selected: Set[Tuple[int, str]] = set()
+
+    def symbol_info(self, account_id: int, symbol: str):
+        """
+        :return: The MT5 SymbolInfo, or None if the symbol is invalid (which is not cached)
+        """
+        key = (account_id, symbol)
+        info = self.info.get(key)
+        if info is None:
+            info = mt5.symbol_info(symbol)
+            if info is not None:
+                self.info.put(key, info)
+                if info.visible:
+                    self._selected.add(key)
+        return info
+
+    def symbol_info_tick(self, account_id: int, symbol: str):
+        """
+        :return: The MT5 Tick, or None if the symbol is invalid (which is not cached)
+        """
+        key = (account_id, symbol)
+        tick = self.ticks.get(key)
+        if tick is None:
+            tick = mt5.symbol_info_tick(symbol)
+            if tick is not None:
+                self.ticks.put(key, tick)
+        return tick
+
+    def ensure_selected(self, account_id: int, symbol: str) -> bool:
+        """
+        Selects the symbol in MarketWatch, unless it is already known to be selected
+        """
+        key = (account_id, symbol)
+        if key in self._selected:
+            return True
+        log.debug(f"{symbol} is not visible, trying to switch on")
+        if not mt5.symbol_select(symbol, True):
+            self.info.invalidate(key)
+            return False
+        self._selected.add(key)
+        return True
+
+    def invalidate(self, account_id: int, symbol: Optional[str] = None):
+        """
+        Drops cached data for one of the account's symbols, or all of them
+        """
+        if symbol is not None:
+            self.info.invalidate((account_id, symbol))
+            self.ticks.invalidate((account_id, symbol))
+            self._selected.discard((account_id, symbol))
+            return
+        self.info.invalidate_where(lambda key: key[0] == account_id)
+        self.ticks.invalidate_where(lambda key: key[0] == account_id)
+        self._selected = {key for key in self._selected if key[0] != account_id}
+
+    def invalidate_tick(self, account_id: int, symbol: str):
+        """
+        Called after writes (e.g. order_send) so the next order is priced from a new tick
+        """
+        self.ticks.invalidate((account_id, symbol))
+
+    def stats(self) -> dict:
+        return {"info": self.info.stats(), "tick": self.ticks.stats()}
+
+
+symbol_cache = SymbolCache()
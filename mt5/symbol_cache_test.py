@@ -0,0 +1,89 @@
+import time
+import unittest
+
+from mt5 import fake_mt5
+from mt5.symbol_cache import SymbolCache, TTLCache
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    def test_expiry(self):
+        cache = TTLCache(ttl=0.05, max_entries=10)
+        cache.put("a", 1)
+
+        self.assertEqual(1, cache.get("a"))
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(ttl=60, max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertEqual(1, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(1, cache.evictions)
+
+
+class SymbolCacheTestCase(unittest.TestCase):
+    def test_static_info_is_cached(self):
+        cache = SymbolCache(info_ttl=60, tick_ttl=60)
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            for _ in range(5):
+                info = cache.symbol_info(1, "GBPUSD")
+
+        self.assertEqual(5, info.digits)
+        self.assertEqual(1, terminal.calls["symbol_info"])
+        self.assertEqual(4, cache.stats()["info"]["hits"])
+
+    def test_ticks_expire_and_are_invalidated(self):
+        cache = SymbolCache(info_ttl=60, tick_ttl=0.05)
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            cache.symbol_info_tick(1, "EURUSD")
+            cache.symbol_info_tick(1, "EURUSD")
+            self.assertEqual(1, terminal.calls["symbol_info_tick"])
+
+            time.sleep(0.06)
+            cache.symbol_info_tick(1, "EURUSD")
+            self.assertEqual(2, terminal.calls["symbol_info_tick"])
+
+            cache.invalidate_tick(1, "EURUSD")
+            cache.symbol_info_tick(1, "EURUSD")
+            self.assertEqual(3, terminal.calls["symbol_info_tick"])
+
+    def test_selection_is_remembered(self):
+        cache = SymbolCache()
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            self.assertTrue(cache.ensure_selected(1, "XAUUSD"))
+            self.assertTrue(cache.ensure_selected(1, "XAUUSD"))
+            self.assertEqual(1, terminal.calls["symbol_select"])
+
+            cache.symbol_info(1, "EURUSD")  # already visible
+            self.assertTrue(cache.ensure_selected(1, "EURUSD"))
+            self.assertEqual(1, terminal.calls["symbol_select"])
+
+    def test_invalid_symbols_are_not_cached(self):
+        cache = SymbolCache()
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            self.assertIsNone(cache.symbol_info(1, "NOPE"))
+            self.assertIsNone(cache.symbol_info(1, "NOPE"))
+
+        self.assertEqual(2, terminal.calls["symbol_info"])
+
+    def test_invalidate_account(self):
+        cache = SymbolCache()
+        with fake_mt5.patched(history_positions=0, open_positions=0) as terminal:
+            cache.symbol_info(1, "EURUSD")
+            cache.symbol_info(2, "EURUSD")
+            cache.invalidate(1)
+            cache.symbol_info(1, "EURUSD")
+            cache.symbol_info(2, "EURUSD")
+
+        self.assertEqual(3, terminal.calls["symbol_info"])
+
+
+if __name__ == "__main__":
+    unittest.main()
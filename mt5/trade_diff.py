@@ -0,0 +1,124 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from internal_types import Trade
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Fields of an open position that can change while it is open, and produce a MODIFY event
+WATCHED_FIELDS = ("stop_loss", "take_profit", "total_volume")
+
+
+def _watched(trade: Trade) -> Tuple:
+    return tuple(trade.get(field) for field in WATCHED_FIELDS)
+
+
+class TradeDiffEngine:
+    """
+    Turns successive snapshots of an account's trades into OPEN, MODIFY and CLOSE events.
+
+    Open positions are indexed by position id with the values of their watched fields, so each trade in a snapshot is
+    a single lookup, and only positions whose open state or watched fields changed produce events.
+    """
+
+    def __init__(self):
+        self.open_positions: Dict[int, Tuple] = {}
+        self.seeded = False
+
+    def reset(self):
+        self.open_positions = {}
+        self.seeded = False
+
+    def diff(self, trades: Iterable[Trade]) -> List[dict]:
+        """
+        :param trades: The account's current trades. Must include every open position, and may include closed ones.
+        :return: Events for the changes since the previous snapshot. The first snapshot only seeds the index.
+        """
+        if not self.seeded:
+            self.open_positions = {
+                trade["position_id"]: _watched(trade)
+                for trade in trades
+                if trade.get("is_open")
+            }
+            self.seeded = True
+            return []
+
+        events = []
+        seen = set()
+        for trade in trades:
+            event = self.update(trade)
+            if trade.get("is_open"):
+                seen.add(trade["position_id"])
+            if event is not None:
+                events.append(event)
+
+        if len(seen) < len(self.open_positions):
+            # Positions that dropped out of the snapshot without their close being seen
+            for position_id in [p for p in self.open_positions if p not in seen]:
+                log.warning(
+                    "Open position %s is no longer reported, dropping it", position_id
+                )
+                del self.open_positions[position_id]
+
+        return events
+
+    def update(self, trade: Trade) -> Optional[dict]:
+        """
+        Applies a single trade to the index, returning its event if it changed
+        """
+        position_id = trade["position_id"]
+        previous = self.open_positions.get(position_id)
+
+        if not trade.get("is_open"):
+            if previous is None:
+                return None
+            del self.open_positions[position_id]
+            return close_event(trade)
+
+        current = _watched(trade)
+        if previous == current:
+            return None
+        self.open_positions[position_id] = current
+        if previous is None:
+            return open_event(trade)
+        return modify_event(trade, previous)
+
+
+def open_event(trade: Trade) -> dict:
+    return {
+        "type": "OPEN",
+        "position_id": trade.get("position_id"),
+        "symbol": trade.get("symbol"),
+        "is_long": trade.get("is_long"),
+        "total_volume": trade.get("total_volume"),
+        "open_order_price": trade.get("open_order_price"),
+        "open_order_time": trade.get("open_order_time"),
+        "stop_loss": trade.get("stop_loss"),
+        "take_profit": trade.get("take_profit"),
+    }
+
+
+def modify_event(trade: Trade, previous: Tuple) -> dict:
+    event = {
+        "type": "MODIFY",
+        "position_id": trade.get("position_id"),
+        "stop_loss": trade.get("stop_loss"),
+        "take_profit": trade.get("take_profit"),
+        "total_volume": trade.get("total_volume"),
+        # Values of the fields that changed, before the change
+        "previous": {},
+    }
+    for field, value in zip(WATCHED_FIELDS, previous):
+        if trade.get(field) != value:
+            event["previous"][field] = value
+    return event
+
+
+def close_event(trade: Trade) -> dict:
+    return {
+        "type": "CLOSE",
+        "position_id": trade.get("position_id"),
+        "profit": trade.get("profit"),
+        "close_order_price": trade.get("close_order_price"),
+        "close_order_time": trade.get("close_order_time"),
+    }
@@ -0,0 +1,60 @@
+import unittest
+
+from mt5.trade_diff import TradeDiffEngine
+
+
+def trade(position_id, is_open, sl=1.0, tp=2.0, volume=0.1, profit=None):
+    return {
+        "position_id": position_id,
+        "is_open": is_open,
+        "stop_loss": sl,
+        "take_profit": tp,
+        "total_volume": volume,
+        "profit": profit,
+    }
+
+
+class TradeDiffEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = TradeDiffEngine()
+        self.engine.diff([trade(1, True), trade(2, True), trade(3, False, profit=1)])
+
+    def test_first_snapshot_only_seeds(self):
+        self.assertEqual({1, 2}, set(self.engine.open_positions))
+
+    def test_unchanged_snapshot_has_no_events(self):
+        self.assertEqual(
+            [],
+            self.engine.diff([trade(1, True), trade(2, True), trade(3, False)]),
+        )
+
+    def test_open_modify_and_close(self):
+        events = self.engine.diff(
+            [
+                trade(1, False, profit=-5.0),
+                trade(2, True, sl=1.5, volume=0.05),
+                trade(3, False, profit=1),
+                trade(4, True),
+            ]
+        )
+
+        self.assertEqual(
+            [("CLOSE", 1), ("MODIFY", 2), ("OPEN", 4)],
+            [(e["type"], e["position_id"]) for e in events],
+        )
+        self.assertEqual(-5.0, events[0]["profit"])
+        self.assertEqual({"stop_loss": 1.0, "total_volume": 0.1}, events[1]["previous"])
+        self.assertEqual({2, 4}, set(self.engine.open_positions))
+
+    def test_close_is_only_emitted_once(self):
+        self.engine.diff([trade(1, False), trade(2, True)])
+
+        self.assertEqual([], self.engine.diff([trade(1, False), trade(2, True)]))
+
+    def test_missing_positions_are_dropped(self):
+        self.assertEqual([], self.engine.diff([trade(2, True)]))
+        self.assertEqual({2}, set(self.engine.open_positions))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from internal_types import Trade
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+def position_profit(position: dict) -> float:
+    """
+    An open position's profit as reported on its trade, net of swap and commission
+    """
+    return round(
+        position.get("profit", 0)
+        + position.get("swap", 0)
+        + position.get("commission", 0),
+        2,
+    )
+
+
+class StatsBucket:
+    """
+    Running totals of the closed trades of a symbol, a day, or the whole account
+    """
+
+    __slots__ = ("trades", "wins", "losses", "gross_profit", "gross_loss")
+
+    def __init__(self, trades=0, wins=0, losses=0, gross_profit=0.0, gross_loss=0.0):
+        self.trades = trades
+        self.wins = wins
+        self.losses = losses
+        self.gross_profit = gross_profit
+        # Negative
+        self.gross_loss = gross_loss
+
+    def add(self, profit: float):
+        self.trades += 1
+        if profit > 0:
+            self.wins += 1
+            self.gross_profit += profit
+        elif profit < 0:
+            self.losses += 1
+            self.gross_loss += profit
+
+    def to_dict(self) -> dict:
+        net = self.gross_profit + self.gross_loss
+        return {
+            "trades": self.trades,
+            "wins": self.wins,
+            "losses": self.losses,
+            "win_rate": self.wins / self.trades if self.trades else 0.0,
+            "net_profit": round(net, 2),
+            "gross_profit": round(self.gross_profit, 2),
+            "gross_loss": round(self.gross_loss, 2),
+            "profit_factor": (
+                round(self.gross_profit / -self.gross_loss, 4)
+                if self.gross_loss
+                else None
+            ),
+            "average_win": (
+                round(self.gross_profit / self.wins, 2) if self.wins else 0.0
+            ),
+            "average_loss": (
+                round(self.gross_loss / self.losses, 2) if self.losses else 0.0
+            ),
+            # Average profit per trade
+            "expectancy": round(net / self.trades, 2) if self.trades else 0.0,
+        }
+
+
+class AccountStats:
+    """
+    Performance aggregates of an account's closed trades: totals, equity peak and max drawdown, and rollups by symbol
+    and by day. Days are in trade server time, as MT5 deal and order times are.
+
+    Trades are added incrementally as syncs close them, in O(1) each. Reading the aggregates costs O(symbols + days),
+    whatever the length of the history. A trade closed before the latest one already added (e.g. its close was only
+    synced later) invalidates the running equity curve, which is then recomputed, vectorised, on the next read.
+    """
+
+    def __init__(self, account_id: int):
+        self.account_id = account_id
+        # Every trade added, as (close time, position id, symbol, profit), for rebuilds
+        self._closed: Dict[int, Tuple[int, int, str, float]] = {}
+        self._rebuild_needed = False
+        self._reset_aggregates()
+
+    def _reset_aggregates(self):
+        self.total = StatsBucket()
+        self.by_symbol: Dict[str, StatsBucket] = {}
+        self.by_day: Dict[int, StatsBucket] = {}
+        # Cumulative profit at the end of each day
+        self.day_equity: Dict[int, float] = {}
+        self.equity = 0.0
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+        self._last_key: Optional[Tuple[int, int]] = None
+
+    def add_trades(self, trades: Iterable[Trade]) -> int:
+        """
+        Adds any closed trades that were not added yet. Open trades, and closed ones without a profit, are skipped.
+
+        :return: The number of trades added
+        """
+        added = 0
+        for trade in trades:
+            if trade.get("is_open") or trade.get("profit") is None:
+                continue
+            position_id = trade["position_id"]
+            if position_id in self._closed:
+                continue
+            record = (
+                trade["close_order_time"],
+                position_id,
+                trade["symbol"],
+                trade["profit"],
+            )
+            self._closed[position_id] = record
+            added += 1
+            if self._rebuild_needed:
+                continue
+            if self._last_key is not None and record[:2] < self._last_key:
+                self._rebuild_needed = True
+                continue
+            self._apply(*record)
+        return added
+
+    def _apply(self, close_time: int, position_id: int, symbol: str, profit: float):
+        day = close_time // SECONDS_PER_DAY
+        self.total.add(profit)
+        self.by_symbol.setdefault(symbol, StatsBucket()).add(profit)
+        self.by_day.setdefault(day, StatsBucket()).add(profit)
+        self.equity += profit
+        self.day_equity[day] = self.equity
+        if self.equity > self.peak:
+            self.peak = self.equity
+        elif self.peak - self.equity > self.max_drawdown:
+            self.max_drawdown = self.peak - self.equity
+        self._last_key = (close_time, position_id)
+
+    def rebuild(self):
+        """
+        Recomputes every aggregate from the added trades in close order, with numpy
+        """
+        self._reset_aggregates()
+        self._rebuild_needed = False
+        if not self._closed:
+            return
+
+        records = sorted(self._closed.values())
+        close_times = np.fromiter((r[0] for r in records), np.int64, len(records))
+        profits = np.fromiter((r[3] for r in records), np.float64, len(records))
+        symbols = [r[2] for r in records]
+
+        equity = np.cumsum(profits)
+        # The account starts flat, so the peak is at least 0
+        peaks = np.maximum.accumulate(np.maximum(equity, 0.0))
+        self.equity = float(equity[-1])
+        self.peak = float(peaks[-1])
+        self.max_drawdown = float(np.max(peaks - equity))
+
+        self.total = _rollup(profits, np.zeros(len(records), np.int64), 1)[0]
+        symbol_names, symbol_idx = np.unique(symbols, return_inverse=True)
+        for name, bucket in zip(
+            symbol_names.tolist(), _rollup(profits, symbol_idx, len(symbol_names))
+        ):
+            self.by_symbol[name] = bucket
+
+        days = close_times // SECONDS_PER_DAY
+        day_values, day_idx = np.unique(days, return_inverse=True)
+        for day, bucket in zip(
+            day_values.tolist(), _rollup(profits, day_idx, len(day_values))
+        ):
+            self.by_day[day] = bucket
+        # The equity after the last trade of each day
+        last_of_day = np.r_[np.flatnonzero(np.diff(days)), len(days) - 1]
+        self.day_equity = dict(zip(day_values.tolist(), equity[last_of_day].tolist()))
+        self._last_key = records[-1][:2]
+
+    def summary(self) -> dict:
+        if self._rebuild_needed:
+            self.rebuild()
+        return {
+            **self.total.to_dict(),
+            "equity": round(self.equity, 2),
+            "peak_equity": round(self.peak, 2),
+            "max_drawdown": round(self.max_drawdown, 2),
+            "by_symbol": {
+                symbol: bucket.to_dict()
+                for symbol, bucket in sorted(self.by_symbol.items())
+            },
+            "by_day": {
+                _day_str(day): {
+                    **bucket.to_dict(),
+                    "equity": round(self.day_equity[day], 2),
+                }
+                for day, bucket in sorted(self.by_day.items())
+            },
+        }
+
+
+def _rollup(profits: np.ndarray, groups: np.ndarray, n: int) -> List[StatsBucket]:
+    wins = profits > 0
+    losses = profits < 0
+    counts = np.bincount(groups, minlength=n)
+    win_counts = np.bincount(groups, weights=wins, minlength=n)
+    loss_counts = np.bincount(groups, weights=losses, minlength=n)
+    gross_profit = np.bincount(groups, weights=np.where(wins, profits, 0), minlength=n)
+    gross_loss = np.bincount(groups, weights=np.where(losses, profits, 0), minlength=n)
+    return [
+        StatsBucket(*values)
+        for values in zip(
+            counts.tolist(),
+            win_counts.astype(np.int64).tolist(),
+            loss_counts.astype(np.int64).tolist(),
+            gross_profit.tolist(),
+            gross_loss.tolist(),
+        )
+    ]
+
+
+def _day_str(day: int) -> str:
+    # Timestamps are server time already, so formatting them as UTC keeps the server's date
+    return datetime.fromtimestamp(day * SECONDS_PER_DAY, tz=timezone.utc).strftime(
+        "%Y-%m-%d"
+    )
+
+
+_stats: Dict[int, AccountStats] = {}
+
+
+def get_account_stats(account_id: int) -> AccountStats:
+    if account_id not in _stats:
+        _stats[account_id] = AccountStats(account_id)
+    return _stats[account_id]
+
+
+def reset_account_stats(account_id: int):
+    _stats.pop(account_id, None)
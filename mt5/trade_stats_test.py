@@ -0,0 +1,79 @@
+import random
+import unittest
+
+from mt5.trade_stats import SECONDS_PER_DAY, AccountStats
+
+DAY = 19876 * SECONDS_PER_DAY
+
+
+def closed_trade(position_id, close_time, profit, symbol="EURUSD"):
+    return {
+        "position_id": position_id,
+        "symbol": symbol,
+        "close_order_time": close_time,
+        "profit": profit,
+        "is_open": False,
+    }
+
+
+class AccountStatsTestCase(unittest.TestCase):
+    def test_totals_and_drawdown(self):
+        stats = AccountStats(1)
+        stats.add_trades(
+            [
+                closed_trade(1, DAY + 10, 100.0),
+                closed_trade(2, DAY + 20, -150.0, "US100.cash"),
+                closed_trade(3, DAY + SECONDS_PER_DAY, 30.0),
+                {**closed_trade(4, None, None), "is_open": True},
+            ]
+        )
+
+        summary = stats.summary()
+
+        self.assertEqual(
+            (3, 2, 1), (summary["trades"], summary["wins"], summary["losses"])
+        )
+        self.assertEqual(-20.0, summary["net_profit"])
+        self.assertEqual(round(130 / 150, 4), summary["profit_factor"])
+        self.assertEqual(100.0, summary["peak_equity"])
+        self.assertEqual(150.0, summary["max_drawdown"])
+        self.assertEqual(65.0, summary["by_symbol"]["EURUSD"]["expectancy"])
+        day = summary["by_day"]["2024-06-02"]
+        self.assertEqual(
+            (2, -50.0, -50.0), (day["trades"], day["net_profit"], day["equity"])
+        )
+        self.assertEqual(-20.0, summary["by_day"]["2024-06-03"]["equity"])
+
+    def test_trades_are_only_added_once(self):
+        stats = AccountStats(1)
+        trades = [closed_trade(1, DAY, 10.0)]
+
+        self.assertEqual(1, stats.add_trades(trades))
+        self.assertEqual(0, stats.add_trades(trades))
+        self.assertEqual(1, stats.summary()["trades"])
+
+    def test_out_of_order_trades_match_in_order(self):
+        rng = random.Random(7)
+        trades = [
+            closed_trade(
+                i,
+                DAY + rng.randrange(30 * SECONDS_PER_DAY),
+                round(rng.uniform(-100, 100), 2),
+                rng.choice(["EURUSD", "GBPUSD", "US100.cash"]),
+            )
+            for i in range(500)
+        ]
+        in_order = AccountStats(1)
+        in_order.add_trades(
+            sorted(trades, key=lambda t: (t["close_order_time"], t["position_id"]))
+        )
+        shuffled = AccountStats(2)
+        # Incrementally, then out of order
+        shuffled.add_trades(trades[:1])
+        shuffled.add_trades(trades[1:])
+
+        self.assertEqual(in_order.summary(), shuffled.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from internal_types import Trade
+from utils.logging import get_logger
+from utils.serialization import dumps, loads
+
+log = get_logger(__name__)
+
+# SQLite file to persist each account's synced orders, deals and trades to, so restarts only sync from the stored
+# watermark. Empty to keep history in memory only.
+TRADE_STORE_PATH = os.getenv("TRADE_STORE_PATH")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    account_id INTEGER NOT NULL,
+    ticket INTEGER NOT NULL,
+    position_id INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account_id, ticket)
+);
+CREATE INDEX IF NOT EXISTS orders_position ON orders (account_id, position_id);
+CREATE INDEX IF NOT EXISTS orders_time ON orders (account_id, time);
+CREATE TABLE IF NOT EXISTS deals (
+    account_id INTEGER NOT NULL,
+    ticket INTEGER NOT NULL,
+    position_id INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account_id, ticket)
+);
+CREATE INDEX IF NOT EXISTS deals_position ON deals (account_id, position_id);
+CREATE INDEX IF NOT EXISTS deals_time ON deals (account_id, time);
+CREATE TABLE IF NOT EXISTS trades (
+    account_id INTEGER NOT NULL,
+    position_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    close_time INTEGER,
+    is_open INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account_id, position_id)
+);
+CREATE INDEX IF NOT EXISTS trades_symbol ON trades (account_id, symbol);
+CREATE INDEX IF NOT EXISTS trades_close_time ON trades (account_id, close_time);
+CREATE TABLE IF NOT EXISTS sync_state (
+    account_id INTEGER PRIMARY KEY,
+    watermark INTEGER,
+    last_ticket INTEGER
+);
+"""
+
+
+class StoredHistory:
+    def __init__(
+        self,
+        orders: List[dict],
+        deals: List[dict],
+        trades: List[Trade],
+        watermark: Optional[int],
+        last_ticket: Optional[int],
+    ):
+        self.orders = orders
+        self.deals = deals
+        self.trades = trades
+        self.watermark = watermark
+        self.last_ticket = last_ticket
+
+
+class TradeStore:
+    """
+    Synced history of any number of accounts in a SQLite database, in WAL mode so reads don't block the writer and
+    several worker processes can share the file.
+
+    Orders and deals are append only (de-duplicated by ticket), and trades are replaced as they are rebuilt.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Durable across process crashes, only a power loss can lose the last commits, which are re-synced anyway
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def save(
+        self,
+        account_id: int,
+        orders: Iterable[dict],
+        deals: Iterable[dict],
+        trades: Iterable[Trade],
+        watermark: Optional[int],
+        last_ticket: Optional[int],
+    ):
+        """
+        Stores a sync's new orders, deals and rebuilt trades, and the watermark to sync on from, in one transaction
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        account_id,
+                        o["ticket"],
+                        o["position_id"],
+                        o["time_done"],
+                        dumps(o),
+                    )
+                    for o in orders
+                ),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO deals VALUES (?, ?, ?, ?, ?)",
+                (
+                    (account_id, d["ticket"], d["position_id"], d["time"], dumps(d))
+                    for d in deals
+                ),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO trades VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        account_id,
+                        t["position_id"],
+                        t["symbol"],
+                        t.get("close_order_time"),
+                        int(t["is_open"]),
+                        dumps(t),
+                    )
+                    for t in trades
+                ),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                (account_id, watermark, last_ticket),
+            )
+
+    def load(self, account_id: int, overlap: int) -> Optional[StoredHistory]:
+        """
+        Loads every trade, but only the orders and deals a sync can still need: those of open positions, which are
+        rebuilt on every sync, and those within `overlap` of the watermark, which the next sync re-reads and must
+        recognise.
+
+        :param overlap: Seconds before the watermark that syncs re-read
+        :return: The account's stored history, or None if it was never synced
+        """
+        with self._lock:
+            state = self._conn.execute(
+                "SELECT watermark, last_ticket FROM sync_state WHERE account_id = ?",
+                (account_id,),
+            ).fetchone()
+            if state is None:
+                return None
+            trades = [
+                loads(data)
+                for (data,) in self._conn.execute(
+                    "SELECT data FROM trades WHERE account_id = ? ORDER BY rowid",
+                    (account_id,),
+                )
+            ]
+            rows = {}
+            for table in ("orders", "deals"):
+                rows[table] = [
+                    loads(data)
+                    for (data,) in self._conn.execute(
+                        f"""
+                        SELECT data FROM {table} WHERE account_id = ? AND (
+                            time >= ? OR position_id IN (
+                                SELECT position_id FROM trades WHERE account_id = ? AND is_open
+                            )
+                        ) ORDER BY rowid
+                        """,
+                        (account_id, (state[0] or 0) - overlap, account_id),
+                    )
+                ]
+        return StoredHistory(rows["orders"], rows["deals"], trades, state[0], state[1])
+
+    def load_positions(
+        self, account_id: int, position_ids: List[int]
+    ) -> Tuple[List[dict], List[dict]]:
+        """
+        Loads all the orders and deals of the positions, for those `load` leaves out that must be rebuilt
+
+        :return: The orders and the deals
+        """
+        placeholders = ", ".join("?" * len(position_ids))
+        rows = {}
+        with self._lock:
+            for table in ("orders", "deals"):
+                rows[table] = [
+                    loads(data)
+                    for (data,) in self._conn.execute(
+                        f"""
+                        SELECT data FROM {table} WHERE account_id = ? AND position_id IN ({placeholders})
+                        ORDER BY rowid
+                        """,
+                        (account_id, *position_ids),
+                    )
+                ]
+        return rows["orders"], rows["deals"]
+
+    def clear(self, account_id: int):
+        with self._lock, self._conn:
+            for table in ("orders", "deals", "trades", "sync_state"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE account_id = ?", (account_id,)
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_stores: Dict[str, TradeStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_trade_store() -> Optional[TradeStore]:
+    """
+    :return: The store at TRADE_STORE_PATH, or None when persistence is disabled
+    """
+    if not TRADE_STORE_PATH:
+        return None
+    with _stores_lock:
+        if TRADE_STORE_PATH not in _stores:
+            log.info(f"Persisting trade history to {TRADE_STORE_PATH}")
+            _stores[TRADE_STORE_PATH] = TradeStore(TRADE_STORE_PATH)
+        return _stores[TRADE_STORE_PATH]
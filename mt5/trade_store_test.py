@@ -0,0 +1,154 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from mt5 import fake_mt5
+from mt5.history_store import (
+    HISTORY_START,
+    get_account_history,
+    reset_account_history,
+)
+from mt5.mt5_utils import get_trades_for_account, load_stored_history
+from mt5.trade_store import TradeStore, get_trade_store
+
+ACCOUNT_ID = 1000000
+
+
+class TradeStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "trades.sqlite3")
+        self.store = TradeStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_save_and_load(self):
+        trade = {"position_id": 1, "symbol": "EURUSD", "is_open": False}
+        order = {"ticket": 10, "position_id": 1, "time_done": 150}
+        self.store.save(ACCOUNT_ID, [order], [], [trade], 100, 10)
+        # Re-saving overlapping orders and a rebuilt trade does not duplicate them
+        self.store.save(ACCOUNT_ID, [order], [], [{**trade, "profit": 1.0}], 200, 10)
+
+        stored = self.store.load(ACCOUNT_ID, overlap=50)
+
+        self.assertEqual([order], stored.orders)
+        # Orders of closed positions from before the sync overlap are not needed
+        self.assertEqual([], self.store.load(ACCOUNT_ID, overlap=10).orders)
+        self.assertEqual([{**trade, "profit": 1.0}], stored.trades)
+        self.assertEqual((200, 10), (stored.watermark, stored.last_ticket))
+        self.assertIsNone(self.store.load(ACCOUNT_ID + 1, overlap=0))
+
+    def test_restart_only_syncs_from_the_watermark(self):
+        with fake_mt5.patched(
+            history_positions=30, open_positions=2, login=ACCOUNT_ID
+        ) as terminal, patch("mt5.trade_store.TRADE_STORE_PATH", self.path):
+            reset_account_history(ACCOUNT_ID)
+            expected = get_trades_for_account(ACCOUNT_ID)
+
+            # A restart, during which a position was closed
+            reset_account_history(ACCOUNT_ID)
+            ticket, position = next(iter(terminal.positions.items()))
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": position.symbol,
+                    "volume": position.volume,
+                    "type": 1 - position.type,
+                    "position": ticket,
+                }
+            )
+            self.assertTrue(load_stored_history(ACCOUNT_ID))
+            with patch.object(
+                fake_mt5, "history_orders_get", wraps=fake_mt5.history_orders_get
+            ) as history_orders_get:
+                trades = get_trades_for_account(ACCOUNT_ID)
+
+        self.assertGreater(history_orders_get.call_args[0][0], HISTORY_START)
+        self.assertEqual(len(expected), len(trades))
+        closed = next(t for t in trades if t["position_id"] == ticket)
+        self.assertFalse(closed["is_open"])
+        self.assertIsNotNone(closed["profit"])
+        self.assertNotIn(ticket, get_account_history(ACCOUNT_ID).open_positions)
+
+    def test_open_position_stored_as_closed_is_replaced(self):
+        with fake_mt5.patched(
+            history_positions=10, open_positions=0, login=ACCOUNT_ID
+        ), patch("mt5.trade_store.TRADE_STORE_PATH", self.path):
+            reset_account_history(ACCOUNT_ID)
+            tick = fake_mt5.symbol_info_tick("EURUSD")
+            ticket = fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": "EURUSD",
+                    "volume": 0.1,
+                    "type": fake_mt5.ORDER_TYPE_BUY,
+                    "price": tick.ask,
+                }
+            ).order
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": "EURUSD",
+                    "volume": 0.05,
+                    "type": fake_mt5.ORDER_TYPE_SELL,
+                    "position": ticket,
+                }
+            )
+            get_trades_for_account(ACCOUNT_ID)
+            # As partially closed positions were stored before they were recognised
+            stored = self.store.load(ACCOUNT_ID, overlap=0)
+            trade = next(t for t in stored.trades if t["position_id"] == ticket)
+            self.store.save(
+                ACCOUNT_ID,
+                [],
+                [],
+                [{**trade, "is_open": False}],
+                stored.watermark,
+                stored.last_ticket,
+            )
+
+            reset_account_history(ACCOUNT_ID)
+            self.assertTrue(load_stored_history(ACCOUNT_ID))
+            trades = get_trades_for_account(ACCOUNT_ID)
+
+        self.assertTrue(
+            next(t for t in trades if t["position_id"] == ticket)["is_open"]
+        )
+        stored = self.store.load(ACCOUNT_ID, overlap=0)
+        replaced = next(t for t in stored.trades if t["position_id"] == ticket)
+        self.assertTrue(replaced["is_open"])
+        self.assertEqual(0.05, replaced["total_volume"])
+
+    def test_syncs_only_write_what_changed(self):
+        with fake_mt5.patched(
+            history_positions=10, open_positions=2, login=ACCOUNT_ID
+        ) as terminal, patch("mt5.trade_store.TRADE_STORE_PATH", self.path):
+            reset_account_history(ACCOUNT_ID)
+            get_trades_for_account(ACCOUNT_ID)
+
+            with patch.object(get_trade_store(), "save") as save:
+                get_trades_for_account(ACCOUNT_ID)
+                save.assert_not_called()
+
+                ticket, position = next(iter(terminal.positions.items()))
+                fake_mt5.order_send(
+                    {
+                        "action": fake_mt5.TRADE_ACTION_DEAL,
+                        "symbol": position.symbol,
+                        "volume": position.volume,
+                        "type": 1 - position.type,
+                        "position": ticket,
+                    }
+                )
+                get_trades_for_account(ACCOUNT_ID)
+
+        trades = save.call_args[0][3]
+        self.assertEqual([ticket], [t["position_id"] for t in trades])
+        self.assertFalse(trades[0]["is_open"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,302 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+from internal_types import Trade, TradesList
+from mt5.event_log import AccountEventLog, get_event_log
+from mt5.executor import get_terminal
+from mt5.mt5_utils import (
+    build_open_trade_from_position_id,
+    get_open_positions_for_account,
+    get_trades_for_account,
+)
+from mt5.trade_diff import TradeDiffEngine
+from utils.logging import get_logger
+from utils.metrics import stream_events_total, stream_poll_seconds
+
+log = get_logger(__name__)
+
+# Seconds between polls of the open positions while the account has any, which bounds close detection latency
+ACTIVE_POLL_INTERVAL = float(os.getenv("STREAM_ACTIVE_POLL_INTERVAL", "0.2"))
+# Seconds between polls while the account is flat, doubling on every poll that stays flat up to the max
+IDLE_POLL_INTERVAL = float(os.getenv("STREAM_IDLE_POLL_INTERVAL", "1"))
+MAX_IDLE_POLL_INTERVAL = float(os.getenv("STREAM_MAX_IDLE_POLL_INTERVAL", "5"))
+
+# Attempts, and seconds between them, to read a newly opened position that is not visible yet
+ENRICH_ATTEMPTS = 3
+ENRICH_RETRY_DELAY = 0.1
+
+# Events buffered per subscriber before it is considered too slow and dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    A single stream client's view of an account's events
+    """
+
+    def __init__(
+        self,
+        poller: "AccountPoller",
+        max_queue_size: int,
+        replay: Optional[List[dict]] = None,
+    ):
+        self.poller = poller
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        # Events the client missed before (re)connecting, delivered before any live ones
+        self.replay: Deque[dict] = deque(replay or [])
+        # Set when the subscriber fell too far behind and was removed from the poller
+        self.dropped = False
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """
+        Waits for the next event, returning None if there was none within the timeout
+        """
+        if self.replay:
+            return self.replay.popleft()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.poller.unsubscribe(self)
+
+
+class AccountPoller:
+    """
+    Polls an account on behalf of all its stream subscribers, and fans out the resulting events to each subscriber's
+    bounded queue.
+
+    Each poll reads only the open positions, quickly while there are any and backing off while the account is flat.
+    The full trade history is only re-synced (for the profit of closed trades) when an open position disappears.
+
+    Events are numbered by the account's event log, so clients can resume from the last one they received. The diff
+    state is kept while nobody is subscribed, so the first poll after a restart reports what changed in the meantime.
+
+    Polling starts with the first subscriber and stops once the last one unsubscribes.
+    """
+
+    def __init__(
+        self,
+        account_id: int,
+        fetch_trades: Callable[[int], TradesList] = get_trades_for_account,
+        fetch_positions: Callable[[int], TradesList] = get_open_positions_for_account,
+        active_interval: float = ACTIVE_POLL_INTERVAL,
+        idle_interval: float = IDLE_POLL_INTERVAL,
+        max_idle_interval: float = MAX_IDLE_POLL_INTERVAL,
+        max_queue_size: int = SUBSCRIBER_QUEUE_SIZE,
+        event_log: Optional[AccountEventLog] = None,
+    ):
+        self.account_id = account_id
+        self.fetch_trades = fetch_trades
+        self.fetch_positions = fetch_positions
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.max_queue_size = max_queue_size
+        self.event_log = event_log or get_event_log(account_id)
+        self.subscribers: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.diff_engine = TradeDiffEngine()
+        self.position_polls = 0
+        self.reconciles = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def subscribe(self, since: Optional[int] = None) -> Subscription:
+        """
+        :param since: The sequence id of the last event the client received, to replay the events it missed
+        """
+        replay = None
+        if since is not None:
+            replay, complete = await self.event_log.since(since)
+            if not complete:
+                log.warning(
+                    f"Cannot replay all transaction events since {since} for account {self.account_id}"
+                )
+                # The client has to re-fetch its trades to recover
+                replay.insert(
+                    0,
+                    {
+                        "type": "RESYNC",
+                        "since": since,
+                        "last_seq": self.event_log.last_seq,
+                    },
+                )
+
+        subscription = Subscription(self, self.max_queue_size, replay)
+        self.subscribers.add(subscription)
+        if not self.running:
+            log.info(f"Starting transaction poller for account {self.account_id}")
+            self._task = asyncio.ensure_future(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        if not self.subscribers and self._task is not None:
+            log.info(f"Stopping transaction poller for account {self.account_id}")
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, event: dict):
+        event = self.event_log.append(event)
+        stream_events_total.inc(str(self.account_id), event["type"])
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                log.warning(
+                    f"Dropping slow transaction stream subscriber for account {self.account_id}"
+                )
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+    def wake(self):
+        """
+        Polls immediately and resets the idle backoff, e.g. after a trade was opened through the adapter
+        """
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        self._wake = asyncio.Event()
+        idle_interval = self.idle_interval
+        needs_reconcile = True
+        while True:
+            try:
+                await self._poll(needs_reconcile)
+                needs_reconcile = False
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(
+                    "Failed to poll trades for account %s: %s", self.account_id, e
+                )
+
+            if self.diff_engine.open_positions:
+                interval = self.active_interval
+                idle_interval = self.idle_interval
+            else:
+                interval = idle_interval
+                idle_interval = min(idle_interval * 2, self.max_idle_interval)
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), interval)
+                idle_interval = self.idle_interval
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _poll(self, needs_reconcile: bool):
+        """
+        :param needs_reconcile: Whether to re-sync the full trade history rather than only reading open positions
+        """
+        terminal = get_terminal(self.account_id)
+        account = str(self.account_id)
+        if not needs_reconcile:
+            self.position_polls += 1
+            start = time.perf_counter()
+            positions = await terminal.run(self.fetch_positions, self.account_id)
+            open_ids = {position["position_id"] for position in positions}
+            if all(p in open_ids for p in self.diff_engine.open_positions):
+                for event in self.diff(positions):
+                    self.publish(event)
+                stream_poll_seconds.observe(
+                    time.perf_counter() - start, account, "positions"
+                )
+                return
+
+        # The first poll, or a position has closed: sync the history for its profit
+        self.reconciles += 1
+        start = time.perf_counter()
+        current_trades = await terminal.run(self.fetch_trades, self.account_id)
+        for event in self.diff(current_trades):
+            self.publish(event)
+        stream_poll_seconds.observe(time.perf_counter() - start, account, "reconcile")
+
+    def publish_trade(self, trade: Trade):
+        """
+        Feeds a trade read outside of polling (e.g. right after an order) through the diff engine, publishing its
+        event. Positions already seen by a poll produce no event, so nothing is published twice.
+        """
+        if not self.diff_engine.seeded:
+            # No stream has started yet, so its first poll will pick the position up
+            return
+        event = self.diff_engine.update(trade)
+        if event is not None:
+            self.publish(event)
+
+    def diff(self, current_trades: TradesList) -> List[dict]:
+        """
+        Returns events for positions that opened, were modified or closed since the previous poll
+        """
+        events = self.diff_engine.diff(current_trades)
+
+        log.debug("Found %s open trades", len(self.diff_engine.open_positions))
+        if events:
+            log.info(
+                "Found %s trade events this iteration for account %s",
+                len(events),
+                self.account_id,
+            )
+
+        return events
+
+
+_pollers: Dict[int, AccountPoller] = {}
+
+
+def get_account_poller(account_id: int) -> AccountPoller:
+    if account_id not in _pollers:
+        _pollers[account_id] = AccountPoller(account_id)
+    return _pollers[account_id]
+
+
+def subscriber_counts() -> Dict[int, int]:
+    """
+    :return: The number of stream subscribers of each account that has a poller
+    """
+    return {account_id: len(p.subscribers) for account_id, p in _pollers.items()}
+
+
+def wake_account_poller(account_id: int):
+    """
+    Wakes the account's poller, if its stream has any subscribers
+    """
+    poller = _pollers.get(account_id)
+    if poller is not None:
+        poller.wake()
+
+
+_enrichment_tasks: Set[asyncio.Task] = set()
+
+
+def schedule_trade_enrichment(account_id: int, position_id: int):
+    """
+    Reads a newly opened position in the background, and publishes it on the account's transaction stream
+    """
+    task = asyncio.ensure_future(_enrich_trade(account_id, position_id))
+    # The event loop only keeps weak references to tasks
+    _enrichment_tasks.add(task)
+    task.add_done_callback(_enrichment_tasks.discard)
+
+
+async def _enrich_trade(account_id: int, position_id: int):
+    for attempt in range(1, ENRICH_ATTEMPTS + 1):
+        try:
+            trade = await get_terminal(account_id).run(
+                build_open_trade_from_position_id, position_id
+            )
+            get_account_poller(account_id).publish_trade(trade)
+            return
+        except Exception as e:
+            log.warning(
+                f"Failed to read new position {position_id} for account {account_id} (attempt {attempt}): {e}"
+            )
+            await asyncio.sleep(ENRICH_RETRY_DELAY)
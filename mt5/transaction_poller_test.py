@@ -0,0 +1,143 @@
+import asyncio
+import unittest
+
+from mt5.event_log import AccountEventLog
+from mt5.transaction_poller import AccountPoller
+
+
+def trade(position_id, is_open, profit=None):
+    return {"position_id": position_id, "is_open": is_open, "profit": profit}
+
+
+class AccountPollerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_fans_out_close_events_from_a_single_poll(self):
+        trades = [trade(1, True), trade(2, True)]
+        positions = [trade(1, True), trade(2, True)]
+
+        def fetch_positions(account_id):
+            # Position 1 closes after the first poll of the open positions
+            result = list(positions)
+            positions[:] = [trade(2, True)]
+            trades[:] = [trade(1, False, 10.5), trade(2, True)]
+            return result
+
+        poller = AccountPoller(
+            1, lambda account_id: list(trades), fetch_positions, active_interval=0.01
+        )
+        first = await poller.subscribe()
+        second = await poller.subscribe()
+
+        first_event = await first.get(timeout=1)
+        second_event = await second.get(timeout=1)
+
+        self.assertEqual("CLOSE", first_event["type"])
+        self.assertEqual(1, first_event["position_id"])
+        self.assertEqual(10.5, first_event["profit"])
+        self.assertEqual(first_event, second_event)
+
+        first.close()
+        self.assertTrue(poller.running)
+        second.close()
+        self.assertFalse(poller.running)
+
+    async def test_only_reconciles_when_a_position_closes(self):
+        positions = [trade(1, True)]
+        poller = AccountPoller(
+            1,
+            lambda account_id: [trade(1, True)],
+            lambda account_id: list(positions),
+            active_interval=0.01,
+        )
+        subscription = await poller.subscribe()
+
+        positions.append(trade(2, True))
+        event = await subscription.get(timeout=1)
+        await asyncio.sleep(0.1)
+        subscription.close()
+
+        self.assertEqual(("OPEN", 2), (event["type"], event["position_id"]))
+        self.assertEqual(1, poller.reconciles)
+        self.assertGreater(poller.position_polls, 5)
+
+    async def test_backs_off_while_flat(self):
+        poller = AccountPoller(
+            1,
+            lambda account_id: [],
+            lambda account_id: [],
+            idle_interval=0.02,
+            max_idle_interval=0.08,
+        )
+        subscription = await poller.subscribe()
+        await asyncio.sleep(0.3)
+        flat_polls = poller.position_polls
+
+        poller.wake()
+        await asyncio.sleep(0.01)
+        subscription.close()
+
+        # 0.02 + 0.04 + 0.08 + 0.08... rather than 15 polls at the idle interval
+        self.assertLess(flat_polls, 6)
+        self.assertEqual(flat_polls + 1, poller.position_polls)
+
+    async def test_slow_subscriber_is_dropped(self):
+        poller = AccountPoller(1, lambda account_id: [], max_queue_size=1)
+        slow = await poller.subscribe()
+        fast = await poller.subscribe()
+
+        poller.publish({"type": "CLOSE", "position_id": 1})
+        await fast.queue.get()
+        poller.publish({"type": "CLOSE", "position_id": 2})
+
+        self.assertTrue(slow.dropped)
+        self.assertFalse(fast.dropped)
+        self.assertEqual({fast}, poller.subscribers)
+        fast.close()
+
+    async def test_resumes_from_the_last_received_event(self):
+        poller = AccountPoller(
+            1,
+            lambda account_id: [],
+            lambda account_id: [],
+            event_log=AccountEventLog(1),
+        )
+        subscription = await poller.subscribe()
+        for position_id in range(3):
+            poller.publish({"type": "OPEN", "position_id": position_id})
+        first = await subscription.get(timeout=1)
+        subscription.close()
+
+        resumed = await poller.subscribe(since=first["seq"])
+        replayed = [await resumed.get(timeout=1) for _ in range(2)]
+        stale = await poller.subscribe(since=100)
+        resync = await stale.get(timeout=1)
+        resumed.close()
+        stale.close()
+
+        self.assertEqual([2, 3], [e["seq"] for e in replayed])
+        self.assertEqual([1, 2], [e["position_id"] for e in replayed])
+        self.assertEqual("RESYNC", resync["type"])
+
+    async def test_published_trades_are_not_repeated_by_polls(self):
+        positions = []
+        poller = AccountPoller(
+            1,
+            lambda account_id: [],
+            lambda account_id: list(positions),
+            active_interval=0.01,
+            idle_interval=0.01,
+            event_log=AccountEventLog(1),
+        )
+        subscription = await poller.subscribe()
+        await asyncio.sleep(0.05)
+
+        poller.publish_trade(trade(1, True))
+        positions.append(trade(1, True))
+        await asyncio.sleep(0.05)
+        subscription.close()
+
+        events = list(poller.event_log.buffer)
+        self.assertEqual([("OPEN", 1)], [(e["type"], e["position_id"]) for e in events])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+One worker process per MT5 account.
+
+`mt5.initialize` binds the whole Python process to a single terminal, so when running multiple accounts each one gets
+a dedicated worker process that owns its own MT5 connection. The front end sends functions to run (by reference, so
+they must be importable module level functions) over a multiprocessing pipe, and gets their result back.
+"""
+
+import multiprocessing
+import os
+import threading
+import traceback
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from mt5.backend import install_backend
+from utils.logging import get_logger
+from utils.metrics import observe_mt5_calls
+
+log = get_logger(__name__)
+
+# Module to use in place of MetaTrader5 in worker processes, e.g. a fake terminal for tests
+BACKEND_MODULE = os.getenv("MT5_BACKEND_MODULE")
+
+# Seconds to wait for a worker to exit on shutdown before terminating it
+SHUTDOWN_TIMEOUT = 5
+
+_context = multiprocessing.get_context("spawn")
+
+
+def _worker_main(conn, backend_module: Optional[str]):
+    install_backend(backend_module)
+
+    import MetaTrader5
+    from utils import logging, metrics
+
+    logging.configure_logging()
+    # MT5 call timings are sent back with each result, to be served by the front end's /metrics
+    metrics.instrument_mt5(MetaTrader5)
+    metrics.forward_mt5_calls()
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+
+        fn, args, kwargs = message
+        try:
+            reply = ("ok", fn(*args, **kwargs))
+        except HTTPException as e:
+            # Starlette's HTTPException does not survive pickling, so send its fields
+            reply = ("http_error", (e.status_code, e.detail))
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+        conn.send(reply + (metrics.drain_forwarded_calls(),))
+
+
+class TerminalWorker:
+    """
+    A worker process owning the MT5 connection of a single account.
+
+    `call` is blocking and not thread safe; callers are expected to serialise calls, e.g. through a TerminalExecutor.
+    """
+
+    def __init__(self, account_id: int, backend_module: Optional[str] = BACKEND_MODULE):
+        self.account_id = account_id
+        self._conn, child_conn = _context.Pipe()
+        self._process = _context.Process(
+            target=_worker_main,
+            args=(child_conn, backend_module),
+            name=f"mt5-worker-{account_id}",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        log.info(
+            f"Started MT5 worker process {self._process.pid} for account {account_id}"
+        )
+
+    @property
+    def alive(self) -> bool:
+        return self._process.is_alive()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) in the worker process and returns its result
+        """
+        try:
+            self._conn.send((fn, args, kwargs))
+            status, result, mt5_calls = self._conn.recv()
+        except (EOFError, OSError, BrokenPipeError) as e:
+            log.error(f"MT5 worker for account {self.account_id} is unavailable: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"MT5 worker for account {self.account_id} is unavailable",
+            )
+
+        observe_mt5_calls(self.account_id, mt5_calls)
+        if status == "ok":
+            return result
+        if status == "http_error":
+            status_code, detail = result
+            raise HTTPException(status_code=status_code, detail=detail)
+
+        log.error(f"MT5 worker for account {self.account_id} failed: {result}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"MT5 worker for account {self.account_id} failed. Check adapter logs.",
+        )
+
+    def stop(self):
+        try:
+            self._conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self._process.join(SHUTDOWN_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        log.info(f"Stopped MT5 worker for account {self.account_id}")
+
+
+_workers: Dict[int, TerminalWorker] = {}
+_lock = threading.Lock()
+
+
+def get_or_start_worker(account_id: int) -> TerminalWorker:
+    with _lock:
+        worker = _workers.get(account_id)
+        if worker is None or not worker.alive:
+            worker = TerminalWorker(account_id)
+            _workers[account_id] = worker
+        return worker
+
+
+def get_worker(account_id: int) -> Optional[TerminalWorker]:
+    return _workers.get(account_id)
+
+
+def stop_worker(account_id: int):
+    with _lock:
+        worker = _workers.pop(account_id, None)
+    if worker is not None:
+        worker.stop()
+
+
+def stop_all_workers():
+    for account_id in list(_workers):
+        stop_worker(account_id)
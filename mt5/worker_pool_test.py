@@ -0,0 +1,102 @@
+import os
+import unittest
+from collections import namedtuple
+
+from fastapi import HTTPException
+
+from mt5.worker_pool import TerminalWorker
+
+# This module doubles as a minimal MetaTrader5 stand-in for the worker processes, so it must not import anything that
+# imports MetaTrader5 at module level.
+AccountInfo = namedtuple("AccountInfo", "login balance")
+_login = None
+
+
+def initialize(login=None, password=None, server=None, path=None):
+    global _login
+    if path == "invalid":
+        return False
+    _login = login
+    return True
+
+
+def last_error():
+    return (1, "Success") if _login else (-10003, "IPC initialize failed")
+
+
+def account_info():
+    return AccountInfo(_login, 1000.0)
+
+
+def read_login():
+    import MetaTrader5
+
+    return MetaTrader5.account_info().login
+
+
+def raise_http_error():
+    raise HTTPException(status_code=400, detail="Bad request")
+
+
+class TerminalWorkerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workers = [
+            TerminalWorker(account_id, backend_module=__name__) for account_id in (1, 2)
+        ]
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def test_each_account_owns_its_connection(self):
+        from mt5.mt5_instance import initialize_terminal
+        from mt5.account_snapshots import read_account_info
+
+        for worker, account_id in zip(self.workers, (1, 2)):
+            success, error = worker.call(initialize_terminal, account_id, "p", "s", "x")
+            self.assertTrue(success)
+            self.assertIsNone(error)
+
+        first_pid = self.workers[0].call(os.getpid)
+        second_pid = self.workers[1].call(os.getpid)
+        self.assertNotEqual(first_pid, second_pid)
+        self.assertNotEqual(os.getpid(), first_pid)
+
+        # Initializing account 2 did not redirect account 1's calls
+        account, _ = self.workers[0].call(read_account_info)
+        self.assertEqual(1, account["login"])
+        account, _ = self.workers[1].call(read_account_info)
+        self.assertEqual(2, account["login"])
+
+    def test_failed_initialize_returns_error(self):
+        from mt5.mt5_instance import initialize_terminal
+
+        success, error = self.workers[0].call(
+            initialize_terminal, 1, "p", "s", "invalid"
+        )
+
+        self.assertFalse(success)
+        self.assertEqual(-10003, error[0])
+
+    def test_mt5_call_timings_are_forwarded(self):
+        from utils.metrics import mt5_call_seconds
+
+        def count():
+            series = mt5_call_seconds._series.get(("account_info", "2"))
+            return series[-1] if series else 0
+
+        before = count()
+        self.workers[1].call(read_login)
+
+        self.assertEqual(before + 1, count())
+
+    def test_http_errors_are_raised_in_caller(self):
+        with self.assertRaises(HTTPException) as ctx:
+            self.workers[0].call(raise_http_error)
+
+        self.assertEqual(400, ctx.exception.status_code)
+        self.assertEqual("Bad request", ctx.exception.detail)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
 from mt5.mt5_instance import init_mt5_instance, get_mt5_instance
+from mt5.account_snapshots import (
+    AccountSnapshot,
+    get_account_snapshots,
+    reset_account_snapshots,
+)
+from mt5.executor import terminal
+from mt5.lot_sizing import reset_rate_refresher
 import utils.validation as validation
 from utils.logging import log_error
-import MetaTrader5 as mt5
 from utils.logging import get_logger, log_error
 
 log = get_logger(__name__)
@@ -11,6 +18,7 @@ log = get_logger(__name__)
 
 router = APIRouter()
 
+
 class InitializeRequest(BaseModel):
     accountId: int
     password: str
@@ -32,10 +40,13 @@ async def initialize(req: InitializeRequest):
 
     log.info(f"Initializing MT5 Account {req.accountId}")
 
-    success, error = init_mt5_instance(
-        req.accountId, req.password, req.server, req.path
+    success, error = await terminal.run(
+        init_mt5_instance, req.accountId, req.password, req.server, req.path
     )
     if success:
+        # Drop any snapshot from a previous session of the account
+        reset_account_snapshots(req.accountId)
+        reset_rate_refresher(req.accountId)
         log.info(f"Successfully initialized account %s", req.accountId)
         return {
             "status": "initialized",
@@ -52,9 +63,12 @@ async def initialize(req: InitializeRequest):
 
 
 @router.get("/accounts/{accountId}")
-async def get_account(accountId: int):
+async def get_account(accountId: int, request: Request, fresh: bool = False):
     """
     Get account data given MT5 instance accountId
+
+    Served from a snapshot refreshed in the background, unless `fresh` is set. Supports conditional requests through
+    `If-None-Match`/`If-Modified-Since`, returning a 304 when the account is unchanged.
     """
 
     instance = get_mt5_instance(accountId)
@@ -66,14 +80,30 @@ async def get_account(accountId: int):
 
     log.info(f"Getting account info for acountId: {accountId}")
 
-    account = mt5.account_info()
-    error = mt5.last_error()
-    if account:
-        return account._asdict()
-    else:
-        err_str = log_error(
-            error, "/accounts/<accountId> [GET] with accountId: {accountId}"
-        )
-        raise HTTPException(
-            status_code=500, detail=f"Failed to fetch account information: {err_str}"
-        )
+    snapshot = await get_account_snapshots(accountId).get(fresh=fresh)
+    headers = {
+        "ETag": snapshot.etag,
+        "Last-Modified": format_datetime(snapshot.last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, snapshot):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=snapshot.body, media_type="application/json", headers=headers
+    )
+
+
+def _not_modified(request: Request, snapshot: AccountSnapshot) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present (RFC 7232 3.3)
+        etags = {tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")}
+        return "*" in etags or snapshot.etag in etags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return snapshot.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException
+from mt5.executor import get_terminal
+from mt5.mt5_instance import get_mt5_instance
+from mt5.mt5_utils import get_account_stats_summary
+from utils.logging import get_logger
+
+log = get_logger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/stats/{accountId}")
+async def get_stats(accountId: int):
+    """
+    Returns performance aggregates of the account's closed trades: profit, win rate, profit factor, expectancy, equity
+    peak and max drawdown, overall and by symbol and by (trade server time) close day, with the equity at the end of each day.
+
+    The account is synced first (incrementally, as for `/trades`). The aggregates are kept up to date as trades
+    close, so this does not walk the trade history.
+    """
+    instance = get_mt5_instance(accountId)
+    if not instance:
+        raise HTTPException(
+            status_code=409,
+            detail=f"MT5 instance not initialized for account {accountId}",
+        )
+
+    return await get_terminal(accountId).run(get_account_stats_summary, accountId)
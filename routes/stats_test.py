@@ -0,0 +1,82 @@
+import unittest
+
+from mt5 import fake_mt5
+from mt5.mt5_utils import get_trades_for_account
+from routes.stats import router
+from routes.testing import ACCOUNT_ID, FakeAccountTestCase
+
+
+class StatsTestCase(FakeAccountTestCase):
+    router = router
+    history_positions = 50
+    open_positions = 2
+
+    def test_stats_match_closed_trades(self):
+        first = self.client.get(f"/stats/{ACCOUNT_ID}").json()
+
+        ticket, position = next(iter(self.terminal.positions.items()))
+        fake_mt5.order_send(
+            {
+                "action": fake_mt5.TRADE_ACTION_DEAL,
+                "symbol": position.symbol,
+                "volume": position.volume,
+                "type": 1 - position.type,
+                "position": ticket,
+            }
+        )
+        second = self.client.get(f"/stats/{ACCOUNT_ID}").json()
+        closed = [t for t in get_trades_for_account(ACCOUNT_ID) if not t["is_open"]]
+
+        self.assertEqual(len(closed) - 1, first["trades"])
+        self.assertEqual(len(closed), second["trades"])
+        self.assertAlmostEqual(
+            sum(t["profit"] for t in closed), second["net_profit"], places=1
+        )
+        self.assertEqual(
+            second["trades"], sum(s["trades"] for s in second["by_symbol"].values())
+        )
+
+    def test_partial_close_is_counted_once_fully_closed(self):
+        tick = fake_mt5.symbol_info_tick("EURUSD")
+        ticket = fake_mt5.order_send(
+            {
+                "action": fake_mt5.TRADE_ACTION_DEAL,
+                "symbol": "EURUSD",
+                "volume": 0.1,
+                "type": fake_mt5.ORDER_TYPE_BUY,
+                "price": tick.ask,
+            }
+        ).order
+
+        def close(volume):
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": "EURUSD",
+                    "volume": volume,
+                    "type": fake_mt5.ORDER_TYPE_SELL,
+                    "position": ticket,
+                }
+            )
+            return self.client.get(f"/stats/{ACCOUNT_ID}").json()
+
+        first = self.client.get(f"/stats/{ACCOUNT_ID}").json()
+        partial = close(0.05)
+        full = close(0.05)
+        trade = next(
+            t for t in get_trades_for_account(ACCOUNT_ID) if t["position_id"] == ticket
+        )
+
+        self.assertEqual(first["trades"], partial["trades"])
+        self.assertEqual(first["net_profit"], partial["net_profit"])
+        self.assertEqual(first["trades"] + 1, full["trades"])
+        self.assertAlmostEqual(
+            first["net_profit"] + trade["profit"], full["net_profit"], places=2
+        )
+
+    def test_uninitialized_account(self):
+        self.assertEqual(409, self.client.get("/stats/42").status_code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+"""
+Shared setup for route tests, run against the fake MT5 backend.
+"""
+
+import unittest
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from mt5 import fake_mt5
+from mt5.mt5_instance import init_mt5_instance, instances
+
+ACCOUNT_ID = 1000000
+
+
+class FakeAccountTestCase(unittest.TestCase):
+    """
+    Serves `router` through `self.client`, with ACCOUNT_ID initialized on a freshly configured fake terminal
+    (`self.terminal`) holding `history_positions` closed and `open_positions` open positions.
+    """
+
+    router: APIRouter
+    history_positions = 0
+    open_positions = 0
+
+    def setUp(self):
+        self.app = FastAPI()
+        self.app.include_router(self.router)
+        self.client = TestClient(self.app)
+        patched = fake_mt5.patched(
+            history_positions=self.history_positions,
+            open_positions=self.open_positions,
+            login=ACCOUNT_ID,
+        )
+        self.terminal = patched.__enter__()
+        self.addCleanup(patched.__exit__, None, None, None)
+        self.addCleanup(instances.pop, ACCOUNT_ID, None)
+        init_mt5_instance(ACCOUNT_ID, "password", "Fake-Server", "fake")
@@ -1,22 +1,71 @@
-import json
-from fastapi import APIRouter, HTTPException
-from typing import Dict
+import asyncio
+import time
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from starlette.responses import StreamingResponse
+from typing import Callable, Dict, List, Literal, Optional
 import MetaTrader5 as mt5
 
+from mt5.account_snapshots import get_account_snapshots
+from mt5.executor import TerminalTimeout, get_terminal
+from mt5.lot_sizing import get_rate_refresher, lot_sizer
 from mt5.mt5_instance import get_mt5_instance
-from mt5.mt5_utils import get_trades_for_account, build_open_trade_from_position_id
+from mt5.mt5_utils import (
+    build_open_trade_from_position_id,
+    find_trades,
+    get_trades_for_account,
+    without_close,
+)
+from mt5.risk_gate import get_exposure
+from mt5.symbol_cache import symbol_cache
+from mt5.transaction_poller import schedule_trade_enrichment, wake_account_poller
+from utils.idempotency import check_idempotency_key, fingerprint, idempotency_cache
 from utils.logging import log_error
-
-from internal_types import TradeRequest, Trade, TradesList
+from utils.serialization import (
+    MSGPACK_MEDIA_TYPE,
+    accepts_msgpack,
+    stream_json_list,
+    stream_msgpack_list,
+)
+
+from internal_types import (
+    BatchCloseRequest,
+    TradeFilter,
+    TradeRequest,
+    Trade,
+    TradesPage,
+)
 
 router = APIRouter()
-from utils.logging import get_logger, log_error
+from utils.logging import AUDIT, get_logger, log_error
 
 log = get_logger(__name__)
 
+# Maximum number of orders in a single batch request
+MAX_BATCH_SIZE = 100
+
+
+@router.get("/trades/{accountId}", response_model=TradesPage)
+async def get_trades(
+    accountId: int,
+    fast: bool = False,
+    accept: Optional[str] = Header(None),
+    from_time: Optional[int] = Query(None, alias="from"),
+    to: Optional[int] = None,
+    symbol: Optional[str] = None,
+    status: Optional[Literal["open", "closed"]] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+):
+    """
+    Returns the account's trades, validated against the response model.
+
+    `from` and `to` (unix seconds, compared to the open time), `symbol` and `status` filter the trades, and are
+    pushed down to the terminal where possible. With `limit`, trades are ordered by open time and paged: pass the
+    response's `next_cursor` as `cursor` to get the next page.
 
-@router.get("/trades/{accountId}", response_model=Dict[str, TradesList])
-async def get_trades(accountId: int):
+    With `?fast=true` the trades skip validation, and are streamed in chunks with a faster JSON encoder. Requests with
+    `Accept: application/msgpack` are always served this way, as msgpack.
+    """
     instance = get_mt5_instance(accountId)
     if not instance:
         raise HTTPException(
@@ -24,21 +73,43 @@ async def get_trades(accountId: int):
             detail=f"MT5 instance not initialized for account {accountId}",
         )
 
-    trades: TradesList = get_trades_for_account(accountId)
-
-    if trades != None:
-        return {"trades": trades}
+    trade_filter = TradeFilter(
+        from_time=from_time,
+        to_time=to,
+        symbol=symbol,
+        status=status,
+        limit=limit,
+        cursor=cursor,
+    )
+    if trade_filter.model_dump(exclude_none=True):
+        page = await get_terminal(accountId).run(find_trades, accountId, trade_filter)
     else:
-        err_str = log_error(
-            error, f"/trades/<accountId> [GET] with accountId: {accountId}"
+        trades = await get_terminal(accountId).run(get_trades_for_account, accountId)
+        page = {"trades": trades, "next_cursor": None}
+
+    # Trades are built by the adapter itself, so need not be validated again
+    extra = {"next_cursor": page["next_cursor"]}
+    if accepts_msgpack(accept):
+        return StreamingResponse(
+            stream_msgpack_list("trades", page["trades"], extra),
+            media_type=MSGPACK_MEDIA_TYPE,
         )
-        raise HTTPException(
-            status_code=500, detail=f"Failed to fetch trades: {err_str}"
+    if fast:
+        return StreamingResponse(
+            stream_json_list("trades", page["trades"], extra),
+            media_type="application/json",
         )
+    return page
 
 
 @router.post("/trades/{accountId}/open")
-async def open_trade(accountId: int, request: TradeRequest):
+async def open_trade(
+    accountId: int,
+    request: TradeRequest,
+    response: Response,
+    fastAck: bool = False,
+    idempotency_key: Optional[str] = Header(None),
+):
     """
     TODO: Improve this, it should be dynamic with validation based on difference between data in algotrade4j and the adapter
 
@@ -51,6 +122,13 @@ async def open_trade(accountId: int, request: TradeRequest):
     It uses the stop loss and entry price provided, and creates its own values based on the data it has.
 
     It should still comply to the risk ratio setup requested by the trade.
+
+    With `fastAck`, the trade is returned straight from the order result, rather than re-reading the position after
+    the fill. Its open time is the time of the tick it was priced from, and its profit 0. The position as read from
+    the terminal then follows on the transaction stream, as an OPEN (or MODIFY) event.
+
+    With an `Idempotency-Key` header, the trade is only opened once per key: retries (and concurrent duplicates) get
+    the first request's outcome, whether the trade or the error.
     """
     instance = get_mt5_instance(accountId)
     if not instance:
@@ -59,32 +137,54 @@ async def open_trade(accountId: int, request: TradeRequest):
             detail=f"MT5 instance not initialized for account {accountId}",
         )
 
-    symbol_info = mt5.symbol_info_tick(request.instrument)
+    async def open_once() -> Trade:
+        # Keeps the rates orders are sized with fresh while the account is trading
+        get_rate_refresher(accountId).touch()
+        trade = await get_terminal(accountId).run(
+            _open_trade, accountId, request, fastAck
+        )
+        # Margin and equity have changed
+        get_account_snapshots(accountId).invalidate()
+        if fastAck:
+            schedule_trade_enrichment(accountId, trade["position_id"])
+        else:
+            # Stream subscribers see the new position without waiting out the idle backoff
+            wake_account_poller(accountId)
+        return trade
+
+    return await _run_idempotent(
+        idempotency_key,
+        (accountId, "open"),
+        fingerprint(request.model_dump(), fastAck),
+        open_once,
+        response,
+    )
+
+
+def _open_trade(accountId: int, request: TradeRequest, fast_ack: bool = False) -> Trade:
+    """
+    Runs on the terminal thread, so the symbol lookups, order and error checks cannot interleave with other calls
+    """
+    symbol_info = symbol_cache.symbol_info_tick(accountId, request.instrument)
     if not symbol_info:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid Instrument/Symbol {request.instrument} for accountId: {accountId}",
         )
 
-    s = mt5.symbol_info(request.instrument)
+    s = symbol_cache.symbol_info(accountId, request.instrument)
     if s is None:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid Instrument/Symbol {request.instrument} for accountId: {accountId}",
         )
 
-    s_dict = s._asdict()
-
-    digits = s_dict.get("digits")
-
     # if the symbol is unavailable in MarketWatch, add it
-    if not s.visible:
-        log.debug(request.instrument, " is not visible, trying to switch on")
-        if not mt5.symbol_select(request.instrument, True):
-            raise HTTPException(
-                status_code=500,
-                detail=f"Symbol {request.instrument} failed to be selected",
-            )
+    if not symbol_cache.ensure_selected(accountId, request.instrument):
+        raise HTTPException(
+            status_code=500,
+            detail=f"Symbol {request.instrument} failed to be selected",
+        )
 
     current_price = symbol_info.ask if request.isLong else symbol_info.bid
 
@@ -100,9 +200,11 @@ async def open_trade(accountId: int, request: TradeRequest):
     else:
         new_take_profit = current_price - new_take_profit_pips
 
-    # TODO: Pip value conversion from Algotrade4j to Adapter
     risk_amount = request.balanceToRisk * request.riskPercentage
-    volume = round(risk_amount / (stop_loss_pips * 10), digits)
+    volume = lot_sizer.volume(accountId, s, risk_amount, stop_loss_pips)
+
+    exposure = get_exposure(accountId)
+    exposure.check(s, request.isLong, volume, current_price, symbol_info.time)
 
     order_type = mt5.ORDER_TYPE_BUY if request.isLong else mt5.ORDER_TYPE_SELL
     request = {
@@ -115,14 +217,26 @@ async def open_trade(accountId: int, request: TradeRequest):
         "tp": new_take_profit,
     }
 
-    log.info(f"Opening trade with req body: {json.dumps(request, indent=4)}")
+    log.info("Opening trade with req body: %s", request, extra=AUDIT)
     result = mt5.order_send(request)
     error = mt5.last_error()
+    # Our own order may have moved the price, and a rejection may mean the cached tick was stale
+    symbol_cache.invalidate_tick(accountId, request["symbol"])
 
     if result and result.retcode == mt5.TRADE_RETCODE_DONE:
         # Parse the result id into a 'Trade' type
         res_dict = result._asdict()
-        log.debug(f"Result while opening new trade: {json.dumps(res_dict, indent=4)}")
+        log.debug("Result while opening new trade: %s", res_dict)
+        exposure.add_position(
+            res_dict["order"],
+            s,
+            order_type == mt5.ORDER_TYPE_BUY,
+            res_dict["volume"],
+            res_dict["price"],
+        )
+
+        if fast_ack:
+            return _trade_from_order_result(res_dict, request, symbol_info.time)
 
         new_trade = build_open_trade_from_position_id(res_dict.get("order"))
 
@@ -138,8 +252,42 @@ async def open_trade(accountId: int, request: TradeRequest):
         )
 
 
+def _trade_from_order_result(result: dict, request: dict, fill_time: int) -> Trade:
+    """
+    Builds an open trade from a filled market order, without reading its position.
+
+    :param result: The OrderSendResult, as a dict
+    :param request: The order request
+    :param fill_time: The time of the tick the order was priced from, standing in for the fill time
+    """
+    return without_close(
+        {
+            "position_id": result["order"],
+            "symbol": request["symbol"],
+            "total_volume": result["volume"],
+            "is_long": request["type"] == mt5.ORDER_TYPE_BUY,
+            "open_order_ticket": result["order"],
+            "open_order_price": result["price"],
+            "open_order_time": fill_time,
+            "stop_loss": request["sl"],
+            "take_profit": request["tp"],
+            "profit": 0.0,
+            "is_open": True,
+        }
+    )
+
+
 @router.post("/trades/{accountId}/close/{tradeId}")
-async def close_trade(accountId: int, tradeId: int):
+async def close_trade(
+    accountId: int,
+    tradeId: int,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Concurrent closes of the same trade share a single close. With an `Idempotency-Key` header, retries get the
+    first request's outcome.
+    """
     instance = get_mt5_instance(accountId)
     if not instance:
         raise HTTPException(
@@ -147,13 +295,41 @@ async def close_trade(accountId: int, tradeId: int):
             detail=f"MT5 instance not initialized for account {accountId}",
         )
 
+    async def close_once():
+        await get_terminal(accountId).run(_close_trade, accountId, tradeId)
+        # Balance and margin have changed
+        get_account_snapshots(accountId).invalidate()
+
+    async def close_coalesced():
+        return await idempotency_cache.run(
+            (accountId, "close", tradeId), "", close_once, response, cache=False
+        )
+
+    return await _run_idempotent(
+        idempotency_key,
+        (accountId, "close"),
+        fingerprint(tradeId),
+        close_coalesced,
+        response,
+    )
+
+
+def _close_trade(accountId: int, tradeId: int):
     position = mt5.positions_get(ticket=tradeId)
     if not position:
         raise HTTPException(status_code=400, detail=f"Open Trade {tradeId} not found")
 
-    symbol = position[0].symbol
-    volume = position[0].volume
-    position_type = position[0].type  # mt5.ORDER_TYPE_BUY or mt5.ORDER_TYPE_SELL
+    _close_position(accountId, position[0]._asdict())
+
+
+def _close_position(accountId: int, position: dict):
+    """
+    Closes an open position, as returned by positions_get
+    """
+    tradeId = position["ticket"]
+    symbol = position["symbol"]
+    volume = position["volume"]
+    position_type = position["type"]  # mt5.ORDER_TYPE_BUY or mt5.ORDER_TYPE_SELL
 
     close_type = (
         mt5.ORDER_TYPE_SELL
@@ -171,10 +347,12 @@ async def close_trade(accountId: int, tradeId: int):
         "deviation": 20,
     }
 
+    log.info("Closing trade with req body: %s", request, extra=AUDIT)
     result = mt5.order_send(request)
+    symbol_cache.invalidate_tick(accountId, symbol)
 
     if result and result.retcode == mt5.TRADE_RETCODE_DONE:
-        # Return 200
+        get_exposure(accountId).remove_position(tradeId)
         return
     else:
         error = mt5.last_error()
@@ -186,3 +364,234 @@ async def close_trade(accountId: int, tradeId: int):
             status_code=500,
             detail=f"Failed to close trade: [{result.retcode if result else 'Unknown Error'}] {err_str}",
         )
+
+
+@router.post("/trades/{accountId}/batch/open")
+async def open_trades_batch(
+    accountId: int,
+    requests: List[TradeRequest],
+    response: Response,
+    fastAck: bool = False,
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Opens several trades, as `/trades/{accountId}/open` would each of them.
+
+    The orders are queued on the terminal back to back, sharing symbol lookups, and each gets its own result (the
+    trade, or the error status and detail) and terminal latency. Items fail independently. `fastAck` and
+    `Idempotency-Key` are as for a single open.
+    """
+    instance = get_mt5_instance(accountId)
+    if not instance:
+        raise HTTPException(
+            status_code=409,
+            detail=f"MT5 instance not initialized for account {accountId}",
+        )
+    _check_batch_size(len(requests))
+
+    return await _run_idempotent(
+        idempotency_key,
+        (accountId, "batch/open"),
+        fingerprint([request.model_dump() for request in requests], fastAck),
+        lambda: _open_batch(accountId, requests, fastAck),
+        response,
+    )
+
+
+async def _open_batch(accountId: int, requests: List[TradeRequest], fastAck: bool):
+    start = time.perf_counter()
+    get_rate_refresher(accountId).touch()
+    results = await _run_batch(
+        accountId,
+        [(_open_trade, accountId, request, fastAck) for request in requests],
+    )
+    for index, result in enumerate(results):
+        result["index"] = index
+        if result["success"]:
+            result["trade"] = result.pop("result")
+            if fastAck:
+                schedule_trade_enrichment(accountId, result["trade"]["position_id"])
+
+    get_account_snapshots(accountId).invalidate()
+    if not fastAck:
+        wake_account_poller(accountId)
+    return _batch_response(results, start)
+
+
+@router.post("/trades/{accountId}/batch/close")
+async def close_trades_batch(
+    accountId: int,
+    request: BatchCloseRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Closes the given trades (at most MAX_BATCH_SIZE), or with `closeAll` every open trade of the account (optionally
+    only for `symbol`).
+
+    The open positions are read with a single positions_get call, then the closes are queued on the terminal back
+    to back, MAX_BATCH_SIZE at a time. Each trade gets its own result and terminal latency. Items fail independently.
+    """
+    instance = get_mt5_instance(accountId)
+    if not instance:
+        raise HTTPException(
+            status_code=409,
+            detail=f"MT5 instance not initialized for account {accountId}",
+        )
+    if request.closeAll == (request.tradeIds is not None):
+        raise HTTPException(
+            status_code=400, detail="Either tradeIds or closeAll must be given"
+        )
+    if request.tradeIds is not None:
+        _check_batch_size(len(request.tradeIds))
+
+    return await _run_idempotent(
+        idempotency_key,
+        (accountId, "batch/close"),
+        fingerprint(request.model_dump()),
+        lambda: _close_batch(accountId, request),
+        response,
+    )
+
+
+async def _close_batch(accountId: int, request: BatchCloseRequest):
+    start = time.perf_counter()
+    terminal = get_terminal(accountId)
+    try:
+        positions = await terminal.run(_get_open_positions, accountId, request.symbol)
+    except TerminalTimeout as e:
+        # Nothing was closed yet, so a retry can start over rather than wait for the read
+        raise TerminalTimeout(e.detail)
+
+    if request.closeAll:
+        trade_ids = list(positions)
+    else:
+        trade_ids = request.tradeIds
+
+    items = [
+        (_close_position, accountId, positions[trade_id])
+        for trade_id in trade_ids
+        if trade_id in positions
+    ]
+    results = []
+    # Closing all positions of a large account is not limited like a batch, but queued a batch at a time
+    for i in range(0, len(items), MAX_BATCH_SIZE):
+        results += await _run_batch(accountId, items[i : i + MAX_BATCH_SIZE])
+    results = iter(results)
+    trade_results = []
+    for trade_id in trade_ids:
+        if trade_id in positions:
+            result = next(results)
+            result.pop("result", None)
+        else:
+            result = {
+                "success": False,
+                "status_code": 400,
+                "error": f"Open Trade {trade_id} not found",
+                "latency_ms": 0.0,
+            }
+        trade_results.append({"tradeId": trade_id, **result})
+
+    get_account_snapshots(accountId).invalidate()
+    return _batch_response(trade_results, start)
+
+
+async def _run_idempotent(
+    key: Optional[str],
+    endpoint: tuple,
+    request_fingerprint: str,
+    fn: Callable,
+    response: Response,
+):
+    """
+    Runs `fn()` once per Idempotency-Key of the endpoint, or just runs it when there is no key
+    """
+    if key is None:
+        return await fn()
+    check_idempotency_key(key)
+    return await idempotency_cache.run(
+        endpoint + (key,), request_fingerprint, fn, response
+    )
+
+
+def _check_batch_size(size: int):
+    if size > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch of {size} exceeds the maximum of {MAX_BATCH_SIZE} items",
+        )
+
+
+def _get_open_positions(accountId: int, symbol: Optional[str]) -> Dict[int, dict]:
+    """
+    :return: The account's open positions by ticket, optionally only for one symbol
+    """
+    positions = mt5.positions_get(symbol=symbol) if symbol else mt5.positions_get()
+    if positions is None:
+        error = mt5.last_error()
+        err_str = log_error(
+            error,
+            f"/trades/<accountId>/batch/close [POST] with accountId: {accountId}",
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get open positions: {err_str}"
+        )
+    return {position.ticket: position._asdict() for position in positions}
+
+
+async def _run_batch(accountId: int, items: List[tuple]) -> List[dict]:
+    """
+    Submits every item to the account's terminal at once, so they run back to back without waiting on each other's
+    response, and returns their results in order.
+
+    :param items: Tuples of (function, *args) to run
+    """
+    terminal = get_terminal(accountId)
+    outcomes = await asyncio.gather(
+        *(terminal.run(_run_batch_item, *item) for item in items),
+        return_exceptions=True,
+    )
+
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, HTTPException):
+            # e.g. the item timed out waiting for the terminal
+            outcome = {
+                "success": False,
+                "status_code": outcome.status_code,
+                "error": outcome.detail,
+                "latency_ms": None,
+            }
+        elif isinstance(outcome, BaseException):
+            log.error(f"Batch item failed for account {accountId}: {outcome}")
+            outcome = {
+                "success": False,
+                "status_code": 500,
+                "error": str(outcome),
+                "latency_ms": None,
+            }
+        results.append(outcome)
+    return results
+
+
+def _run_batch_item(fn: Callable, *args) -> dict:
+    """
+    Runs on the terminal thread. Errors are returned as part of the result, so one item cannot fail the whole batch.
+    """
+    start = time.perf_counter()
+    try:
+        result = {"success": True, "result": fn(*args)}
+    except HTTPException as e:
+        result = {"success": False, "status_code": e.status_code, "error": e.detail}
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+def _batch_response(results: List[dict], start: float) -> dict:
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "total_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
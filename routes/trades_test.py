@@ -0,0 +1,403 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+import msgpack
+
+from fastapi import HTTPException
+
+from mt5.executor import TerminalExecutor
+from mt5.history_store import get_account_history, reset_account_history
+from mt5.risk_gate import RiskLimits, get_exposure
+from internal_types import TradeRequest
+from routes.testing import ACCOUNT_ID, FakeAccountTestCase
+from routes.trades import _open_trade, router
+from utils.idempotency import REPLAYED_HEADER, IdempotencyCache
+
+TRADE_REQUEST = {
+    "instrument": "US100.cash",
+    "quantity": 0.1,
+    "entryPrice": 20000.0,
+    "stopLoss": 19970.0,
+    "takeProfit": 20060.0,
+    "riskPercentage": 0.003,
+    "riskRatio": 2.0,
+    "balanceToRisk": 10000.0,
+    "isLong": True,
+    "openTime": None,
+}
+EURUSD_TRADE_REQUEST = {
+    **TRADE_REQUEST,
+    "instrument": "EURUSD",
+    "entryPrice": 1.08,
+    "stopLoss": 1.078,
+    "takeProfit": 1.084,
+}
+
+
+class BatchTradesTestCase(FakeAccountTestCase):
+    router = router
+
+    def test_open_batch_has_per_item_results(self):
+        requests = [TRADE_REQUEST, {**TRADE_REQUEST, "instrument": "NOPE"}]
+        requests.append({**TRADE_REQUEST, "isLong": False})
+
+        response = self.client.post(f"/trades/{ACCOUNT_ID}/batch/open", json=requests)
+
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual((2, 1), (data["succeeded"], data["failed"]))
+        self.assertEqual([0, 1, 2], [r["index"] for r in data["results"]])
+        self.assertTrue(data["results"][0]["trade"]["is_long"])
+        self.assertEqual(400, data["results"][1]["status_code"])
+        self.assertFalse(data["results"][2]["trade"]["is_long"])
+        self.assertEqual(2, len(self.terminal.positions))
+
+    def test_risk_gate_limits_each_order_of_a_batch(self):
+        get_exposure(ACCOUNT_ID).limits = RiskLimits(max_positions=2)
+
+        response = self.client.post(
+            f"/trades/{ACCOUNT_ID}/batch/open", json=[TRADE_REQUEST] * 3
+        )
+
+        data = response.json()
+        self.assertEqual((2, 1), (data["succeeded"], data["failed"]))
+        self.assertEqual(403, data["results"][2]["status_code"])
+        self.assertEqual(2, len(self.terminal.positions))
+        # Closing frees the slot without re-reading positions
+        calls = self.terminal.calls["positions_get"]
+        self.client.post(
+            f"/trades/{ACCOUNT_ID}/close/{data['results'][0]['trade']['position_id']}"
+        )
+        response = self.client.post(f"/trades/{ACCOUNT_ID}/open", json=TRADE_REQUEST)
+        self.assertEqual(200, response.status_code)
+        # Only the close and the new trade read their own position
+        self.assertEqual(2, self.terminal.calls["positions_get"] - calls)
+
+    def test_close_all_for_symbol(self):
+        requests = [TRADE_REQUEST] * 3 + [EURUSD_TRADE_REQUEST]
+        self.client.post(f"/trades/{ACCOUNT_ID}/batch/open", json=requests)
+        calls = self.terminal.calls["positions_get"]
+
+        response = self.client.post(
+            f"/trades/{ACCOUNT_ID}/batch/close",
+            json={"closeAll": True, "symbol": "US100.cash"},
+        )
+
+        data = response.json()
+        self.assertEqual((3, 0), (data["succeeded"], data["failed"]))
+        self.assertEqual(1, self.terminal.calls["positions_get"] - calls)
+        self.assertEqual(
+            ["EURUSD"], [p.symbol for p in self.terminal.positions.values()]
+        )
+
+    def test_close_all_is_not_limited_to_a_batch(self):
+        self.client.post(f"/trades/{ACCOUNT_ID}/batch/open", json=[TRADE_REQUEST] * 5)
+
+        with patch("routes.trades.MAX_BATCH_SIZE", 2):
+            too_many = self.client.post(
+                f"/trades/{ACCOUNT_ID}/batch/close",
+                json={"tradeIds": list(self.terminal.positions)},
+            )
+            response = self.client.post(
+                f"/trades/{ACCOUNT_ID}/batch/close", json={"closeAll": True}
+            )
+
+        self.assertEqual(400, too_many.status_code)
+        data = response.json()
+        self.assertEqual((5, 0), (data["succeeded"], data["failed"]))
+        self.assertEqual({}, self.terminal.positions)
+
+    def test_close_by_trade_ids(self):
+        self.client.post(f"/trades/{ACCOUNT_ID}/batch/open", json=[TRADE_REQUEST])
+        ticket = next(iter(self.terminal.positions))
+
+        response = self.client.post(
+            f"/trades/{ACCOUNT_ID}/batch/close", json={"tradeIds": [ticket, 1]}
+        )
+
+        results = response.json()["results"]
+        self.assertEqual([ticket, 1], [r["tradeId"] for r in results])
+        self.assertTrue(results[0]["success"])
+        self.assertEqual(400, results[1]["status_code"])
+        self.assertEqual({}, self.terminal.positions)
+
+    def test_fast_ack_matches_the_position(self):
+        response = self.client.post(
+            f"/trades/{ACCOUNT_ID}/open?fastAck=true", json=TRADE_REQUEST
+        )
+
+        self.assertEqual(200, response.status_code)
+        trade = response.json()
+        position = self.terminal.positions[trade["position_id"]]
+        self.assertEqual(position.price_open, trade["open_order_price"])
+        self.assertEqual(position.volume, trade["total_volume"])
+        self.assertEqual(position.sl, trade["stop_loss"])
+        self.assertTrue(trade["is_open"])
+
+    def test_fast_ack_skips_reading_the_position(self):
+        calls = self.terminal.calls["positions_get"]
+
+        trade = _open_trade(ACCOUNT_ID, TradeRequest(**TRADE_REQUEST), fast_ack=True)
+
+        self.assertEqual(calls, self.terminal.calls["positions_get"])
+        # The same fields as a trade read from its position
+        expected = _open_trade(ACCOUNT_ID, TradeRequest(**TRADE_REQUEST))
+        self.assertEqual(set(expected), set(trade))
+
+    def test_close_requires_ids_or_close_all(self):
+        response = self.client.post(f"/trades/{ACCOUNT_ID}/batch/close", json={})
+
+        self.assertEqual(400, response.status_code)
+
+
+class IdempotencyTestCase(FakeAccountTestCase):
+    router = router
+
+    def setUp(self):
+        super().setUp()
+        self.key = {"Idempotency-Key": f"{self.id()}"}
+
+    def test_retried_open_returns_the_first_trade(self):
+        url = f"/trades/{ACCOUNT_ID}/open"
+        first = self.client.post(url, json=TRADE_REQUEST, headers=self.key)
+        retry = self.client.post(url, json=TRADE_REQUEST, headers=self.key)
+
+        self.assertEqual(200, retry.status_code)
+        self.assertEqual(first.json(), retry.json())
+        self.assertNotIn(REPLAYED_HEADER, first.headers)
+        self.assertEqual("true", retry.headers[REPLAYED_HEADER])
+        self.assertEqual(1, self.terminal.calls["order_send"])
+        self.assertEqual(1, len(self.terminal.positions))
+
+    def test_errors_are_replayed(self):
+        url = f"/trades/{ACCOUNT_ID}/open"
+        request = {**TRADE_REQUEST, "instrument": "NOPE"}
+        self.client.post(url, json=request, headers=self.key)
+        calls = sum(self.terminal.calls.values())
+
+        retry = self.client.post(url, json=request, headers=self.key)
+
+        self.assertEqual(400, retry.status_code)
+        self.assertEqual("true", retry.headers[REPLAYED_HEADER])
+        self.assertEqual(calls, sum(self.terminal.calls.values()))
+
+    def test_reusing_a_key_for_another_request_is_rejected(self):
+        url = f"/trades/{ACCOUNT_ID}/open"
+        self.client.post(url, json=TRADE_REQUEST, headers=self.key)
+
+        response = self.client.post(
+            url, json={**TRADE_REQUEST, "isLong": False}, headers=self.key
+        )
+
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(1, len(self.terminal.positions))
+
+    def test_retried_close_succeeds_without_closing_again(self):
+        self.client.post(f"/trades/{ACCOUNT_ID}/open", json=TRADE_REQUEST)
+        url = f"/trades/{ACCOUNT_ID}/close/{next(iter(self.terminal.positions))}"
+        calls = self.terminal.calls["order_send"]
+
+        first = self.client.post(url, headers=self.key)
+        retry = self.client.post(url, headers=self.key)
+
+        self.assertEqual((200, 200), (first.status_code, retry.status_code))
+        self.assertEqual(1, self.terminal.calls["order_send"] - calls)
+        # Without the key, the trade is no longer found
+        self.assertEqual(400, self.client.post(url).status_code)
+
+    def test_concurrent_closes_of_a_trade_are_coalesced(self):
+        self.client.post(f"/trades/{ACCOUNT_ID}/open", json=TRADE_REQUEST)
+        url = f"/trades/{ACCOUNT_ID}/close/{next(iter(self.terminal.positions))}"
+        positions_calls = self.terminal.calls["positions_get"]
+        order_calls = self.terminal.calls["order_send"]
+
+        async def close_concurrently():
+            transport = httpx.ASGITransport(app=self.app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await asyncio.gather(*(client.post(url) for _ in range(5)))
+
+        responses = asyncio.run(close_concurrently())
+
+        self.assertEqual([200] * 5, [r.status_code for r in responses])
+        self.assertEqual(1, self.terminal.calls["positions_get"] - positions_calls)
+        self.assertEqual(1, self.terminal.calls["order_send"] - order_calls)
+
+
+class IdempotencyCacheTestCase(unittest.TestCase):
+    def test_concurrent_calls_share_one_run(self):
+        cache = IdempotencyCache()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return {"n": len(runs)}
+
+        async def scenario():
+            return await asyncio.gather(
+                *(cache.run(("a",), "f", work) for _ in range(3))
+            )
+
+        results = asyncio.run(scenario())
+
+        self.assertEqual([{"n": 1}] * 3, results)
+        self.assertEqual(1, len(runs))
+
+    def test_outcome_is_kept_when_the_first_caller_is_cancelled(self):
+        cache = IdempotencyCache()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def scenario():
+            first = asyncio.ensure_future(cache.run(("a",), "f", work))
+            await asyncio.sleep(0.005)
+            first.cancel()
+            retry = await cache.run(("a",), "f", work)
+            return first.cancelled(), retry
+
+        self.assertEqual((True, "done"), asyncio.run(scenario()))
+        self.assertEqual("done", cache.outcomes.get(("a",))[1])
+
+    def test_outcomes_expire_and_unexpected_errors_are_not_kept(self):
+        cache = IdempotencyCache(ttl=0.01)
+
+        async def fail():
+            raise ValueError("boom")
+
+        async def reject():
+            raise HTTPException(status_code=400, detail="no")
+
+        async def scenario():
+            with self.assertRaises(ValueError):
+                await cache.run(("a",), "f", fail)
+            self.assertIsNone(cache.outcomes.get(("a",)))
+
+            with self.assertRaises(HTTPException):
+                await cache.run(("b",), "f", reject)
+            self.assertIsNotNone(cache.outcomes.get(("b",)))
+            await asyncio.sleep(0.02)
+            self.assertIsNone(cache.outcomes.get(("b",)))
+
+        asyncio.run(scenario())
+
+    def test_terminal_timeouts_wait_for_the_call_to_finish(self):
+        cache = IdempotencyCache()
+        executor = TerminalExecutor()
+        runs = []
+
+        def fill():
+            runs.append(1)
+            time.sleep(0.05)
+            return "filled"
+
+        async def work():
+            return await executor.run(fill, timeout=0.01)
+
+        async def scenario():
+            with self.assertRaises(HTTPException) as e:
+                await cache.run(("a",), "f", work)
+            self.assertEqual(504, e.exception.status_code)
+            self.assertIsNone(cache.outcomes.get(("a",)))
+            # Still in flight, so the retry waits for the fill rather than sending another order
+            return await cache.run(("a",), "f", work)
+
+        self.assertEqual("filled", asyncio.run(scenario()))
+        self.assertEqual(1, len(runs))
+        self.assertEqual("filled", cache.outcomes.get(("a",))[1])
+
+
+class GetTradesTestCase(FakeAccountTestCase):
+    router = router
+    history_positions = 40
+    open_positions = 3
+
+    def setUp(self):
+        super().setUp()
+        self.expected = self.client.get(f"/trades/{ACCOUNT_ID}").json()
+
+    def test_fast_json_matches_validated(self):
+        with patch("utils.serialization.STREAM_CHUNK_SIZE", 7):
+            response = self.client.get(f"/trades/{ACCOUNT_ID}?fast=true")
+
+        self.assertEqual("application/json", response.headers["content-type"])
+        self.assertEqual(self.expected, response.json())
+
+    def test_msgpack(self):
+        response = self.client.get(
+            f"/trades/{ACCOUNT_ID}", headers={"Accept": "application/msgpack"}
+        )
+
+        self.assertEqual("application/msgpack", response.headers["content-type"])
+        self.assertEqual(self.expected, msgpack.unpackb(response.content))
+
+    def test_cold_filters_match_full_history(self):
+        trades = self.expected["trades"]
+        symbol = trades[0]["symbol"]
+        from_time = sorted(t["open_order_time"] for t in trades)[len(trades) // 2]
+        expected = [
+            t
+            for t in trades
+            if t["symbol"] == symbol
+            and t["open_order_time"] >= from_time
+            and not t["is_open"]
+        ]
+        self.assertTrue(expected)
+        reset_account_history(ACCOUNT_ID)
+
+        response = self.client.get(
+            f"/trades/{ACCOUNT_ID}",
+            params={"symbol": symbol, "from": from_time, "status": "closed"},
+        )
+
+        key = lambda t: (t["open_order_time"], t["position_id"])
+        self.assertEqual(sorted(expected, key=key), response.json()["trades"])
+        # The partial window was not stored as the account's history
+        self.assertIsNone(get_account_history(ACCOUNT_ID).watermark)
+
+    def test_cold_filters_that_do_not_narrow_the_window_sync_in_full(self):
+        reset_account_history(ACCOUNT_ID)
+
+        response = self.client.get(
+            f"/trades/{ACCOUNT_ID}", params={"limit": 5, "status": "closed"}
+        )
+
+        self.assertEqual(5, len(response.json()["trades"]))
+        self.assertIsNotNone(get_account_history(ACCOUNT_ID).watermark)
+
+    def test_pages_cover_all_trades(self):
+        trades, cursor = [], None
+        while True:
+            page = self.client.get(
+                f"/trades/{ACCOUNT_ID}", params={"limit": 7, "cursor": cursor}
+            ).json()
+            trades += page["trades"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        key = lambda t: (t["open_order_time"], t["position_id"])
+        self.assertEqual(sorted(self.expected["trades"], key=key), trades)
+
+    def test_open_status_only_reads_positions(self):
+        calls = self.terminal.calls["history_orders_get"]
+
+        response = self.client.get(f"/trades/{ACCOUNT_ID}?status=open&fast=true")
+
+        self.assertEqual(3, len(response.json()["trades"]))
+        self.assertEqual(calls, self.terminal.calls["history_orders_get"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f"/trades/{ACCOUNT_ID}?limit=1&cursor=abc")
+
+        self.assertEqual(400, response.status_code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,25 +1,72 @@
-import json
 import asyncio
-from fastapi import APIRouter, HTTPException
+import json
+import os
+from typing import Dict, Optional
+import msgpack
+from fastapi import APIRouter, Header, HTTPException, WebSocket
 from starlette.responses import StreamingResponse
+from starlette.websockets import WebSocketDisconnect
 from mt5.mt5_instance import get_mt5_instance
-from mt5.mt5_utils import get_trades_for_account
-from utils.logging import get_logger, log_error
+from mt5.transaction_poller import (
+    SUBSCRIBER_QUEUE_SIZE,
+    Subscription,
+    get_account_poller,
+)
+from utils.logging import get_logger
 
 log = get_logger(__name__)
 
 
 router = APIRouter()
 
-previous_trades_cache = {}
+# Seconds without an event before an SSE keepalive comment is sent
+KEEPALIVE_INTERVAL = float(os.getenv("STREAM_KEEPALIVE_INTERVAL", "15"))
+
+# Seconds without an event before a heartbeat line is sent, in the legacy ndjson format
+HEARTBEAT_INTERVAL = 1
+# The fields of a CLOSE event in the legacy ndjson format, which has no other events
+LEGACY_CLOSE_FIELDS = ("type", "position_id", "profit", "close_order_price")
+
+
+def sse_frame(event: dict) -> str:
+    """
+    Formats an event as a Server-Sent Events message, using its seq as the id clients resume from
+    """
+    frame = ""
+    if "seq" in event:
+        frame += f"id: {event['seq']}\n"
+    frame += f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    return frame
+
 
-# TODO: Currently if we are running, connect and then disconnect. When we connect again, all close trades since will
-# be sent (since the cache persists through connection) temp fix for this will be setting the cache on init, which
-# is functionallity similar to Oanda.
+def legacy_close_line(event: dict) -> Optional[str]:
+    """
+    Formats a CLOSE event as a line of the legacy ndjson format, or None for the events that format does not have
+    """
+    if event["type"] != "CLOSE":
+        return None
+    return json.dumps({field: event.get(field) for field in LEGACY_CLOSE_FIELDS}) + "\n"
 
 
 @router.get("/transactions/{accountId}/stream")
-async def stream_transactions(accountId: int):
+async def stream_transactions(
+    accountId: int,
+    since: Optional[int] = None,
+    format: str = "sse",
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Streams the account's trade events (OPEN, MODIFY, CLOSE) as Server-Sent Events, with the event's `seq` as its id.
+    `?format=ndjson` streams the legacy JSON lines older clients expect instead: CLOSE events only, without `seq`,
+    and heartbeats. It cannot be resumed.
+
+    A reconnecting client can pass the `seq` of the last event it received as `?since=` or the `Last-Event-ID` header,
+    to first receive the events it missed. A RESYNC event means they could not all be replayed, and the client should
+    re-fetch its trades.
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Unsupported format {format}")
+
     instance_check = get_mt5_instance(accountId)
     if not instance_check:
         raise HTTPException(
@@ -27,55 +74,149 @@ async def stream_transactions(accountId: int):
             detail=f"MT5 instance not initialized for account {accountId}",
         )
 
-    if accountId not in previous_trades_cache:
-        previous_trades_cache[accountId] = []
+    if format == "ndjson":
+        since = None
+    elif since is None and last_event_id:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            log.warning(f"Ignoring invalid Last-Event-ID: {last_event_id}")
+
+    # All clients of an account share a single poller, which only runs while there is at least one client
+    subscription = await get_account_poller(accountId).subscribe(since)
 
     log.info("New client successfully connected to transaction stream")
 
+    async def generate_sse_events():
+        try:
+            while not (subscription.dropped and subscription.queue.empty()):
+                event = await subscription.get(timeout=KEEPALIVE_INTERVAL)
+                if event is not None:
+                    yield sse_frame(event)
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            subscription.close()
+            log.info("Client disconnected from transaction stream")
+
     async def generate_closed_trades_events():
+        try:
+            while not (subscription.dropped and subscription.queue.empty()):
+                event = await subscription.get(timeout=HEARTBEAT_INTERVAL)
+                if event is not None:
+                    line = legacy_close_line(event)
+                    if line is not None:
+                        yield line
+                else:
+                    heartbeat = {"heartbeat": True}
+                    yield json.dumps(heartbeat) + "\n"
+        finally:
+            subscription.close()
+            log.info("Client disconnected from transaction stream")
+
+    if format == "ndjson":
+        return StreamingResponse(
+            generate_closed_trades_events(), media_type="text/event-stream"
+        )
+    return StreamingResponse(
+        generate_sse_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/transactions/ws")
+async def transactions_websocket(websocket: WebSocket, encoding: str = "msgpack"):
+    """
+    Multiplexes the transaction streams of any number of accounts over one WebSocket.
+
+    The client sends `{"action": "subscribe", "accountId": 123, "since": 10}` (`since` is optional, as for the SSE
+    stream) or `{"action": "unsubscribe", "accountId": 123}`, either as JSON text or msgpack binary messages.
+
+    The server sends every event with its `accountId`, as msgpack binary messages, or JSON text messages with
+    `?encoding=json`. Besides trade events, it sends SUBSCRIBED and UNSUBSCRIBED acknowledgements, DROPPED when the
+    client fell too far behind on an account (it should resubscribe from its last seq), and ERROR for invalid requests.
+    """
+    if encoding not in ("msgpack", "json"):
+        await websocket.close(code=1003, reason=f"Unsupported encoding {encoding}")
+        return
+    await websocket.accept()
+
+    # A single writer sends everything, so messages of different accounts never interleave mid-send. It is bounded,
+    # so a slow client backs up into its subscriptions, which the pollers then drop.
+    outbound: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    pumps: Dict[int, asyncio.Task] = {}
+
+    async def writer():
         while True:
-            current_trades = get_trades_for_account(accountId)
-            previous_trades = previous_trades_cache[accountId]
-            # To temp fix the above TODO
-            previous_trades_cache[accountId] = current_trades
-
-            log.info(
-                f"Found {len([t for t in current_trades if t.get('is_open') is True])} open trades"
-            )
-
-            # Find new closed trades (trades that were open previously but now closed)
-            closed_trades = [
-                trade
-                for trade in current_trades
-                if not trade.get("is_open")  # Trade is now closed
-                and any(
-                    prev_trade.get("position_id") == trade.get("position_id")
-                    and prev_trade.get("is_open")
-                    for prev_trade in previous_trades  # Was previously open
-                )
-            ]
-
-
-            if closed_trades:
-                log.info(
-                    f"Found {len(closed_trades)} trades that have closed this iteration"
-                )
-                for trade in closed_trades:
-                    data = {
-                        "type": "CLOSE",
-                        "position_id": trade.get("position_id"),
-                        "profit": trade.get("profit"),
-                        "close_order_price": trade.get("close_order_price"),
-                    }
-                    yield json.dumps(data) + "\n"
+            message = await outbound.get()
+            if encoding == "msgpack":
+                await websocket.send_bytes(msgpack.packb(message))
             else:
-                heartbeat = {"heartbeat": True}
-                yield json.dumps(heartbeat) + "\n"
-
-            previous_trades_cache[accountId] = current_trades
-
-            await asyncio.sleep(1)
-
-    return StreamingResponse(
-        generate_closed_trades_events(), media_type="text/event-stream"
-    )
\ No newline at end of file
+                await websocket.send_text(json.dumps(message))
+
+    async def pump(account_id: int, subscription: Subscription):
+        try:
+            while not (subscription.dropped and subscription.queue.empty()):
+                event = await subscription.get(timeout=None)
+                await outbound.put({"accountId": account_id, **event})
+            await outbound.put({"type": "DROPPED", "accountId": account_id})
+        finally:
+            subscription.close()
+            if pumps.get(account_id) is asyncio.current_task():
+                del pumps[account_id]
+
+    async def subscribe(account_id: int, since: Optional[int]) -> dict:
+        if account_id in pumps:
+            return {"type": "SUBSCRIBED", "accountId": account_id}
+        if not get_mt5_instance(account_id):
+            return {
+                "type": "ERROR",
+                "accountId": account_id,
+                "detail": f"MT5 instance not initialized for account {account_id}",
+            }
+        subscription = await get_account_poller(account_id).subscribe(since)
+        pumps[account_id] = asyncio.ensure_future(pump(account_id, subscription))
+        return {"type": "SUBSCRIBED", "accountId": account_id}
+
+    def unsubscribe(account_id: int) -> dict:
+        task = pumps.pop(account_id, None)
+        if task is not None:
+            task.cancel()
+        return {"type": "UNSUBSCRIBED", "accountId": account_id}
+
+    writer_task = asyncio.ensure_future(writer())
+    log.info("New client successfully connected to transaction websocket")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                if message.get("bytes") is not None:
+                    request = msgpack.unpackb(message["bytes"])
+                else:
+                    request = json.loads(message["text"])
+                action = request["action"]
+                account_id = int(request["accountId"])
+                since = request.get("since")
+                since = int(since) if since is not None else None
+            except (KeyError, TypeError, ValueError) as e:
+                await outbound.put({"type": "ERROR", "detail": f"Invalid request: {e}"})
+                continue
+
+            if action == "subscribe":
+                await outbound.put(await subscribe(account_id, since))
+            elif action == "unsubscribe":
+                await outbound.put(unsubscribe(account_id))
+            else:
+                await outbound.put(
+                    {"type": "ERROR", "detail": f"Unsupported action {action}"}
+                )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in list(pumps.values()):
+            task.cancel()
+        writer_task.cancel()
+        log.info("Client disconnected from transaction websocket")
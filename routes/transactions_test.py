@@ -0,0 +1,165 @@
+import json
+import time
+import unittest
+
+import msgpack
+
+from mt5 import fake_mt5
+from mt5.transaction_poller import _pollers, get_account_poller
+from routes.testing import ACCOUNT_ID, FakeAccountTestCase
+from routes.transactions import legacy_close_line, router, sse_frame
+
+
+class SseFrameTestCase(unittest.TestCase):
+    def test_event_frame(self):
+        event = {"seq": 7, "type": "CLOSE", "position_id": 1}
+
+        self.assertEqual(
+            f"id: 7\nevent: CLOSE\ndata: {json.dumps(event)}\n\n", sse_frame(event)
+        )
+
+    def test_event_without_seq(self):
+        self.assertFalse(sse_frame({"type": "RESYNC"}).startswith("id:"))
+
+
+class LegacyCloseLineTestCase(unittest.TestCase):
+    def test_close_event_keeps_the_legacy_fields(self):
+        event = {
+            "seq": 7,
+            "type": "CLOSE",
+            "position_id": 1,
+            "profit": -2.5,
+            "close_order_price": 1.08,
+            "close_order_time": 1700000000,
+        }
+
+        self.assertEqual(
+            {
+                "type": "CLOSE",
+                "position_id": 1,
+                "profit": -2.5,
+                "close_order_price": 1.08,
+            },
+            json.loads(legacy_close_line(event)),
+        )
+
+    def test_other_events_are_not_sent(self):
+        for event_type in ("OPEN", "MODIFY", "RESYNC"):
+            self.assertIsNone(legacy_close_line({"seq": 7, "type": event_type}))
+
+
+class TransactionsWebSocketTestCase(FakeAccountTestCase):
+    router = router
+    history_positions = 5
+    open_positions = 1
+
+    def setUp(self):
+        super().setUp()
+        # A poller seeded from an earlier test's terminal would see this one's positions as new
+        self.addCleanup(_pollers.pop, ACCOUNT_ID, None)
+
+    def test_subscribe_and_receive_close_events(self):
+        with self.client.websocket_connect("/transactions/ws") as ws:
+            ws.send_bytes(
+                msgpack.packb({"action": "subscribe", "accountId": ACCOUNT_ID})
+            )
+            self.assertEqual(
+                {"type": "SUBSCRIBED", "accountId": ACCOUNT_ID},
+                msgpack.unpackb(ws.receive_bytes()),
+            )
+
+            # Changes are only reported once the first poll has recorded the open positions
+            poller = get_account_poller(ACCOUNT_ID)
+            while not poller.diff_engine.seeded:
+                time.sleep(0.01)
+
+            ticket, position = next(iter(self.terminal.positions.items()))
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": position.symbol,
+                    "volume": position.volume,
+                    "type": 1 - position.type,
+                    "position": ticket,
+                }
+            )
+            event = msgpack.unpackb(ws.receive_bytes())
+
+            ws.send_bytes(
+                msgpack.packb({"action": "unsubscribe", "accountId": ACCOUNT_ID})
+            )
+            self.assertEqual(
+                "UNSUBSCRIBED", msgpack.unpackb(ws.receive_bytes())["type"]
+            )
+
+        self.assertEqual("CLOSE", event["type"])
+        self.assertEqual(ACCOUNT_ID, event["accountId"])
+        self.assertEqual(ticket, event["position_id"])
+        self.assertIn("seq", event)
+
+    def test_partial_close_is_a_modify(self):
+        tick = fake_mt5.symbol_info_tick("EURUSD")
+        partial = fake_mt5.order_send(
+            {
+                "action": fake_mt5.TRADE_ACTION_DEAL,
+                "symbol": "EURUSD",
+                "volume": 0.1,
+                "type": fake_mt5.ORDER_TYPE_BUY,
+                "price": tick.ask,
+            }
+        ).order
+        other, position = next(
+            (t, p) for t, p in self.terminal.positions.items() if t != partial
+        )
+
+        def close(ticket, symbol, volume, position_type):
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_DEAL,
+                    "symbol": symbol,
+                    "volume": volume,
+                    "type": 1 - position_type,
+                    "position": ticket,
+                }
+            )
+
+        with self.client.websocket_connect("/transactions/ws?encoding=json") as ws:
+            ws.send_text(json.dumps({"action": "subscribe", "accountId": ACCOUNT_ID}))
+            ws.receive_text()
+            poller = get_account_poller(ACCOUNT_ID)
+            while not poller.diff_engine.seeded:
+                time.sleep(0.01)
+
+            close(partial, "EURUSD", 0.05, fake_mt5.POSITION_TYPE_BUY)
+            events = [json.loads(ws.receive_text())]
+            # Closing another position makes the next poll reconcile the history
+            close(other, position.symbol, position.volume, position.type)
+            events.append(json.loads(ws.receive_text()))
+            fake_mt5.order_send(
+                {
+                    "action": fake_mt5.TRADE_ACTION_SLTP,
+                    "symbol": "EURUSD",
+                    "position": partial,
+                    "sl": round(tick.bid - 0.01, 5),
+                }
+            )
+            events.append(json.loads(ws.receive_text()))
+
+        self.assertEqual(
+            [("MODIFY", partial), ("CLOSE", other), ("MODIFY", partial)],
+            [(e["type"], e["position_id"]) for e in events],
+        )
+        self.assertEqual(0.05, events[0]["total_volume"])
+        self.assertEqual({"stop_loss": 0.0}, events[2]["previous"])
+
+    def test_uninitialized_account(self):
+        with self.client.websocket_connect("/transactions/ws?encoding=json") as ws:
+            ws.send_text(json.dumps({"action": "subscribe", "accountId": 42}))
+            message = json.loads(ws.receive_text())
+
+        self.assertEqual("ERROR", message["type"])
+        self.assertEqual(42, message["accountId"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+Idempotency keys and request coalescing for the order endpoints.
+
+A request's work runs as a task of its own, so it finishes (and its outcome is kept) even if the client that started
+it disconnects. Identical requests arriving meanwhile await the same task, and with an `Idempotency-Key`, later
+retries are answered with its outcome without touching the terminal.
+"""
+
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+from mt5.executor import TerminalTimeout
+from mt5.symbol_cache import TTLCache
+from utils.logging import get_logger
+from utils.metrics import idempotency_replays_total
+
+log = get_logger(__name__)
+
+# Seconds the outcome of a request with an Idempotency-Key is kept for its retries
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+# Most outcomes kept before the least recently used is evicted
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+MAX_KEY_LENGTH = 255
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def fingerprint(*parts) -> str:
+    """
+    Identifies a request's parameters, so a key cannot be reused for a different request
+    """
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+class IdempotencyCache:
+    def __init__(
+        self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_CACHE_SIZE
+    ):
+        # key -> (fingerprint, result, error)
+        self.outcomes = TTLCache(ttl, max_entries)
+        # key -> (fingerprint, task)
+        self._in_flight: Dict[Hashable, Tuple[str, asyncio.Future]] = {}
+
+    async def run(
+        self,
+        key: Hashable,
+        request_fingerprint: str,
+        fn: Callable[[], Awaitable],
+        response: Optional[Response] = None,
+        cache: bool = True,
+    ):
+        """
+        Runs `fn()` once per key: concurrent calls with the same key share its result or error, and with `cache`,
+        so do later calls until the outcome expires. Outcomes are only kept for results and HTTPExceptions.
+
+        A terminal timeout is not an outcome, as the call may still succeed (e.g. an order fill). The key stays in
+        flight until that call finishes, and its result or error becomes the outcome, so `fn` should return the result
+        of its last terminal call unchanged.
+
+        :param request_fingerprint: The request's parameters. Reusing a key for other parameters is a 422.
+        :param response: Gets the Idempotent-Replayed header when the outcome was not produced for this call
+        """
+        outcome = self.outcomes.get(key)
+        if outcome is not None:
+            self._check_fingerprint(key, outcome[0], request_fingerprint)
+            idempotency_replays_total.inc("cached")
+            return self._replay(outcome[1], outcome[2], response)
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._check_fingerprint(key, in_flight[0], request_fingerprint)
+            idempotency_replays_total.inc("coalesced")
+            log.debug("Coalesced request %s onto the one in flight", key)
+            try:
+                result = await asyncio.shield(in_flight[1])
+            except HTTPException as e:
+                return self._replay(None, e, response)
+            return self._replay(result, None, response)
+
+        task = asyncio.ensure_future(fn())
+        self._track(key, request_fingerprint, task, cache)
+        return await asyncio.shield(task)
+
+    def _track(self, key: Hashable, request_fingerprint: str, task, cache: bool):
+        self._in_flight[key] = (request_fingerprint, task)
+        task.add_done_callback(
+            lambda t: self._finish(key, request_fingerprint, t, cache)
+        )
+
+    def _finish(self, key: Hashable, request_fingerprint: str, task, cache: bool):
+        self._in_flight.pop(key, None)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if isinstance(error, TerminalTimeout):
+            if error.pending is not None:
+                log.warning(
+                    "Request %s timed out, waiting for its terminal call to finish", key
+                )
+                self._track(key, request_fingerprint, error.pending, cache)
+            return
+        if error is not None and not isinstance(error, HTTPException):
+            return
+        if cache:
+            result = None if error is not None else task.result()
+            self.outcomes.put(key, (request_fingerprint, result, error))
+
+    @staticmethod
+    def _check_fingerprint(key: Hashable, expected: str, actual: str):
+        if expected != actual:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Idempotency key {key[-1]} was already used for a different request",
+            )
+
+    @staticmethod
+    def _replay(result, error: Optional[HTTPException], response: Optional[Response]):
+        if error is not None:
+            # A new exception, as re-raising the stored one would grow its traceback on every replay
+            raise HTTPException(
+                status_code=error.status_code,
+                detail=error.detail,
+                headers={**(error.headers or {}), REPLAYED_HEADER: "true"},
+            )
+        if response is not None:
+            response.headers[REPLAYED_HEADER] = "true"
+        return result
+
+
+idempotency_cache = IdempotencyCache()
+
+
+def check_idempotency_key(key: Optional[str]):
+    if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters",
+        )
@@ -1,18 +1,173 @@
-from typing import Tuple
+from typing import Dict, Optional, Tuple
+import atexit
+import json
 import logging
-from fastapi import FastAPI
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# `text` or `json` (one object per line)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Empty to only log to stderr. Worker processes write to their own file alongside it, as rotation is not process safe.
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+# Rotate the log file once it reaches this size, keeping this many old files
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Rotate on time instead, e.g. `midnight` or `H` (see TimedRotatingFileHandler)
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN")
+# Most DEBUG/INFO records logged from the same line per interval (seconds). The rest are counted and dropped.
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_LIMIT_INTERVAL = float(os.getenv("LOG_RATE_LIMIT_INTERVAL", "10"))
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Passed as `extra` on records that are never rate limited, i.e. the audit trail of orders sent
+AUDIT = {"audit": True}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits DEBUG and INFO records to `limit` per `interval` seconds for each line that logs them, so hot loops cannot
+    flood the log. The next record let through from a line carries the number suppressed before it. AUDIT records are
+    always let through.
+    """
+
+    def __init__(
+        self, limit: int = LOG_RATE_LIMIT, interval: float = LOG_RATE_LIMIT_INTERVAL
+    ):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._lock = threading.Lock()
+        # (path, line) -> [window start, records let through, records suppressed]
+        self._windows: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            self.limit <= 0
+            or record.levelno >= logging.WARNING
+            or getattr(record, "audit", False)
+        ):
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.limit:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message += f" ({suppressed} similar messages suppressed)"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.processName,
+            "thread": record.threadName,
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record can be formatted there rather than on the caller's thread.
+        # Arguments are formatted late, so callers must not mutate them after logging.
+        return record
+
+
+def _log_file() -> Optional[str]:
+    if not LOG_FILE:
+        return None
+    process = multiprocessing.current_process().name
+    if process == "MainProcess":
+        return LOG_FILE
+    root, ext = os.path.splitext(LOG_FILE)
+    return f"{root}.{process}{ext}"
+
+
+def _file_handler(path: str) -> logging.Handler:
+    if LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT
+        )
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+    )
 
 
 def configure_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        handlers=[
-            logging.StreamHandler(),
-            # TODO: Use new relic for log appender. Locally can use a log file
-            logging.FileHandler("app.log", mode="a"),
-        ],
+    """
+    Routes all logging through a queue to a background thread, which formats and writes the records to stderr and
+    the (rotated) log file, so logging never blocks callers on I/O. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    # TODO: Use new relic for log appender. Locally can use a log file
+    path = _log_file()
+    if path:
+        handlers.append(_file_handler(path))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
     )
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    Writes out any queued records and stops the background thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def get_logger(name: str):
@@ -0,0 +1,326 @@
+"""
+Minimal Prometheus-style metrics: histograms, counters and collection time gauges, rendered in the text exposition
+format for `/metrics`.
+
+Observing is a bisect and a few additions under a lock, so it can be done around every terminal call.
+"""
+
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Serve /metrics at all
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Require the API key on /metrics, which is otherwise unauthenticated so scrapers don't need it
+METRICS_REQUIRE_API_KEY = (
+    os.getenv("METRICS_REQUIRE_API_KEY", "false").lower() == "true"
+)
+
+# Seconds, from fast local IPC calls to slow history reads
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = (
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        )
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # Labels -> [count per bucket (the last being +Inf)..., sum, count]
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_str = _format_labels(self.labelnames + ("le",), labels + (le,))
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {values[-2]}")
+            lines.append(f"{self.name}_count{label_str} {values[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in values.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            )
+        return lines
+
+
+class CallbackMetric:
+    """
+    A metric whose values are read when rendering, e.g. a queue depth or counters kept elsewhere
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[Labels, float]]],
+        type: str = "gauge",
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.type = type
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self.collect():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            )
+        return lines
+
+
+_registry: Dict[str, object] = {}
+
+
+def register(metric):
+    """
+    Adds a metric to /metrics, replacing any previous one of the same name
+    """
+    _registry[metric.name] = metric
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in list(_registry.values()):
+        try:
+            lines += metric.render()
+        except Exception as e:
+            lines.append(f"# Failed to collect {metric.name}: {e}")
+    return "\n".join(lines) + "\n"
+
+
+mt5_call_seconds = register(
+    Histogram(
+        "mt5_call_seconds",
+        "Duration of MetaTrader5 calls",
+        ("function", "account"),
+    )
+)
+http_request_seconds = register(
+    Histogram(
+        "http_request_seconds",
+        "Time until the response started, by route",
+        ("method", "route", "status"),
+    )
+)
+stream_poll_seconds = register(
+    Histogram(
+        "stream_poll_seconds",
+        "Duration of transaction stream polls, by kind (positions or reconcile)",
+        ("account", "kind"),
+    )
+)
+stream_events_total = register(
+    Counter(
+        "stream_events_total",
+        "Transaction stream events published",
+        ("account", "type"),
+    )
+)
+risk_rejections_total = register(
+    Counter(
+        "risk_rejections_total",
+        "Orders rejected by the risk gate, by limit",
+        ("account", "limit"),
+    )
+)
+idempotency_replays_total = register(
+    Counter(
+        "idempotency_replays_total",
+        "Order requests answered with another request's outcome, by kind (cached or coalesced)",
+        ("kind",),
+    )
+)
+
+
+# MetaTrader5 call instrumentation
+
+MT5_FUNCTIONS = (
+    "initialize",
+    "login",
+    "shutdown",
+    "account_info",
+    "terminal_info",
+    "symbols_get",
+    "symbol_info",
+    "symbol_info_tick",
+    "symbol_select",
+    "positions_total",
+    "positions_get",
+    "orders_total",
+    "orders_get",
+    "history_orders_total",
+    "history_orders_get",
+    "history_deals_total",
+    "history_deals_get",
+    "order_check",
+    "order_send",
+    "last_error",
+)
+
+# The account this process' MT5 connection is logged in to
+_mt5_account = ""
+# When set (in worker processes), MT5 call timings are collected here to be sent back to the front end, rather than
+# observed locally
+_forwarded_calls: Optional[List[Tuple[str, float]]] = None
+
+
+def set_mt5_account(account_id: int):
+    global _mt5_account
+    _mt5_account = str(account_id)
+
+
+def forward_mt5_calls():
+    global _forwarded_calls
+    _forwarded_calls = []
+
+
+def drain_forwarded_calls() -> List[Tuple[str, float]]:
+    global _forwarded_calls
+    calls, _forwarded_calls = _forwarded_calls, []
+    return calls
+
+
+def observe_mt5_calls(account_id: int, calls: Iterable[Tuple[str, float]]):
+    """
+    Records MT5 call timings forwarded by an account's worker process
+    """
+    account = str(account_id)
+    for function, seconds in calls:
+        mt5_call_seconds.observe(seconds, function, account)
+
+
+def _timed(name: str, fn: Callable) -> Callable:
+    def call(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if _forwarded_calls is not None:
+                _forwarded_calls.append((name, elapsed))
+            else:
+                mt5_call_seconds.observe(elapsed, name, _mt5_account)
+
+    call.__name__ = name
+    call.__wrapped__ = fn
+    return call
+
+
+def instrument_mt5(module):
+    """
+    Wraps the module's MetaTrader5 functions to time every call. Safe to call more than once.
+    """
+    for name in MT5_FUNCTIONS:
+        fn = getattr(module, name, None)
+        if fn is None or hasattr(fn, "__wrapped__"):
+            continue
+        setattr(module, name, _timed(name, fn))
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request until its response starts, labelled by route template (not path, to bound cardinality)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                route = scope.get("route")
+                http_request_seconds.observe(
+                    time.perf_counter() - start,
+                    scope["method"],
+                    route.path if route is not None else "unmatched",
+                    str(status[0]),
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,93 @@
+"""
+Compact serialization of large responses, e.g. the trade history.
+
+These skip response model validation, so must only be used for data the adapter built itself.
+"""
+
+import json
+import os
+from typing import Iterator, List, Optional
+
+import msgpack
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, json is just slower
+    orjson = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Items serialized per chunk of a streamed list
+STREAM_CHUNK_SIZE = int(os.getenv("RESPONSE_STREAM_CHUNK_SIZE", "500"))
+
+
+def dumps(obj) -> bytes:
+    """
+    Serializes to JSON with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def loads(data):
+    """
+    Parses JSON with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """
+    :param accept: The request's Accept header
+    """
+    if not accept:
+        return False
+    return any(
+        part.split(";")[0].strip() in (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+        for part in accept.split(",")
+    )
+
+
+def stream_json_list(
+    key: str,
+    items: List[dict],
+    extra: Optional[dict] = None,
+    chunk_size: Optional[int] = None,
+) -> Iterator[bytes]:
+    """
+    Streams `{"<key>": [...items], **extra}` as JSON, serializing `chunk_size` items at a time, so the whole body is
+    never held in memory next to the items.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    yield b'{"' + key.encode() + b'":['
+    for start in range(0, len(items), chunk_size):
+        chunk = dumps(items[start : start + chunk_size])
+        # Strip the chunk's brackets, to splice it into the one list
+        if start:
+            yield b"," + chunk[1:-1]
+        else:
+            yield chunk[1:-1]
+    yield b"]" + (b"," + dumps(extra)[1:] if extra else b"}")
+
+
+def stream_msgpack_list(
+    key: str,
+    items: List[dict],
+    extra: Optional[dict] = None,
+    chunk_size: Optional[int] = None,
+) -> Iterator[bytes]:
+    """
+    Streams `{"<key>": [...items], **extra}` as msgpack, `chunk_size` items at a time
+    """
+    extra = extra or {}
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    packer = msgpack.Packer()
+    yield packer.pack_map_header(1 + len(extra)) + packer.pack(
+        key
+    ) + packer.pack_array_header(len(items))
+    for start in range(0, len(items), chunk_size):
+        yield b"".join(packer.pack(item) for item in items[start : start + chunk_size])
+    yield b"".join(packer.pack(k) + packer.pack(v) for k, v in extra.items())